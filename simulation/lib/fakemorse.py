@@ -0,0 +1,198 @@
+# FAKE MORSE
+# A small stand-in for the MORSE simulator's socket interface, for testing
+# robot controllers without Blender.
+# Speaks the same protocol as MORSE (and so works with pymorse):
+#   Service port: requests "<id> <component> <service> <json args>",
+#                 responses "<id> SUCCESS <json result>" or "<id> FAILED <message>"
+#   Stream ports: one JSON object per line, one port per component
+# Each robot has:
+#   pose     - sensor stream (x, y, z, yaw, pitch, roll), sent at 'rate' Hz
+#   waypoint - actuator stream taking {'x', 'y', 'z', 'tolerance', 'speed'},
+#              with services get_status ("Transit" or "Arrived") and stop
+# Robots drive straight to their waypoint at the requested speed.
+
+import math
+import json
+import time
+import asyncio
+import argparse
+
+
+class FakeRobot:
+    def __init__(self, name, x = 0.0, y = 0.0, z = 0.0):
+        self.name = name
+        self.pose = {'x':x, 'y':y, 'z':z, 'yaw':0.0, 'pitch':0.0, 'roll':0.0}
+        self.destination = None
+        self.status = "Arrived"
+
+    def set_destination(self, waypoint):
+        self.destination = waypoint
+        self.status = "Transit"
+
+    def stop(self):
+        self.destination = None
+        self.status = "Arrived"
+
+    def step(self, dt):
+        if (self.destination is None):
+            return
+        dx = self.destination['x'] - self.pose['x']
+        dy = self.destination['y'] - self.pose['y']
+        distance = math.sqrt(dx ** 2 + dy ** 2)
+        if (distance <= self.destination.get('tolerance', 0.5)):
+            self.stop()
+            return
+        travel = min(distance, self.destination.get('speed', 1.0) * dt)
+        self.pose['yaw'] = math.atan2(dy, dx)
+        self.pose['x'] = self.pose['x'] + travel * dx / distance
+        self.pose['y'] = self.pose['y'] + travel * dy / distance
+
+
+class FakeMorse:
+    def __init__(self, robots, host = 'localhost', port = 4000, rate = 20.0):
+        # robots: dict of name -> (x, y) start position
+        self.robots = {name:FakeRobot(name, xy[0], xy[1]) for name, xy in robots.items()}
+        self.host = host
+        self.port = port
+        self.rate = rate
+        self.stream_ports = {}
+        self.servers = []
+        self.tasks = []
+        self.clients = set()
+        self.num_requests = 0
+
+    async def start(self):
+        server = await asyncio.start_server(self.client(self.handle_services), self.host, self.port)
+        self.port = server.sockets[0].getsockname()[1]
+        self.servers.append(server)
+        for robot in self.robots.values():
+            await self.start_stream(robot.name + '.pose', self.handle_pose(robot))
+            await self.start_stream(robot.name + '.waypoint', self.handle_waypoint(robot))
+        self.tasks.append(asyncio.ensure_future(self.run()))
+        return self
+
+    async def start_stream(self, fqn, handler):
+        server = await asyncio.start_server(self.client(handler), self.host, 0)
+        self.stream_ports[fqn] = server.sockets[0].getsockname()[1]
+        self.servers.append(server)
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        for server in self.servers:
+            server.close()
+            await server.wait_closed()
+        # Hang up on connected clients, ending their handlers
+        for writer in list(self.clients):
+            writer.close()
+        await asyncio.sleep(0)
+
+    def client(self, handler):
+        # Wraps a connection handler: tracks the connection, and ends quietly when it drops
+        async def serve_client(reader, writer):
+            self.clients.add(writer)
+            try:
+                await handler(reader, writer)
+            except (ConnectionError, asyncio.CancelledError):
+                pass
+            finally:
+                self.clients.discard(writer)
+                writer.close()
+        return serve_client
+
+    async def run(self):
+        dt = 1.0 / self.rate
+        while True:
+            await asyncio.sleep(dt)
+            for robot in self.robots.values():
+                robot.step(dt)
+
+    def details(self):
+        robots = []
+        for robot in self.robots.values():
+            robots.append({'name':robot.name, 'services':[],
+                'components':{
+                    robot.name + '.pose':{'stream_interfaces':[['socket', 'OUT']], 'services':[]},
+                    robot.name + '.waypoint':{'stream_interfaces':[['socket', 'IN']],
+                                              'services':['get_status', 'stop']}}})
+        return {'robots':robots}
+
+    def call(self, component, service, args):
+        if (component == 'simulation' and service == 'details'):
+            return self.details()
+        if (component == 'simulation' and service == 'get_stream_port'):
+            return self.stream_ports[args[0]]
+        if (component == 'simulation' and service == 'list_streams'):
+            return sorted(self.stream_ports)
+        if (component == 'time' and service == 'now'):
+            return time.time()
+        name, _, part = component.partition('.')
+        if (name in self.robots and part == 'waypoint'):
+            if (service == 'get_status'):
+                return self.robots[name].status
+            if (service == 'stop'):
+                return self.robots[name].stop()
+        raise KeyError('{0}.{1}'.format(component, service))
+
+    async def handle_services(self, reader, writer):
+        while True:
+            line = await reader.readline()
+            if (not line):
+                break
+            self.num_requests = self.num_requests + 1
+            parts = line.decode().strip().split(' ', 3)
+            if (len(parts) < 3):
+                continue
+            args = json.loads(parts[3]) if len(parts) > 3 else []
+            try:
+                result = self.call(parts[1], parts[2], args)
+                response = '{0} SUCCESS {1}'.format(parts[0], json.dumps(result))
+            except Exception as e:
+                response = '{0} FAILED {1}'.format(parts[0], json.dumps(str(e)))
+            writer.write((response + '\n').encode())
+
+    def handle_pose(self, robot):
+        async def handler(reader, writer):
+            while True:
+                writer.write((json.dumps(robot.pose) + '\n').encode())
+                await writer.drain()
+                await asyncio.sleep(1.0 / self.rate)
+        return handler
+
+    def handle_waypoint(self, robot):
+        async def handler(reader, writer):
+            while True:
+                line = await reader.readline()
+                if (not line):
+                    break
+                robot.set_destination(json.loads(line.decode()))
+        return handler
+
+
+def read_start(fh):
+    with open(fh) as f:
+        line = f.readline().strip()
+    return (float(line.split(',')[0]), float(line.split(',')[1]))
+
+async def serve(robots, host, port, rate):
+    simu = await FakeMorse(robots, host, port, rate).start()
+    print("[+] Fake MORSE on {0}:{1} with robots {2}".format(host, simu.port, ', '.join(robots)))
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    # Parse arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--names", help = "comma-separated robot names", default = "susan,django,anton")
+    parser.add_argument("-w", "--waypoint_dir", help = "directory with <name>.start files for the start positions")
+    parser.add_argument("-p", "--port", help = "service port", type = int, default = 4000)
+    parser.add_argument("-r", "--rate", help = "simulation and pose stream rate (Hz)", type = float, default = 20.0)
+    args = parser.parse_args()
+
+    robots = {}
+    for name in args.names.split(','):
+        robots[name] = read_start(args.waypoint_dir + name + ".start") if args.waypoint_dir else (0.0, 0.0)
+    try:
+        asyncio.run(serve(robots, 'localhost', args.port, args.rate))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,244 @@
+# FLEET CONTROLLER
+# Controls many MORSE robots from one asyncio event loop over one service connection.
+# marisa.py and qcoord.py each run as their own process with their own pymorse.Morse()
+# connection, blocking in 0.5 s polling loops. Here every robot shares a MorseConnection:
+#   - service requests from all robots are multiplexed over the service socket by request id
+#   - each robot's pose stream is read by its own task into a latest-value slot
+#   - commands such as goto_target() are coroutines, so a team is driven with asyncio.gather()
+# Snapshots have the same format as roboutils.take_snapshot().
+#
+# Example: run three robots through their waypoints against the fake simulator
+#   python3 robofleet.py -n susan,django,anton -w ../inData/round12/ --fake
+
+import json
+import time
+import random
+import asyncio
+import datetime
+import argparse
+
+
+class MorseServiceFailed(Exception):
+    pass
+
+
+class MorseConnection:
+    # Asyncio client for the MORSE socket interface
+
+    def __init__(self, host = 'localhost', port = 4000, timeout = 15.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.next_id = 0
+        self.pending = {}
+        self.num_requests = 0
+
+    async def open(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.listener = asyncio.ensure_future(self.listen())
+        return self
+
+    async def close(self):
+        self.listener.cancel()
+        self.writer.close()
+
+    async def listen(self):
+        # Hand every response to the request waiting on its id
+        while True:
+            line = await self.reader.readline()
+            if (not line):
+                break
+            parts = line.decode().strip().split(' ', 2)
+            future = self.pending.pop(parts[0], None)
+            if (future is None or future.done()):
+                continue
+            result = json.loads(parts[2]) if len(parts) > 2 else None
+            if (parts[1] == 'SUCCESS'):
+                future.set_result(result)
+            else:
+                future.set_exception(MorseServiceFailed(result))
+        # A request that timed out or was cancelled keeps its future here until its rpc() returns
+        for future in list(self.pending.values()):
+            if (not future.done()):
+                future.set_exception(ConnectionError("simulation service is down"))
+
+    async def rpc(self, component, service, *args):
+        req_id = str(self.next_id)
+        self.next_id = self.next_id + 1
+        self.num_requests = self.num_requests + 1
+        future = asyncio.get_event_loop().create_future()
+        self.pending[req_id] = future
+        self.writer.write('{0} {1} {2} {3}\n'.format(req_id, component, service, json.dumps(args)).encode())
+        try:
+            return await asyncio.wait_for(future, self.timeout)
+        finally:
+            self.pending.pop(req_id, None)
+
+    async def details(self):
+        return await self.rpc('simulation', 'details')
+
+    async def open_stream(self, fqn):
+        port = await self.rpc('simulation', 'get_stream_port', fqn)
+        return await asyncio.open_connection(self.host, port)
+
+
+class PoseSlot:
+    # Latest message of a sensor stream, kept up to date by a reader task
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.value = None
+        self.stamp = None
+        self.arrived = asyncio.Event()
+        self.task = asyncio.ensure_future(self.read())
+
+    async def read(self):
+        while True:
+            line = await self.reader.readline()
+            if (not line):
+                break
+            self.value = json.loads(line.decode())
+            self.stamp = time.time()
+            self.arrived.set()
+
+    async def latest(self):
+        if (self.value is None):
+            await self.arrived.wait()
+        return self.value
+
+    def close(self):
+        self.task.cancel()
+        self.writer.close()
+
+
+class FleetController:
+
+    def __init__(self, connection, names, tick = 0.5):
+        self.connection = connection
+        self.names = list(names)
+        self.tick = tick
+        self.poses = {}
+        self.waypoints = {}
+        self.destinations = {name:{'x':None, 'y':None} for name in self.names}
+        self.snapshots = {}
+
+    async def open(self):
+        # Open every robot's pose and waypoint streams at once
+        pose_streams = await asyncio.gather(*[self.connection.open_stream(n + '.pose') for n in self.names])
+        waypoint_streams = await asyncio.gather(*[self.connection.open_stream(n + '.waypoint') for n in self.names])
+        for name, pose, waypoint in zip(self.names, pose_streams, waypoint_streams):
+            self.poses[name] = PoseSlot(*pose)
+            self.waypoints[name] = waypoint[1]
+        return self
+
+    def close(self):
+        for slot in self.poses.values():
+            slot.close()
+        for writer in self.waypoints.values():
+            writer.close()
+
+    async def get_waypoint_status(self, name):
+        return await self.connection.rpc(name + '.waypoint', 'get_status')
+
+    async def snapshot(self, name, with_status = True):
+        pose = await self.poses[name].latest()
+        status = (await self.get_waypoint_status(name)) if with_status else None
+        snapshot = { 'stamp':time.time(), 'time':'{:%H:%M:%S}'.format(datetime.datetime.now()),
+                'x':pose['x'], 'y':pose['y'], 'z':pose['z'],
+                'pitch':pose['pitch'], 'roll':pose['roll'], 'yaw':pose['yaw'],
+                'status':status }
+        self.snapshots[name] = snapshot
+        return snapshot
+
+    async def poll(self, with_status = True):
+        # Snapshot of every robot, with the status requests in flight together
+        snapshots = await asyncio.gather(*[self.snapshot(n, with_status) for n in self.names])
+        return dict(zip(self.names, snapshots))
+
+    def get_status(self, name):
+        # Same fields as roboutils.get_status(), from the latest snapshot
+        snapshot = self.snapshots[name]
+        destination = self.destinations[name]
+        return { 'time':snapshot['time'], 'pos_x':snapshot['x'], 'pos_y':snapshot['y'],
+                'dest_x':destination['x'], 'dest_y':destination['y'] }
+
+    async def goto_target(self, name, target, speed, tolerance = 0.5):
+        # Send the robot to target and return its snapshot once it is no longer in transit
+        self.destinations[name] = target
+        writer = self.waypoints[name]
+        writer.write((json.dumps({'x':target['x'], 'y':target['y'], 'z':10.0,
+                                  'tolerance':tolerance, 'speed':speed}) + '\n').encode())
+        await writer.drain()
+        while True:
+            # Leave the simulator a tick to start the action before checking on it
+            await asyncio.sleep(self.tick)
+            snapshot = await self.snapshot(name)
+            if (snapshot['status'] != "Transit"):
+                return snapshot
+
+    async def follow_waypoints(self, name, waypoints, speed, verbose = False):
+        for w in waypoints:
+            await self.goto_target(name, {'x':w[0], 'y':w[1]}, speed)
+            if (verbose):
+                print("[+] {0} arrived: {1}".format(name, self.get_status(name)))
+
+    async def halt(self, name):
+        self.destinations[name] = {'x':None, 'y':None}
+        await self.connection.rpc(name + '.waypoint', 'stop')
+
+
+def read_waypoints(fh):
+    with open(fh) as f:
+        waypoints = [x.strip() for x in f.readlines() if x.strip()]
+    return [(float(x.split(',')[0]), float(x.split(',')[1])) for x in waypoints]
+
+async def run_fleet(args, names, waypoints, starts):
+    simu = None
+    if (args.fake):
+        from fakemorse import FakeMorse
+        simu = await FakeMorse(starts, port = 0, rate = args.rate).start()
+        args.port = simu.port
+    connection = await MorseConnection(args.host, args.port).open()
+    fleet = await FleetController(connection, names, args.tick).open()
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*[fleet.follow_waypoints(n, waypoints[n], args.speed, args.verbose) for n in names])
+        await asyncio.gather(*[fleet.halt(n) for n in names])
+    finally:
+        fleet.close()
+        await connection.close()
+        if (simu is not None):
+            await simu.stop()
+    print("[+] {0} robots through {1} waypoints in {2:.2f} s, {3} service requests".format(
+        len(names), sum(len(w) for w in waypoints.values()), time.perf_counter() - start, connection.num_requests))
+
+
+if __name__ == "__main__":
+    # Parse arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--names", help = "comma-separated names of robots in MORSE")
+    parser.add_argument("-w", "--waypoint_dir", help = "directory containing <name>.waypoints (and <name>.start, with --fake)")
+    parser.add_argument("-s", "--speed", help = "transit speed (m/s)", type = float, default = 2.0)
+    parser.add_argument("-t", "--tick", help = "status polling period (s)", type = float, default = 0.5)
+    parser.add_argument("--host", help = "MORSE host", default = "localhost")
+    parser.add_argument("--port", help = "MORSE service port", type = int, default = 4000)
+    parser.add_argument("-f", "--fake", help = "run against an in-process fake simulator", action = "store_true")
+    parser.add_argument("-r", "--rate", help = "fake simulator rate (Hz)", type = float, default = 20.0)
+    parser.add_argument("-N", "--num_random", help = "with --fake and no -n: number of robots with random waypoints", type = int, default = 20)
+    parser.add_argument("-v", "--verbose", help = "print each arrival", action = "store_true")
+    args = parser.parse_args()
+
+    if (args.names is not None):
+        names = args.names.split(',')
+        waypoints = {n:read_waypoints(args.waypoint_dir + n + ".waypoints") for n in names}
+        starts = {n:read_waypoints(args.waypoint_dir + n + ".start")[0] for n in names} if args.fake else {}
+    elif (args.fake):
+        names = ['robot_{0:03d}'.format(i) for i in range(args.num_random)]
+        waypoints = {n:[(random.uniform(-20, 20), random.uniform(-20, 20)) for i in range(3)] for n in names}
+        starts = {n:(0.0, 0.0) for n in names}
+    else:
+        print("Robot names (-n) are required without --fake")
+        exit(1)
+
+    asyncio.run(run_fleet(args, names, waypoints, starts))
@@ -31,3 +31,17 @@ def get_coords_in_radius(t, s, r):
     coords = nm.add (t, nm.multiply (r, (w / norm (w))))
     return coords
 
+def get_centroid(points):
+# Calculate the centroid of a set of 2D points
+# points - a list of 2D numeric arrays
+    return nm.mean (nm.asarray (points, dtype = float), axis = 0)
+
+def get_control_period(speed, step, min_period, max_period):
+# Calculate how often to update a command to something moving,
+# such that it moves at most 'step' between updates
+# speed - speed of what is followed, a number
+# step - distance allowed between updates, a number
+# min_period, max_period - bounds on the period, numbers
+    if (speed <= 0):
+        return max_period
+    return min (max (step / speed, min_period), max_period)
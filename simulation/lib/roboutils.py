@@ -2,6 +2,8 @@
 import pymorse
 import robomath as rm
 import datetime
+import threading
+import math
 import time
 
 def ping(robot):
@@ -12,24 +14,174 @@ def ping(robot):
     return ping
 
 
+def get_waypoint_status(robot):
+    status = getattr(robot['simu'], robot['name']).waypoint.get_status()
+    # pymorse services return a future
+    if hasattr(status, 'result'):
+        status = status.result()
+    return status
+
+def make_snapshot(pose, status = None):
+    now = datetime.datetime.now()
+    return { 'stamp':time.time(), 'time':'{:%H:%M:%S}'.format(now),
+            'x':pose['x'], 'y':pose['y'], 'z':pose['z'],
+            'pitch':pose['pitch'], 'roll':pose['roll'], 'yaw':pose['yaw'],
+            'status':status }
+
+def take_snapshot(robot, with_status = True):
+    # Read the robot's pose once (and, with_status, its waypoint status)
+    # and keep it as robot['snapshot'] for every caller in this tick
+    pose_stream = getattr(robot['simu'], robot['name']).pose
+    # Latest pose already received, only blocking if none has arrived yet
+    pose = pose_stream.last()
+    if pose is None:
+        pose = pose_stream.get()
+    snapshot = make_snapshot(pose, get_waypoint_status(robot) if with_status else None)
+    robot['snapshot'] = snapshot
+    return snapshot
+
+def get_snapshot(robot, max_age = None, with_status = False):
+    # Reuse robot['snapshot'] if it is at most max_age seconds old
+    # (default: robot['tick'], or 0 to always read a new one)
+    if max_age is None:
+        max_age = robot.get('tick', 0.0)
+    snapshot = robot.get('snapshot')
+    # A subscribed robot's snapshot is kept current by its pose stream
+    if 'streams' in robot and snapshot is not None:
+        max_age = float('inf')
+    if snapshot is None or time.time() - snapshot['stamp'] > max_age:
+        return take_snapshot(robot, with_status)
+    if with_status and snapshot['status'] is None:
+        snapshot['status'] = get_waypoint_status(robot)
+    return snapshot
+
 def get_position(robot):
-    pose = getattr(robot['simu'], robot['name']).pose.get()
-    pos = {'x':pose['x'], 'y':pose['y'], 'z':pose['z']}
+    snapshot = get_snapshot(robot)
+    pos = {'x':snapshot['x'], 'y':snapshot['y'], 'z':snapshot['z']}
     return pos
 
 def get_orientation(robot):
-    pose = getattr(robot['simu'], robot['name']).pose.get()
-    orientation = {'pitch':pose['pitch'], 'roll':pose['pitch'], 'yaw':pose['yaw']}
+    snapshot = get_snapshot(robot)
+    orientation = {'pitch':snapshot['pitch'], 'roll':snapshot['roll'], 'yaw':snapshot['yaw']}
     return orientation
 
 def get_status(robot):
     destination = robot['destination']
-    location =  get_position(robot)
-    status = { 'time':'{:%H:%M:%S}'.format(datetime.datetime.now()),'pos_x':location['x'], 'pos_y':location['y'], 'dest_x':destination['x'], 'dest_y':destination['y'] }
+    snapshot = get_snapshot(robot)
+    status = { 'time':snapshot['time'],'pos_x':snapshot['x'], 'pos_y':snapshot['y'], 'dest_x':destination['x'], 'dest_y':destination['y'] }
     return status
 
+# Subscriptions
+# Instead of polling, register callbacks that run as soon as a pose arrives.
+# Each robot keeps the latest pose snapshot and waypoint status in LatestValue slots;
+# a subscribed robot's robot['snapshot'] is always the latest pose, so the getters above
+# read it without a socket round-trip.
+# MORSE only reports the waypoint status through a service, so while subscribed the
+# status stream is derived from the poses: "Transit" when goto_target() is sent,
+# "Arrived" once the pose is within the waypoint tolerance (as the waypoint actuator
+# decides), and "Stop" on cancel_target().
+
+class LatestValue:
+    # Latest value of a stream. Readers take .value without locking: values are
+    # replaced, never modified, so a read always sees a whole snapshot.
+    # Writers replace it under self.changed, so publish_if() can check and replace at once.
+    def __init__(self):
+        self.value = None
+        self.count = 0
+        self.callbacks = []
+        self.changed = threading.Condition()
+
+    def publish(self, value):
+        self.publish_if(None, value)
+
+    def publish_if(self, predicate, value):
+        # Publish value only if predicate(current value) holds (always without a predicate),
+        # with no other publish in between; returns whether it was published.
+        # Callbacks run after the lock is released.
+        with self.changed:
+            if predicate is not None and not predicate(self.value):
+                return False
+            self.value = value
+            self.count = self.count + 1
+            self.changed.notify_all()
+        for callback in list(self.callbacks):
+            callback(value)
+        return True
+
+    def wait(self, predicate = None, timeout = None):
+        # Block until the value satisfies predicate (checked on the current value too),
+        # or without a predicate, until a newer value arrives
+        count = self.count
+        if predicate is None:
+            ready = lambda: self.count != count
+        else:
+            ready = lambda: predicate(self.value)
+        with self.changed:
+            self.changed.wait_for(ready, timeout)
+        return self.value
+
+def get_streams(robot):
+    # Start listening to the robot's pose stream on first use
+    if 'streams' not in robot:
+        robot['streams'] = {'pose':LatestValue(), 'status':LatestValue(), 'tolerance':0.5}
+        getattr(robot['simu'], robot['name']).pose.subscribe(lambda pose: on_pose(robot, pose))
+    return robot['streams']
+
+def on_pose(robot, pose):
+    # Runs on pymorse's thread, while goto_target()/cancel_target() may publish from another:
+    # the only status it publishes is "Arrived", and only while the slot still holds the
+    # "Transit" of the destination the pose was compared with
+    streams = robot['streams']
+    status = streams['status'].value
+    destination = robot.get('destination', {'x':None, 'y':None})
+    arrived = False
+    if status == "Transit" and destination['x'] is not None:
+        distance = math.sqrt((pose['x'] - destination['x']) ** 2 + (pose['y'] - destination['y']) ** 2)
+        arrived = distance <= streams['tolerance']
+    snapshot = make_snapshot(pose, "Arrived" if arrived else status)
+    robot['snapshot'] = snapshot
+    streams['pose'].publish(snapshot)
+    if arrived:
+        streams['status'].publish_if(
+                lambda current: current == "Transit" and robot.get('destination') is destination, "Arrived")
+
+def subscribe_pose(robot, callback = None):
+    # callback(snapshot) on every pose; returns the robot's pose slot
+    slot = get_streams(robot)['pose']
+    if callback is not None:
+        slot.callbacks.append(callback)
+    return slot
+
+def subscribe_status(robot, callback = None):
+    # callback(status) whenever the waypoint status changes; returns the robot's status slot
+    streams = get_streams(robot)
+    if streams['status'].value is None:
+        streams['status'].publish(get_waypoint_status(robot))
+    if callback is not None:
+        streams['status'].callbacks.append(callback)
+    return streams['status']
+
+def unsubscribe(robot, callback):
+    if 'streams' in robot:
+        for slot in (robot['streams']['pose'], robot['streams']['status']):
+            if callback in slot.callbacks:
+                slot.callbacks.remove(callback)
+
+def set_status(robot, status):
+    if 'streams' in robot:
+        robot['streams']['status'].publish(status)
+
+def wait_for_pose(robot, timeout = None):
+    # Next pose snapshot, as soon as it arrives
+    return subscribe_pose(robot).wait(timeout = timeout)
+
+def wait_for_arrival(robot, timeout = None):
+    # Block until the robot stops transiting; returns its status
+    return subscribe_status(robot).wait(lambda status: status != "Transit", timeout)
+
 def cancel_target(robot):
     getattr(robot['simu'], robot['name']).waypoint.stop()
+    set_status(robot, "Stop")
 
 def halt(robot):
     robot['destination'] = {'x':None, 'y':None}
@@ -42,11 +194,14 @@ def motion_circle(robot, radius, speed_angular):
     speed_linear = (radius) * speed_angular
     getattr(robot['simu'], robot['name']).motion.set_speed(speed_linear, speed_angular)
 
-def goto_target(robot, target, speed):
+def goto_target(robot, target, speed, tolerance = 0.5):
     robot['destination'] = target
+    if 'streams' in robot:
+        robot['streams']['tolerance'] = tolerance
+    set_status(robot, "Transit")
     getattr(robot['simu'], robot['name']).waypoint.publish(
             {'x':target['x'], 'y':target['y'], 'z':10.0,
-                'tolerance':0.5, 'speed':speed})
+                'tolerance':tolerance, 'speed':speed})
 
 def circle_target(robot, target, radius, speed_transit, speed_angular):
     halt(robot)
@@ -61,8 +216,7 @@ def circle_target(robot, target, radius, speed_transit, speed_angular):
     target_adj = {'x':coords[0], 'y':coords[1]}
     goto_target(robot, target_adj, speed_transit)
     # Begin cicular motion using LinearVelocity = (Radius)(AngularVelocity)
-    while (getattr(robot['simu'], robot['name']).waypoint.get_status() == "Transit"):
-        time.sleep(0.5)
+    wait_for_arrival(robot)
     halt(robot)
     motion_circle(robot, radius, speed_angular)
 
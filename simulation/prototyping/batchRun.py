@@ -0,0 +1,197 @@
+#!/usr/bin/python3
+
+"""
+File: batchRun.py
+
+Runs the scenario sweep of predictPath.py + evaluate.py in-process.
+batchEvaluation.sh runs one interpreter per (round, targets, waypoint mode) for prediction,
+then one more for evaluation, and the altitude and interval are edited by hand between sweeps.
+This script expands the whole parameter grid:
+    rounds x target subsets x waypoint modes x altitudes x intervals
+and runs predict + evaluate for every combination across a process pool.
+The results go to one CSV in the format of results/simu_full.csv, with per-run timing appended.
+
+Target subsets are written with the first letter of each target: S (susan), D (django), A (anton).
+
+Example:
+    python3 batchRun.py -r 4-15 -s SAD,SA,SD,AD -a 10,50,75 -i 5,10 -o ../results/simu_batch.csv
+"""
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from targetFiles import readWaypoints, readStart, readObservedPath
+from roundCache import loadRound, loadTargets
+
+targetLetters = {'S':'susan', 'D':'django', 'A':'anton'}
+
+header = "Interval_s,ScenarioID,Targets,UsingWaypoints,Altitude_m,ProportionInView,NumRepositions,PredictTime_s,EvaluateTime_s"
+
+
+def parseRange (text):
+    """
+    Function: parseRange
+    Purpose:
+        Parses '2-15' or '4,6,8' (or a mix, '2-5,9') into a list of ints
+    """
+    values = []
+    for part in text.split (","):
+        if ("-" in part):
+            low, high = part.split ("-")
+            values.extend (range (int (low), int (high) + 1))
+        else:
+            values.append (int (part))
+    return values
+
+def parseBool (text):
+    return text.strip ().upper () in ("TRUE", "T", "1", "YES")
+
+def expandGrid (rounds, subsets, waypointModes, altitudes, intervals):
+    """
+    Function: expandGrid
+    Purpose:
+        Returns one job dict per combination of the sweep parameters
+    """
+    jobs = []
+    for interval in intervals:
+        for altitude in altitudes:
+            for r in rounds:
+                for useWaypoints in waypointModes:
+                    for subset in subsets:
+                        jobs.append ({'round':r, 'subset':subset, 'useWaypoints':useWaypoints,
+                                      'altitude':altitude, 'interval':interval})
+    return jobs
+
+def loadJobTargets (names, waypoint_dir, path_dir, withTime, cache):
+    if (cache):
+        return loadTargets (names, waypoint_dir, path_dir, withTime = withTime)
+    targets = [{'name':x, 'position_prev':(None, None), 'position':(None, None), 'source':(None, None), 'speed':None} for x in names]
+    for t in targets:
+        t['waypoints'] = readWaypoints (waypoint_dir + t['name'] + ".waypoints")
+        t['position'] = readStart (waypoint_dir + t['name'] + ".start")
+        t['source'] = t['position']
+        t['observed_path'] = readObservedPath (path_dir + t['name'] + ".path", t['source'], withTime = withTime)
+    return targets
+
+def runJob (job, inDir, outDir, cache = False, writeCoverage = False):
+    """
+    Function: runJob
+    Arguments:
+        job: one entry of expandGrid ()
+        inDir: directory containing the roundN/ waypoint directories
+        outDir: directory containing the roundN/ path directories
+        cache: if True, load inputs through the round's binary cache
+        writeCoverage: if True, also write the coverage CSV next to the round's path data,
+            named as by batchEvaluation.sh
+    Purpose:
+        Runs predictPath then evaluate for one combination
+    Returns:
+        The job dict, with the evaluation results and the time spent in each step
+    """
+    from predictPath import initQuad, planCoverage, formatCoverageRow
+    from evaluate import evaluateCoverage
+
+    names = [targetLetters[c] for c in job['subset']]
+    waypoint_dir = os.path.join (inDir, "round{0}".format (job['round']), "")
+    path_dir = os.path.join (outDir, "round{0}".format (job['round']), "")
+
+    start = time.perf_counter ()
+    targets = loadJobTargets (names, waypoint_dir, path_dir, False, cache)
+    coverage = planCoverage (targets, initQuad (job['altitude']), job['useWaypoints'], job['interval'])
+    predictTime = time.perf_counter () - start
+
+    if (writeCoverage):
+        label = names[0] + ''.join (n.capitalize () for n in names[1:])
+        fh = path_dir + "{0}_coverage{1}__{2}m__{3}s.csv".format (label, "" if job['useWaypoints'] else "_NoWay",
+                                                                 job['altitude'], job['interval'])
+        with open (fh, 'w') as f:
+            for footprint, time_s in coverage:
+                f.write (formatCoverageRow (footprint, time_s) + "\n")
+
+    start = time.perf_counter ()
+    targets = loadJobTargets (names, waypoint_dir, path_dir, True, cache)
+    coverageData = [[c for corner in footprint for c in corner] + [time_s] for footprint, time_s in coverage]
+    proportion, numRepositions = evaluateCoverage (targets, coverageData)
+    evaluateTime = time.perf_counter () - start
+
+    result = dict (job)
+    result.update ({'proportion':proportion, 'numRepositions':numRepositions,
+                    'predictTime':predictTime, 'evaluateTime':evaluateTime})
+    return result
+
+def formatResultRow (result):
+    return "{0},{1},{2},{3},{4},{5},{6},{7:.6f},{8:.6f}".format (
+        result['interval'], result['round'], result['subset'], "TRUE" if result['useWaypoints'] else "FALSE",
+        result['altitude'], result['proportion'], result['numRepositions'],
+        result['predictTime'], result['evaluateTime'])
+
+def warmCaches (jobs, inDir, outDir):
+    """
+    Function: warmCaches
+    Purpose:
+        Brings the binary cache of every round in the jobs up to date, with all of the round's targets,
+        so that the workers only read it: each worker that found entries missing would rewrite
+        the round's single cache file, and the last one would drop the others' entries
+    """
+    rounds = {}
+    for job in jobs:
+        names = rounds.setdefault (job['round'], [])
+        names.extend (n for n in (targetLetters[c] for c in job['subset']) if n not in names)
+    for r, names in rounds.items ():
+        loadRound (names, os.path.join (inDir, "round{0}".format (r), ""), os.path.join (outDir, "round{0}".format (r), ""))
+
+def runBatch (jobs, inDir, outDir, workers = None, cache = False, writeCoverage = False):
+    """
+    Function: runBatch
+    Purpose:
+        Runs every job across a process pool. Results are returned in job order.
+        With cache, the rounds' caches are filled first, in this process.
+    """
+    if (cache):
+        warmCaches (jobs, inDir, outDir)
+    with ProcessPoolExecutor (max_workers = workers) as pool:
+        futures = [pool.submit (runJob, job, inDir, outDir, cache, writeCoverage) for job in jobs]
+        return [f.result () for f in futures]
+
+def main ():
+    # Parse arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-w", "--waypoint_dir", help = "directory containing roundN/ waypoint data", default = "../inData/")
+    parser.add_argument("-p", "--path_dir", help = "directory containing roundN/ path data", default = "../outData/")
+    parser.add_argument("-r", "--rounds", help = "scenario rounds, e.g. 4-15 or 4,5,6", default = "4-15")
+    parser.add_argument("-s", "--subsets", help = "comma-separated target subsets (S: susan, D: django, A: anton)", default = "SAD,SA,SD,AD")
+    parser.add_argument("-u", "--use_waypoints", help = "comma-separated waypoint modes", default = "TRUE,FALSE")
+    parser.add_argument("-a", "--altitudes", help = "comma-separated altitudes (m)", default = "10,50,75")
+    parser.add_argument("-i", "--intervals", help = "comma-separated times to stay in position (s)", default = "5,10")
+    parser.add_argument("-j", "--jobs", help = "number of worker processes (default: all cores)", type = int)
+    parser.add_argument("-c", "--cache", help = "load inputs through the rounds' binary caches", action = "store_true")
+    parser.add_argument("-k", "--keep_coverage", help = "also write each run's coverage CSV into its round's path directory", action = "store_true")
+    parser.add_argument("-o", "--output", help = "output CSV (default: stdout)")
+    args = parser.parse_args()
+
+    for subset in args.subsets.split (","):
+        if (not subset or any (c not in targetLetters for c in subset)):
+            print ("Unknown target subset: {0}".format (subset))
+            exit (1)
+
+    jobs = expandGrid (parseRange (args.rounds), args.subsets.split (","),
+                       [parseBool (m) for m in args.use_waypoints.split (",")],
+                       parseRange (args.altitudes), parseRange (args.intervals))
+
+    start = time.perf_counter ()
+    results = runBatch (jobs, args.waypoint_dir, args.path_dir, args.jobs, args.cache, args.keep_coverage)
+    elapsed = time.perf_counter () - start
+
+    rows = [header] + [formatResultRow (r) for r in results]
+    if (args.output is None):
+        print ("\n".join (rows))
+    else:
+        with open (args.output, 'w') as f:
+            f.write ("\n".join (rows) + "\n")
+    print ("[+] {0} runs in {1:.2f} s".format (len (results), elapsed), file = sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
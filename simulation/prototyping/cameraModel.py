@@ -0,0 +1,145 @@
+#!/usr/bin/python3
+
+"""
+File: cameraModel.py
+
+Ground footprint of the quadcopter's camera, with the camera geometry computed once.
+predictPath.calcGroundFootprint () recomputes the field of view and footprint dimensions every cycle,
+and the main loop then rotates each corner with four rotatePoint () calls.
+The footprint relative to the camera only depends on the camera, gimbal and altitude, which rarely change,
+so CameraModel memoizes those offsets and produces the rotated footprints of a batch of poses
+with one product against their rotation matrices.
+"""
+import math
+import numpy as nm
+from functools import lru_cache
+
+
+@lru_cache (maxsize = 256)
+def fieldOfView (xSensor_mm, ySensor_mm, focallen_mm):
+    """
+    Function: fieldOfView
+    Purpose:
+        Field of view angles (rad) of a camera, as predictPath.calcFieldOfView ()
+    """
+    xView = (2 * math.atan (xSensor_mm / (2 * focallen_mm)))
+    yView = (2 * math.atan (ySensor_mm / (2 * focallen_mm)))
+    return (xView, yView)
+
+@lru_cache (maxsize = 256)
+def footprintOffsets (xSensor_mm, ySensor_mm, focallen_mm, xGimbal_deg, yGimbal_deg, altitude_m):
+    """
+    Function: footprintOffsets
+    Purpose:
+        Unrotated ground footprint corners relative to the camera position, as a read-only (4 x 2) array
+        in the corner order of predictPath.calcGroundFootprint (): lower left, upper left, upper right, lower right
+    """
+    FoV = fieldOfView (xSensor_mm, ySensor_mm, focallen_mm)
+    distFront = altitude_m * (math.tan(nm.radians (xGimbal_deg) + 0.5 * FoV[0]))
+    distBehind = altitude_m * (math.tan(nm.radians (xGimbal_deg) - 0.5 * FoV[0]))
+    distLeft = altitude_m * (math.tan(nm.radians (yGimbal_deg) - 0.5 * FoV[1]))
+    distRight = altitude_m * (math.tan(nm.radians (yGimbal_deg) + 0.5 * FoV[1]))
+    offsets = nm.array ([(distLeft, distBehind), (distLeft, distFront), (distRight, distFront), (distRight, distBehind)])
+    offsets.flags.writeable = False
+    return offsets
+
+def footprintExtents (xSensor_mm, ySensor_mm, focallen_mm, xGimbal_deg, yGimbal_deg, altitude_m):
+    """
+    Function: footprintExtents
+    Purpose:
+        (distFront, distBehind, distLeft, distRight) of footprintOffsets (), for arrays of focal lengths,
+        gimbal angles and altitudes that broadcast together, e.g. a grid of candidate camera settings
+    """
+    xView = 2 * nm.arctan (xSensor_mm / (2 * nm.asarray (focallen_mm, dtype = float)))
+    yView = 2 * nm.arctan (ySensor_mm / (2 * nm.asarray (focallen_mm, dtype = float)))
+    xGimbal = nm.radians (xGimbal_deg)
+    yGimbal = nm.radians (yGimbal_deg)
+    return (altitude_m * nm.tan (xGimbal + 0.5 * xView), altitude_m * nm.tan (xGimbal - 0.5 * xView),
+            altitude_m * nm.tan (yGimbal - 0.5 * yView), altitude_m * nm.tan (yGimbal + 0.5 * yView))
+
+
+class CameraModel:
+    """
+    Aerial camera: sensor size, focal length and gimbal angles.
+    """
+
+    def __init__ (self, xSensor_mm, ySensor_mm, focallen_mm, xGimbal_deg = 0, yGimbal_deg = 0):
+        self.xSensor_mm = xSensor_mm
+        self.ySensor_mm = ySensor_mm
+        self.focallen_mm = focallen_mm
+        self.xGimbal_deg = xGimbal_deg
+        self.yGimbal_deg = yGimbal_deg
+
+    @classmethod
+    def fromDict (cls, camera):
+        """
+        Builds a CameraModel from a 'Camera' struct, such as quad['camera'] in predictPath.py
+        """
+        return cls (camera['xSensor_mm'], camera['ySensor_mm'], camera['focallen_mm'],
+                    camera['xGimbal_deg'], camera['yGimbal_deg'])
+
+    def fieldOfView (self):
+        return fieldOfView (self.xSensor_mm, self.ySensor_mm, self.focallen_mm)
+
+    def offsets (self, altitude_m):
+        """
+        Unrotated footprint corners relative to the camera at altitude_m (memoized)
+        """
+        return footprintOffsets (self.xSensor_mm, self.ySensor_mm, self.focallen_mm,
+                                 self.xGimbal_deg, self.yGimbal_deg, altitude_m)
+
+    def dimensions (self, altitude_m):
+        """
+        Returns (distFront, distBehind, distLeft, distRight), as predictPath.calcGroundFootprintDimensions ()
+        """
+        o = self.offsets (altitude_m)
+        return (float (o[1][1]), float (o[0][1]), float (o[0][0]), float (o[2][0]))
+
+    def footprints (self, positions, headings, altitude_m, centers = None):
+        """
+        Arguments:
+            positions: (P x 2) ground positions of the camera
+            headings: (P,) heading angles (rad), counter-clockwise
+            altitude_m: altitude of the camera
+            centers: (P x 2) points to rotate about, default positions
+        Purpose:
+            Returns the (P x 4 x 2) ground footprints of a batch of poses.
+            The corners are placed at each position, then rotated about each center by the heading
+            (the same operations as rotatePoint () on every corner of calcGroundFootprint ())
+        """
+        positions = nm.asarray (positions, dtype = float).reshape (-1, 2)
+        headings = nm.asarray (headings, dtype = float).reshape (-1)
+        centers = positions if centers is None else nm.asarray (centers, dtype = float).reshape (-1, 2)
+        rel = (positions[:, None, :] + self.offsets (altitude_m)) - centers[:, None, :]
+        # Rotation matrix of each pose applied to its corners
+        c = nm.cos (headings)[:, None]
+        s = nm.sin (headings)[:, None]
+        rotated = nm.empty_like (rel)
+        rotated[..., 0] = rel[..., 0] * c - rel[..., 1] * s
+        rotated[..., 1] = rel[..., 0] * s + rel[..., 1] * c
+        return rotated + centers[:, None, :]
+
+    def footprint (self, position, heading, altitude_m, center = None):
+        """
+        Returns the ground footprint of one pose as a list of 4 (x, y) corners
+        """
+        f = self.footprints ([position], [heading], altitude_m, None if center is None else [center])
+        return [tuple (p) for p in f[0].tolist ()]
+
+
+def pointsInQuad (quad, points):
+    """
+    Function: pointsInQuad
+    Arguments:
+        quad: (4 x 2) corners of a convex quadrilateral, such as a ground footprint, in order,
+            or a (... x 4 x 2) array of quadrilaterals that broadcasts against points
+        points: (... x 2) array of points
+    Purpose:
+        Half-plane test of every point against every edge of its quadrilateral.
+        Returns a boolean array, True where a point is strictly inside
+        (as shapely's Polygon.contains: points on an edge are outside)
+    """
+    edges = nm.roll (quad, -1, axis = -2) - quad
+    rel = points[..., None, :] - quad
+    cross = edges[..., 0] * rel[..., 1] - edges[..., 1] * rel[..., 0]
+    return nm.all (cross > 0, axis = -1) | nm.all (cross < 0, axis = -1)
@@ -0,0 +1,143 @@
+#!/usr/bin/python3
+
+"""
+File: evaluateCheck.py
+
+Regression check of evaluate.evaluateCoverage () against evaluate.evaluateCoverageLoop ().
+Every <targets>_coverage*.csv file under the roundN/ directories of the path data is evaluated
+with both implementations, which must report the same proportion in view and number of repositions.
+
+It is also evaluated with evaluate.evaluateCoverageGrid (), against the targets' positions at log time.
+At the kept even seconds those are the observations themselves, so the two may only differ where they pair
+different positions with a coverage second:
+    - second 0, which evaluateCoverage () tests with the .start position and the grid with the first kept status
+      (gridStartSeconds)
+    - every second, when the targets' logs start at different even seconds: evaluateCoverage () pairs the s-th
+      observation of every target, the grid the positions at the same time. Those files must stay within
+      gridTolerance, and all files within gridMeanTolerance on average
+(a grid that maps coverage seconds one observation late, or from the odd second a log may start on, fails
+the per-file checks on dozens of files; one that maps them deltaT_s times too slow is off by about 0.24 on average).
+That comparison stops at the end of the observations (the last footprint of predictPath.py always outlasts them):
+past the end, evaluateCoverage () reuses the last position consumed (see evaluate.replayWindow ()),
+while the grid holds each target's last position.
+"""
+import os
+import re
+import glob
+import time
+import argparse
+import copy
+from evaluate import evaluateCoverage, evaluateCoverageLoop, evaluateCoverageGrid, resolveObservations
+from replayGrid import ReplayGrid
+from targetFiles import readWaypoints, readStart, readObservedPath
+
+# Coverage files are named after their targets, e.g. susanDjangoAnton_coverage__75m__5s.csv
+coveragePattern = re.compile (r"^((?:[a-z]+)(?:[A-Z][a-z]+)*)_coverage.*\.csv$")
+
+# Largest difference between the grid and the default evaluation: seconds in view when the logs start together,
+# proportion in view per file when they do not, and proportion in view on average over all files
+gridStartSeconds = 1
+gridTolerance = 0.1
+gridMeanTolerance = 0.01
+
+
+def namesFromCoverageFile (fh):
+    match = coveragePattern.match (os.path.basename (fh))
+    if (match is None):
+        return None
+    return [n.lower () for n in re.findall ('[A-Za-z][a-z]+', match.group (1))]
+
+def loadCoverage (fh):
+    with open (fh) as f:
+        return [line.rstrip ().split (",") for line in f if line.strip ()]
+
+def truncateCoverage (coverageData, total):
+    """
+    Function: truncateCoverage
+    Purpose:
+        Returns the coverage rows cut to their first 'total' seconds
+    """
+    rows = []
+    for c in coverageData:
+        if (total <= 0):
+            break
+        duration = min (int (c[8]), total)
+        rows.append (c[0:8] + [str (duration)])
+        total = total - duration
+    return rows
+
+def firstKeptTime (t):
+    """
+    Function: firstKeptTime
+    Purpose:
+        Returns the time of the first observation logged by a target (after its start position), or None
+    """
+    for observation in t['observed_path'][1:]:
+        if (observation != 'A'):
+            return observation[2]
+    return None
+
+def main ():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-w", "--waypoint_dir", help = "directory containing roundN/ waypoint data", default = "../inData/")
+    parser.add_argument("-p", "--path_dir", help = "directory containing roundN/ path data", default = "../outData/")
+    args = parser.parse_args()
+
+    numChecked = 0
+    numFailed = 0
+    gridDifferences = []
+    timeLoop = 0.0
+    timeVector = 0.0
+    for path_dir in sorted (glob.glob (os.path.join (args.path_dir, "round*", ""))):
+        waypoint_dir = os.path.join (args.waypoint_dir, os.path.basename (os.path.dirname (path_dir)), "")
+        for fh in sorted (glob.glob (path_dir + "*_coverage*.csv")):
+            names = namesFromCoverageFile (fh)
+            if (names is None or any (not os.path.exists (path_dir + n + ".path") for n in names)):
+                continue
+            coverageData = loadCoverage (fh)
+            if (len (coverageData) == 0):
+                continue
+            targets = []
+            for n in names:
+                start = readStart (waypoint_dir + n + ".start")
+                targets.append ({'name':n, 'waypoints':readWaypoints (waypoint_dir + n + ".waypoints"),
+                                 'observed_path':readObservedPath (path_dir + n + ".path", start, withTime = True)})
+            start = time.perf_counter ()
+            expected = evaluateCoverageLoop (copy.deepcopy (targets), coverageData)
+            timeLoop = timeLoop + time.perf_counter () - start
+            start = time.perf_counter ()
+            result = evaluateCoverage (targets, coverageData)
+            timeVector = timeVector + time.perf_counter () - start
+            numChecked = numChecked + 1
+            if (result != expected):
+                numFailed = numFailed + 1
+                print ("[-] {0}: expected {1}, got {2}".format (fh, expected, result))
+
+            observed = truncateCoverage (coverageData, min (len (resolveObservations (t)) for t in targets))
+            result = evaluateCoverage (targets, observed)
+            gridResult = evaluateCoverageGrid (ReplayGrid.fromLogs (names, path_dir), observed)
+            gridDifferences.append (abs (gridResult[0] - result[0]))
+            if (len (set (firstKeptTime (t) for t in targets)) == 1):
+                outside = gridDifferences[-1] * sum (int (c[8]) for c in observed) > gridStartSeconds + 1e-9
+            else:
+                outside = gridDifferences[-1] > gridTolerance
+            if (outside or gridResult[1] != result[1]):
+                numFailed = numFailed + 1
+                print ("[-] {0}: grid evaluation {1}, default {2}, over the observations".format (fh, gridResult, result))
+
+    print ("Checked {0} coverage files".format (numChecked))
+    print ("Loop: {0:.4f} s, Vectorized: {1:.4f} s".format (timeLoop, timeVector))
+    meanDifference = sum (gridDifferences) / max (len (gridDifferences), 1)
+    print ("Grid vs default proportion in view, over the observations: mean difference {0:.4f}, max {1:.4f}".format (
+        meanDifference, max (gridDifferences, default = 0)))
+    if (meanDifference > gridMeanTolerance):
+        numFailed = numFailed + 1
+        print ("[-] Grid evaluation differs from the default by {0:.4f} on average".format (meanDifference))
+    if (numFailed > 0):
+        print ("[-] {0} evaluations differ".format (numFailed))
+        exit (1)
+    print ("[+] Vectorized evaluation matches evaluateCoverageLoop (), grid evaluation agrees with it")
+
+
+if __name__ == "__main__":
+    main()
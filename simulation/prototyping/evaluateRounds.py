@@ -0,0 +1,196 @@
+#!/usr/bin/python3
+
+"""
+File: evaluateRounds.py
+
+Evaluates every coverage file already written under a tree of rounds, and writes one results table.
+evaluate.py scores one coverage CSV against one round per invocation, and results/simu_full.csv was
+assembled by hand from those runs (batchEvaluation.sh plus the info__*.csv files).
+This script instead:
+    1. finds every <targets>_coverage[_NoWay][__<altitude>m][__<interval>s].csv under path_dir/roundN/
+    2. decodes the target subset, waypoint mode, altitude and interval from the file name
+    3. evaluates each round's files in one worker of a process pool, so that a round's paths are parsed
+       once and shared by all of its coverage files
+The table has the columns of results/simu_full.csv, then the coverage file.
+A file without an interval in its name was written with predictPath.py's default interval (10 s).
+A file without an altitude in its name is skipped, unless -u is given; its Altitude_m is then NA.
+
+Target subsets are written with the first letter of each target, in the order of simu_full.csv: S (susan), A (anton), D (django).
+The targets are evaluated in that order too, as batchEvaluation.sh did: once a target's observations run out,
+evaluate.py carries over the last position consumed, so the order can change the result.
+With -g, each file is evaluated against the targets' interpolated positions at log time instead
+(evaluate.evaluateCoverageGrid (): coverage second s > 0 is log time deltaT_s * (s - 1) after the first kept status).
+On the recorded rounds its proportions stay within about 0.006 of the default on average (see evaluateCheck.py).
+
+Example:
+    python3 evaluateRounds.py -o ../results/simu_full.csv
+"""
+import os
+import re
+import sys
+import glob
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from batchRun import loadJobTargets
+
+header = "Interval_s,ScenarioID,Targets,UsingWaypoints,Altitude_m,ProportionInView,NumRepositions,CoverageFile"
+
+# e.g. susanDjangoAnton_coverage_NoWay__75m__5s.csv
+coveragePattern = re.compile (r"^((?:[a-z]+)(?:[A-Z][a-z]+)*)_coverage(_NoWay)?(?:__(\d+)m)?(?:__(\d+)s)?\.csv$")
+
+subsetOrder = "SAD"
+
+defaultInterval_s = 10
+
+
+def decodeCoverageFile (fh):
+    """
+    Function: decodeCoverageFile
+    Arguments:
+        fh: coverage file path
+    Purpose:
+        Returns {'names', 'subset', 'useWaypoints', 'altitude', 'interval'} from the file name
+        (names in subset order, altitude None if absent), or None if it is not a coverage file
+    """
+    match = coveragePattern.match (os.path.basename (fh))
+    if (match is None):
+        return None
+    names = [n.lower () for n in re.findall ('[A-Za-z][a-z]+', match.group (1))]
+    names.sort (key = lambda n: subsetOrder.find (n[0].upper ()))
+    return {'names':names, 'subset':''.join (n[0].upper () for n in names), 'useWaypoints':match.group (2) is None,
+            'altitude':None if match.group (3) is None else int (match.group (3)),
+            'interval':defaultInterval_s if match.group (4) is None else int (match.group (4))}
+
+def findCoverageFiles (path_dir, rounds = None, withUnknownAltitude = False):
+    """
+    Function: findCoverageFiles
+    Arguments:
+        path_dir: directory containing the roundN/ path directories
+        rounds: round numbers to include, default all
+        withUnknownAltitude: include files without an altitude in their name
+    Purpose:
+        Returns {round: [job, ...]}, one job (decodeCoverageFile () plus 'round' and 'file') per coverage file
+        whose targets all have a .path log in the round
+    """
+    jobs = {}
+    for round_dir in glob.glob (os.path.join (path_dir, "round*", "")):
+        match = re.match (r"round(\d+)$", os.path.basename (os.path.dirname (round_dir)))
+        if (match is None or (rounds is not None and int (match.group (1)) not in rounds)):
+            continue
+        r = int (match.group (1))
+        for fh in sorted (glob.glob (round_dir + "*_coverage*.csv")):
+            job = decodeCoverageFile (fh)
+            if (job is None or (job['altitude'] is None and not withUnknownAltitude)):
+                continue
+            if (any (not os.path.exists (round_dir + n + ".path") for n in job['names'])):
+                continue
+            job.update ({'round':r, 'file':fh})
+            jobs.setdefault (r, []).append (job)
+    return jobs
+
+def loadCoverage (fh):
+    with open (fh) as f:
+        return [line.rstrip ().split (",") for line in f if line.strip ()]
+
+def evaluateRound (jobs, waypoint_dir, path_dir, cache = False, grid = False):
+    """
+    Function: evaluateRound
+    Arguments:
+        jobs: the coverage files of one round, from findCoverageFiles ()
+        waypoint_dir, path_dir: the round's directories
+        cache: load inputs through the round's binary cache
+        grid: evaluate against the targets' positions at log time (evaluate.evaluateCoverageGrid ()),
+            one coverage second per deltaT_s of log time
+    Purpose:
+        Parses the paths of every target named by the round's files once, then evaluates every file
+    Returns:
+        The jobs, each with 'proportion' and 'numRepositions' (None for an empty coverage file)
+    """
+    from evaluate import evaluateCoverage, evaluateCoverageGrid
+    from replayGrid import ReplayGrid
+
+    names = sorted ({n for job in jobs for n in job['names']})
+    if (grid):
+        grids = {}
+    else:
+        targets = dict (zip (names, loadJobTargets (names, waypoint_dir, path_dir, True, cache)))
+
+    results = []
+    for job in jobs:
+        result = dict (job)
+        result['proportion'] = result['numRepositions'] = None
+        coverageData = loadCoverage (job['file'])
+        if (len (coverageData) > 0):
+            if (grid):
+                key = tuple (job['names'])
+                if (key not in grids):
+                    grids[key] = ReplayGrid.fromLogs (job['names'], path_dir)
+                result['proportion'], result['numRepositions'] = evaluateCoverageGrid (grids[key], coverageData)
+            else:
+                result['proportion'], result['numRepositions'] = evaluateCoverage ([targets[n] for n in job['names']], coverageData)
+        results.append (result)
+    return results
+
+def evaluateTree (waypoint_dir, path_dir, rounds = None, withUnknownAltitude = False, workers = None, cache = False, grid = False):
+    """
+    Function: evaluateTree
+    Purpose:
+        Evaluates every coverage file under path_dir across a process pool, one round per task.
+        Returns the results sorted as the rows of results/simu_full.csv.
+    """
+    jobs = findCoverageFiles (path_dir, rounds, withUnknownAltitude)
+    results = []
+    with ProcessPoolExecutor (max_workers = workers) as pool:
+        futures = [pool.submit (evaluateRound, jobs[r],
+                                os.path.join (waypoint_dir, "round{0}".format (r), ""),
+                                os.path.join (path_dir, "round{0}".format (r), ""), cache, grid)
+                   for r in sorted (jobs)]
+        for f in futures:
+            results.extend (f.result ())
+    results.sort (key = lambda r: (-r['interval'], -1 if r['altitude'] is None else r['altitude'], r['round'],
+                                   not r['useWaypoints'], -len (r['subset']), [subsetOrder.find (c) for c in r['subset']],
+                                   r['file']))
+    return results
+
+def formatResultRow (result):
+    return "{0},{1},{2},{3},{4},{5},{6},{7}".format (
+        result['interval'], result['round'], result['subset'], "TRUE" if result['useWaypoints'] else "FALSE",
+        "NA" if result['altitude'] is None else result['altitude'],
+        "NA" if result['proportion'] is None else result['proportion'],
+        "NA" if result['numRepositions'] is None else result['numRepositions'],
+        os.path.basename (result['file']))
+
+def main ():
+    from batchRun import parseRange
+
+    # Parse arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-w", "--waypoint_dir", help = "directory containing roundN/ waypoint data", default = "../inData/")
+    parser.add_argument("-p", "--path_dir", help = "directory containing roundN/ path data", default = "../outData/")
+    parser.add_argument("-r", "--rounds", help = "scenario rounds, e.g. 4-15 or 4,5,6 (default: all)")
+    parser.add_argument("-u", "--unknown_altitude", help = "also evaluate coverage files without an altitude in their name", action = "store_true")
+    parser.add_argument("-j", "--jobs", help = "number of worker processes (default: all cores)", type = int)
+    parser.add_argument("-c", "--cache", help = "load inputs through the rounds' binary caches", action = "store_true")
+    parser.add_argument("-g", "--grid", help = "evaluate against the targets' positions at log time (see replayGrid.py)", action = "store_true")
+    parser.add_argument("-o", "--output", help = "output CSV (default: stdout)")
+    args = parser.parse_args()
+
+    rounds = None if args.rounds is None else parseRange (args.rounds)
+    start = time.perf_counter ()
+    results = evaluateTree (args.waypoint_dir, args.path_dir, rounds, args.unknown_altitude, args.jobs, args.cache, args.grid)
+    elapsed = time.perf_counter () - start
+
+    rows = [header] + [formatResultRow (r) for r in results]
+    if (args.output is None):
+        print ("\n".join (rows))
+    else:
+        with open (args.output, 'w') as f:
+            f.write ("\n".join (rows) + "\n")
+    print ("[+] {0} coverage files in {1} rounds in {2:.2f} s".format (len (results), len ({r['round'] for r in results}), elapsed),
+           file = sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
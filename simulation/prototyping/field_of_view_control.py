@@ -1,7 +1,9 @@
+#!/usr/bin/python3
+
 """
 File:   field_of_view_control.py
 
-This file is calculates the FOV, stand-off distance etc. from the location of
+This file calculates the FOV, stand-off distance etc. from the location of
 the targets and makes decisions for tilt, zoom (camera) and yaw and other
 manuvers of the UAV.
 
@@ -11,11 +13,23 @@ by by invoking correponding functions: yaw towards target, tilt camera,
 calculate stand-off distance, move towards target etc.) All the required params
 are then populated in a struct and send to the UAV.
 
-As of now ,this module does NOT consider the predictions from the predictPath
-module and this would be done later. Also not all the functionality need not be
-in this file, they could be segregated based on the nature  ex. calculating FOV
-and verification as one module while the maneuvers as a different module.
-
+One control cycle (check_targets):
+    1. oriented minimum bounding rectangle of the targets (minimum_bounding_rectangle),
+       grown by slack_factor since the targets keep moving
+    2. every (tilt, zoom) setting of the camera is evaluated at once; the most zoomed-in
+       setting whose footprint holds the rectangle wins (zoom is preferred over moving, see zoom.md).
+       If none does at the current altitude, the setting needing the smallest climb wins
+    3. yaw aligns the long side of the footprint with the long side of the rectangle
+    4. the UAV moves so that the footprint is centered on the rectangle
+The UAV is the 'Quad' struct of predictPath.initQuad (), and the footprint is the one of
+cameraModel.CameraModel, so the result is what predictPath.py and evaluate.py would see.
+The targets' positions may include their predicted positions (predictPath.predictPathBatch ())
+to keep the future path in view too.
+A cycle costs O(N) array operations plus a Python hull pass over the few points left
+by the Akl-Toussaint filter: see main () for the rate on large groups.
+
+Example: benchmark and self-check
+    python3 field_of_view_control.py -n 10,1000,100000
 """
 
 
@@ -37,66 +51,241 @@ struct uav_control_params
     int zoom;       //zoom in steps (0 being no zoom)
 };
 ========================================================================
+Units: meters, degrees (yaw_delta counter-clockwise), meters per second.
+x_delta is along the footprint's front direction, y_delta along its right direction,
+both after the yaw. tilt is the gimbal angle of the camera's tilting axis ('yGimbal_deg'),
+zoom the step of the focal length between the ends of zoom_range_mm.
 """
 
-from planar import BoundingBox
+import sys
+import math
+import time
+import argparse
+import numpy as nm
+from cameraModel import CameraModel, footprintExtents, pointsInQuad
 
-"""
-Function: BoundingBox
-INPUTS:
-    co-ordinates of the EMILY's
-OUTPUT:
-    two coordinate points (max and minimum coordinate for the bounding rectangle)
-
-DETAILS:
-    The returned boundingBox box is with the minimum area i.e it exactly
-    encloses all the points (max and min values lie  on the BoundingBox).
-
-    Our requirement could be interpreted as: keeping this bounding box within
-    the FOV. We also need to consider that the points would be in motion. It
-    would be efficient to have some slack in the heading direction (derived
-    from the predicitPath module) and keeping the FOV closer to the lower edge
-    of the BoundingBox. This way we could increase the duration of the targets
-    lying within the FOV.
-
-    Also before calculating the FOV and maneuvering the UAV, stand-off distance
-    must be calculated (Move closer if distance is more or vice versa).
-"""
-bbox = BoundingBox([(0,0), (1,2), (-5,6), (-3,2), (0.5,-1)])
+# Camera limits
+zoom_range_mm = (3.61, 36.1)
+zoom_steps = 10
+tilt_range_deg = (0, 50)
+max_view_angle_deg = 80
 
-#for math verification
-print(bbox)
+# Altitude range: 0.3 (30 ft) to 3.9 (390 ft), in units of 100 ft
+altitude_range = (0.3, 3.9)
+feet_to_m = 0.3048
 
+# The rectangle to fit is grown by this factor, so that moving targets stay in view
+slack_factor = 1.2
+min_box_m = 1.0
 
-def check_targets(input_coordinates):
-   """
+# Speed to reach the new position in about approach_s
+approach_s = 5
+max_speed_mps = 15
+
+
+def zoom_focal_lengths ():
+    """
+    Focal length (mm) of each zoom step, geometrically spaced over zoom_range_mm
+    """
+    return zoom_range_mm[0] * (zoom_range_mm[1] / zoom_range_mm[0]) ** (nm.arange (zoom_steps + 1) / zoom_steps)
+
+
+def convex_hull (points):
+    """
+ INPUTS:
+    points: (N x 2) array
+ OUTPUT:
+    (H x 2) array of the hull vertices, counter-clockwise, without collinear points
+
+ DETAILS:
+    Akl-Toussaint filter: the points that are extreme along 8 directions form
+    a convex octagon, and no point strictly inside it can be a hull vertex.
+    The directions are evenly spaced after whitening the points by their
+    covariance (an affine map, which keeps the hull), so the octagon keeps
+    its area on long, thin groups.
+    That test is one array operation; Andrew's monotone chain then only runs
+    on the points that are left.
+    """
+    points = nm.asarray (points, dtype = float).reshape (-1, 2)
+    if (len (points) > 8):
+        # 8 directions of the whitened points, so that the octagon does not collapse on elongated groups
+        variances, axes = nm.linalg.eigh (nm.cov (points.T))
+        variances = nm.maximum (variances, 1e-12 * variances.max () + 1e-300)
+        if (nm.linalg.det (axes) < 0):
+            axes[:, 1] = -axes[:, 1]
+        angles = nm.arange (8) * 0.25 * math.pi
+        directions = (nm.stack ((nm.cos (angles), nm.sin (angles)), axis = 1) / nm.sqrt (variances)) @ axes.T
+        extreme = nm.argmax (points @ directions.T, axis = 0)
+        extreme = extreme[extreme != nm.roll (extreme, 1)]
+        if (len (nm.unique (extreme)) >= 3):
+            # Edge by edge (as pointsInQuad (), without its N x 8 temporaries)
+            octagon = points[extreme]
+            inside = nm.ones (len (points), dtype = bool)
+            for a, b in zip (octagon, nm.roll (octagon, -1, axis = 0)):
+                inside &= (b[0] - a[0]) * (points[:, 1] - a[1]) - (b[1] - a[1]) * (points[:, 0] - a[0]) > 0
+            points = points[~inside]
+    # Sorted by x, then y, without duplicates
+    points = nm.unique (points, axis = 0)
+    if (len (points) < 3):
+        return points
+
+    def chain (sorted_points):
+        hull = []
+        for p in sorted_points:
+            while (len (hull) >= 2 and
+                   (hull[-1][0] - hull[-2][0]) * (p[1] - hull[-2][1]) - (hull[-1][1] - hull[-2][1]) * (p[0] - hull[-2][0]) <= 0):
+                hull.pop ()
+            hull.append (p)
+        return hull
+    listed = points.tolist ()
+    lower = chain (listed)
+    upper = chain (listed[::-1])
+    return nm.array (lower[:-1] + upper[:-1])
+
+
+def minimum_bounding_rectangle (input_coordinates):
+    """
+ INPUTS:
+    input_coordinates: (N x 2) co-ordinates of the targets
+ OUTPUT:
+    dict of
+        'center':  (x, y) of the rectangle
+        'length':  long side (m)
+        'width':   short side (m)
+        'angle':   direction of the long side (rad, in [0, pi))
+        'corners': (4 x 2) corners, counter-clockwise
+
+ DETAILS:
+    Rotating calipers: the minimum-area enclosing rectangle has one side on
+    an edge of the convex hull. Every hull edge is tried at once: the hull is
+    projected on each edge's direction and normal (two H x H products) and the
+    edge with the smallest extent product wins.
+    Replaces planar's BoundingBox, which is axis-aligned.
+    """
+    hull = convex_hull (input_coordinates)
+    if (len (hull) == 0):
+        raise ValueError ("no coordinates")
+    if (len (hull) == 1):
+        return {'center':tuple (hull[0]), 'length':0.0, 'width':0.0, 'angle':0.0, 'corners':nm.repeat (hull, 4, axis = 0)}
+
+    edges = nm.roll (hull, -1, axis = 0) - hull
+    norms = nm.hypot (edges[:, 0], edges[:, 1])
+    edges = edges[norms > 0] / norms[norms > 0, None]
+    normals = nm.stack ((-edges[:, 1], edges[:, 0]), axis = 1)
+    along = hull @ edges.T
+    across = hull @ normals.T
+    alongMin, alongMax = along.min (axis = 0), along.max (axis = 0)
+    acrossMin, acrossMax = across.min (axis = 0), across.max (axis = 0)
+    best = nm.argmin ((alongMax - alongMin) * (acrossMax - acrossMin))
+
+    u, v = edges[best], normals[best]
+    corners = nm.array ([alongMin[best] * u + acrossMin[best] * v, alongMax[best] * u + acrossMin[best] * v,
+                         alongMax[best] * u + acrossMax[best] * v, alongMin[best] * u + acrossMax[best] * v])
+    sideU = alongMax[best] - alongMin[best]
+    sideV = acrossMax[best] - acrossMin[best]
+    if (sideU < sideV):
+        u = v
+    return {'center':tuple (corners.mean (axis = 0)), 'length':float (max (sideU, sideV)), 'width':float (min (sideU, sideV)),
+            'angle':float (math.atan2 (u[1], u[0]) % math.pi), 'corners':corners}
+
+
+def camera_settings (quad):
+    """
+    Current (tilt, zoom) of the quad's camera. The zoom is the step whose focal length is closest.
+    """
+    camera = quad['camera']
+    zoom = int (nm.argmin (nm.abs (zoom_focal_lengths () - camera['focallen_mm'])))
+    return camera['yGimbal_deg'], quad.get ('zoom', zoom)
+
+
+def check_targets (input_coordinates, quad, slack = slack_factor):
+    """
 PRIMARY FUNCTION WHICH INVOKES VARIOUS OTHER MINOR FUNCTIONS
 
-   :param       input_coordinates
-   :return:     none
+   :param       input_coordinates: (N x 2) co-ordinates of the targets
+   :param       quad: 'Quad' struct of predictPath.initQuad () (position, heading, altitude, camera)
+   :param       slack: the bounding rectangle is grown by this factor
+   :return:     uav_control_params, as a dict of ints
 
    :details:
-   Verify if the targets exist within the current FOV. Complex : Need to project
-   the UAV's current FOV in terms of GPS co-ordinates (with only current GPS
-   co-ordinate of UAV, altitude, camera resolution and aspect-ratio).
+   The rectangle is compared with the footprint of every (tilt, zoom) setting
+   at the current altitude; the footprint's sides scale with the altitude,
+   so the climb needed by a setting that does not hold it follows directly.
 
    PSEUDO CODE:
-    If not within FOV
-        target heading in same direction (same line of sight)
-            zoom: if zoom would help
-            tilt: if tilting camera would help
-            move closer if neither helps (reduce standoff distance)
-        target not within line of sight
-            yaw: check if changing yaw would help (targets are moving sideways)
-    If within FOV
-        check in which quadrant the targets are predominantly (divide into 4 quadrants)
-            tilt/yaw/move accordingly
-
+    If a setting holds the rectangle at this altitude
+        zoom: the most zoomed-in of those settings
+        tilt: the one closest to the current tilt
+    Else
+        move up: as little as possible (smallest needed altitude over all settings),
+                 at most to the top of altitude_range; a group larger than that footprint
+                 is not held entirely
+    yaw: align the long sides of the footprint and of the rectangle
+    move: center the footprint on the rectangle
    """
-    return []
-
-
-def calculate_standoff_distance( altitude, proximity_factor):
+    box = minimum_bounding_rectangle (input_coordinates)
+    boxLength = max (box['length'] * slack, min_box_m)
+    boxWidth = max (box['width'] * slack, min_box_m)
+
+    camera = quad['camera']
+    altitude = quad['altitude']
+    tilt, zoom = camera_settings (quad)
+
+    # Footprint of every (tilt, zoom) setting, at the current altitude
+    tilts = nm.arange (tilt_range_deg[0], tilt_range_deg[1] + 1)[:, None]
+    focals = zoom_focal_lengths ()[None, :]
+    front, behind, left, right = nm.broadcast_arrays (*footprintExtents (camera['xSensor_mm'], camera['ySensor_mm'], focals,
+                                                                         camera['xGimbal_deg'], tilts, altitude))
+    halfView = nm.degrees (nm.arctan (camera['ySensor_mm'] / (2 * focals)))
+    valid = (nm.abs (tilts) + halfView < max_view_angle_deg) & (nm.abs (camera['xGimbal_deg']) + halfView < max_view_angle_deg)
+    sideX = right - left
+    sideY = front - behind
+    # Altitude scale at which each setting just holds the rectangle
+    scale = nm.maximum (boxLength / nm.maximum (sideX, sideY), boxWidth / nm.minimum (sideX, sideY))
+    scale = nm.where (valid, scale, nm.inf)
+
+    fits = scale <= 1
+    if (nm.any (fits)):
+        # Most zoom, then least tilt change
+        cost = nm.where (fits, -1000 * nm.arange (zoom_steps + 1)[None, :] + nm.abs (tilts - tilt), nm.inf)
+        newAltitude = altitude
+    else:
+        cost = scale
+        # Climb as little as needed, up to the ceiling; above the ceiling already, hold the altitude
+        newAltitude = max (altitude, min (math.ceil (altitude * scale.min ()), altitude_range[1] * 100 * feet_to_m))
+    t, z = nm.unravel_index (nm.argmin (cost), cost.shape)
+    newTilt = int (tilts[t, 0])
+    dims = [float (d[t, z]) * newAltitude / altitude for d in (front, behind, left, right)]
+
+    # Yaw: the footprint's long side along the rectangle's; heading turns local x
+    heading = quad.get ('heading_angle', quad['heading'])
+    longAxis = 0 if (dims[3] - dims[2] >= dims[0] - dims[1]) else 0.5 * math.pi
+    newHeading = box['angle'] - longAxis
+    yaw = (newHeading - heading + 0.5 * math.pi) % math.pi - 0.5 * math.pi
+    if (box['length'] * slack <= min_box_m):
+        # A point or a tight group has no long side to follow
+        yaw = 0
+    yaw_delta = int (round (math.degrees (yaw)))
+    newHeading = heading + math.radians (yaw_delta)
+
+    # Move: footprint center onto the rectangle's center
+    c, s = math.cos (newHeading), math.sin (newHeading)
+    offset = (0.5 * (dims[2] + dims[3]), 0.5 * (dims[0] + dims[1]))
+    offset = (offset[0] * c - offset[1] * s, offset[0] * s + offset[1] * c)
+    move = (box['center'][0] - offset[0] - quad['position'][0], box['center'][1] - offset[1] - quad['position'][1])
+    distance = math.hypot (*move)
+
+    return {'x_delta':int (round (-move[0] * s + move[1] * c)),
+            'y_delta':int (round (move[0] * c + move[1] * s)),
+            'z_delta':int (newAltitude - altitude),
+            'yaw_delta':yaw_delta,
+            'standoff':int (round (math.hypot (*offset))),
+            'speed':int (min (math.ceil (distance / approach_s), max_speed_mps)),
+            'tilt':newTilt,
+            'zoom':int (z)}
+
+
+def calculate_standoff_distance (altitude, proximity_factor, camera = None):
     """
  INPUTS:
    altitude:
@@ -114,36 +303,108 @@ def calculate_standoff_distance( altitude, proximity_factor):
         a particular altitude (ex. 5m minimum distance, move closer if distance
         is more than 20m).
         ------------------------------
+    camera:
+        'Camera' struct, as quad['camera'] of predictPath.initQuad (); default initQuad ()'s
  RETURN VALUE:
     standoff:
         Integer value which could be directly translated to distance in meters.
-        0 - If tilting or zoom would work no need to move closer
+        Ground distance from the UAV to the point of the footprint, along the
+        tilt, between its near edge (proximity_factor 0; the point below the UAV
+        if the footprint covers it) and its far edge (proximity_factor 1).
     """
-
-    #TODO
-        #check if tilting/zooming the camera would work
-
-    return []
-
-#assume
-input_coordinates = []
-altitude = 1
-proximity_factor = 0.5
-yaw_delta = 0
-
-
-check_targets( input_coordinates)
-
-#yaw control
-
+    if (camera is None):
+        camera = {'xSensor_mm':6.16, 'ySensor_mm':4.62, 'focallen_mm':3.61, 'xGimbal_deg':0, 'yGimbal_deg':20}
+    altitude_m = min (max (altitude, altitude_range[0]), altitude_range[1]) * 100 * feet_to_m
+    front, behind, left, right = CameraModel.fromDict (camera).dimensions (altitude_m)
+    near, far = (left, right) if (abs (right) >= abs (left)) else (-right, -left)
+    near = max (near, 0)
+    return int (round (near + min (max (proximity_factor, 0), 1) * (far - near)))
 
 
-#get standoff distance
-standoff = calculate_standoff_distance ( altitude, proximity_factor)
-
-
-
-
-move_UAV(standoff_new)
-
-print(bbox.center)
+def move_UAV (quad, params):
+    """
+ INPUTS:
+    quad: 'Quad' struct, updated in place
+    params: uav_control_params from check_targets ()
+ DETAILS:
+    Applies the control message, as the UAV would: yaw first, then the moves
+    in the new body frame, then the camera settings.
+    """
+    heading = quad.get ('heading_angle', quad['heading']) + math.radians (params['yaw_delta'])
+    c, s = math.cos (heading), math.sin (heading)
+    quad['position_prev'] = quad['position']
+    quad['position'] = (quad['position'][0] + params['y_delta'] * c - params['x_delta'] * s,
+                        quad['position'][1] + params['y_delta'] * s + params['x_delta'] * c)
+    quad['altitude'] = quad['altitude'] + params['z_delta']
+    quad['heading_angle'] = heading
+    quad['camera'] = dict (quad['camera'], yGimbal_deg = params['tilt'],
+                           focallen_mm = float (zoom_focal_lengths ()[params['zoom']]))
+    quad['zoom'] = params['zoom']
+    return quad
+
+
+def check_rectangle (points, box, numAngles = 3600):
+    """
+    Self-check: every point is in the rectangle, and no rotation of a brute-force
+    sweep gives a smaller axis-aligned area
+    """
+    u = nm.array ([math.cos (box['angle']), math.sin (box['angle'])])
+    v = nm.array ([-u[1], u[0]])
+    rel = points - nm.array (box['center'])
+    tolerance = 1e-6 * (1 + box['length'])
+    assert nm.all (nm.abs (rel @ u) <= 0.5 * box['length'] + tolerance)
+    assert nm.all (nm.abs (rel @ v) <= 0.5 * box['width'] + tolerance)
+    angles = nm.linspace (0, 0.5 * math.pi, numAngles, endpoint = False)
+    rotated = points @ nm.stack ((nm.cos (angles), nm.sin (angles)))
+    normal = points @ nm.stack ((-nm.sin (angles), nm.cos (angles)))
+    areas = nm.ptp (rotated, axis = 0) * nm.ptp (normal, axis = 0)
+    assert box['length'] * box['width'] <= areas.min () + tolerance
+
+
+def main ():
+    from predictPath import initQuad
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--targets", help = "comma-separated group sizes to benchmark", default = "10,1000,10000,100000")
+    parser.add_argument("-c", "--cycles", help = "control cycles per group size", type = int, default = 20)
+    parser.add_argument("-s", "--seed", help = "random seed", type = int, default = 0)
+    args = parser.parse_args()
+
+    rng = nm.random.default_rng (args.seed)
+    print ("Standoff at 100 ft: {0} m (proximity 0.1), {1} m (0.5), {2} m (0.9)".format (
+        *[calculate_standoff_distance (1, p) for p in (0.1, 0.5, 0.9)]))
+
+    for n in [int (n) for n in args.targets.split (",")]:
+        quad = initQuad ()
+        elapsed = []
+        for cycle in range (args.cycles):
+            # Elongated, rotated group somewhere around the quad
+            spread = rng.uniform (2, 40, size = 2)
+            theta = rng.uniform (0, math.pi)
+            R = nm.array ([[math.cos (theta), -math.sin (theta)], [math.sin (theta), math.cos (theta)]])
+            points = (rng.normal (size = (n, 2)) * spread / 3) @ R.T + rng.uniform (-100, 100, size = 2)
+
+            start = time.perf_counter ()
+            params = check_targets (points, quad)
+            elapsed.append (time.perf_counter () - start)
+
+            if (n <= 10000):
+                check_rectangle (points, minimum_bounding_rectangle (points))
+            move_UAV (quad, params)
+            footprint = CameraModel.fromDict (quad['camera']).footprints ([quad['position']], [quad['heading_angle']], quad['altitude'])[0]
+            assert nm.all (pointsInQuad (footprint, points)), params
+        elapsed = nm.array (elapsed)
+        print ("N = {0:6d}: {1:7.2f} ms per cycle (max {2:7.2f} ms), {3:8.1f} Hz; last {4}".format (
+            n, 1000 * elapsed.mean (), 1000 * elapsed.max (), 1 / elapsed.mean (), params))
+    print ("[+] All targets in view after every cycle", file = sys.stderr)
+
+    # A group too large to hold never makes the quad descend, even above the ceiling
+    points = rng.uniform (0, 1000, size = (200, 2))
+    for altitude in (30, 150):
+        params = check_targets (points, initQuad (altitude))
+        assert params['z_delta'] >= 0, (altitude, params)
+    print ("[+] No descent on groups that do not fit", file = sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+#!/usr/bin/python3
+
+"""
+File: fleetState.py
+
+Array-backed state for a fleet of targets.
+predictPath.py passes around a list of 'Target' dicts, so every step of the main loop
+is a series of dict lookups per target. FleetState instead keeps the positions, previous positions,
+speeds and waypoint cursors of all targets in contiguous NumPy arrays indexed by target,
+so that speed estimation and centroid computation are single vector operations.
+
+For compatibility with functions that expect 'Target' dicts (predictPathBatch, calcCentroidPath, ...),
+fleet.views (or iterating over the fleet) gives one TargetView per target. A view reads and writes
+the arrays through the same keys as the dicts: 'name', 'position', 'position_prev', 'speed', 'waypoints'
+and 'observed_path'. Any other key is stored on the view itself.
+
+fleet.index is a spatialIndex.SpatialIndex over the current positions, kept up to date as they change,
+for nearest and farthest target queries.
+"""
+import numpy as nm
+from spatialIndex import SpatialIndex
+
+
+class TargetView:
+    """
+    Dict-like view of one target in a FleetState.
+    """
+
+    def __init__ (self, fleet, idx):
+        self.fleet = fleet
+        self.idx = idx
+        self.extra = {}
+
+    def __getitem__ (self, key):
+        fleet = self.fleet
+        i = self.idx
+        if (key == 'name'):
+            return fleet.names[i]
+        if (key == 'position'):
+            return tuple (fleet.positions[i].tolist ())
+        if (key == 'position_prev'):
+            return tuple (fleet.positions_prev[i].tolist ())
+        if (key == 'speed'):
+            return float (fleet.speeds[i])
+        if (key == 'waypoints'):
+            return fleet.getWaypoints (i)
+        if (key == 'observed_path'):
+            return fleet.observed[i][fleet.observedCursor[i]:]
+        return self.extra[key]
+
+    def __setitem__ (self, key, value):
+        fleet = self.fleet
+        i = self.idx
+        if (key == 'position'):
+            fleet.positions[i] = value
+            fleet.index.move (i, fleet.positions[i])
+        elif (key == 'position_prev'):
+            fleet.positions_prev[i] = [nm.nan if v is None else v for v in value]
+        elif (key == 'speed'):
+            fleet.speeds[i] = nm.nan if value is None else value
+        elif (key == 'waypoints'):
+            fleet.setWaypoints (i, value)
+        elif (key in ('name', 'observed_path')):
+            raise KeyError ("'{0}' is read-only in a FleetState view".format (key))
+        else:
+            self.extra[key] = value
+
+    def __contains__ (self, key):
+        return key in ('name', 'position', 'position_prev', 'speed', 'waypoints', 'observed_path') or key in self.extra
+
+    def get (self, key, default = None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+
+class FleetState:
+    """
+    Positions, previous positions, speeds and waypoint cursors of all targets,
+    each held as a NumPy array indexed by target.
+    """
+
+    def __init__ (self, targets):
+        """
+        Arguments:
+            targets: List of 'Target' structs with at least 'name', 'position' and 'waypoints'.
+                'observed_path' is optional and may contain 'A' arrival markers.
+        """
+        n = len (targets)
+        self.names = [t['name'] for t in targets]
+        self.positions = nm.array ([t['position'] for t in targets], dtype = float).reshape (n, 2)
+        self.positions_prev = nm.full ((n, 2), nm.nan)
+        self.speeds = nm.full (n, nm.nan)
+
+        # All waypoints in one array: target i owns rows wayStart[i] .. wayEnd[i],
+        # and its current waypoint is row wayStart[i] + wayCursor[i]
+        self.wayCursor = nm.zeros (n, dtype = int)
+        self._packWaypoints ([t['waypoints'] for t in targets])
+
+        # Observed paths stay as lists because of the 'A' markers; consumed through a cursor instead of pop (0)
+        self.observed = [list (t.get ('observed_path', [])) for t in targets]
+        self.observedCursor = nm.zeros (n, dtype = int)
+
+        self.views = [TargetView (self, i) for i in range (n)]
+        self.index = SpatialIndex (self.positions)
+
+    def __len__ (self):
+        return len (self.names)
+
+    def __iter__ (self):
+        return iter (self.views)
+
+    def __getitem__ (self, idx):
+        return self.views[idx]
+
+    def _packWaypoints (self, waypointLists):
+        counts = nm.array ([len (w) for w in waypointLists], dtype = int)
+        self.wayEnd = nm.cumsum (counts)
+        self.wayStart = self.wayEnd - counts
+        rows = [p for w in waypointLists for p in w]
+        self.waypoints = nm.array (rows, dtype = float).reshape (len (rows), 2)
+
+    def getWaypoints (self, idx):
+        """
+        Returns the remaining waypoints of target idx as a list of (x, y) tuples
+        """
+        rows = self.waypoints[self.wayStart[idx] + self.wayCursor[idx]:self.wayEnd[idx]]
+        return [tuple (p) for p in rows.tolist ()]
+
+    def setWaypoints (self, idx, waypoints):
+        """
+        Replaces the remaining waypoints of target idx
+        """
+        lists = [self.getWaypoints (i) for i in range (len (self))]
+        lists[idx] = list (waypoints)
+        self.wayCursor[:] = 0
+        self._packWaypoints (lists)
+
+    def subset (self, indices):
+        """
+        Function: subset
+        Arguments:
+            indices: indices of the targets to keep
+        Purpose:
+            Returns a new FleetState of those targets, with copies of their current and previous positions,
+            speeds and remaining waypoints (not their observed paths), e.g. to plan for one group of a larger fleet
+        """
+        indices = [int (i) for i in indices]
+        sub = FleetState ([{'name':self.names[i], 'position':self.positions[i], 'waypoints':self.getWaypoints (i)}
+                           for i in indices])
+        sub.positions_prev[:] = self.positions_prev[indices]
+        sub.speeds[:] = self.speeds[indices]
+        return sub
+
+    def nextWaypoints (self):
+        """
+        Returns the current waypoint of every target as an (N x 2) array.
+        Past its last waypoint a target keeps the last one; a target without waypoints raises IndexError
+        """
+        empty = nm.flatnonzero (self.wayEnd == self.wayStart)
+        if (len (empty) > 0):
+            raise IndexError ("target '{0}' has no waypoints".format (self.names[empty[0]]))
+        return self.waypoints[nm.minimum (self.wayStart + self.wayCursor, self.wayEnd - 1)]
+
+    def updatePositions (self):
+        """
+        Function: updatePositions
+        Purpose:
+            Same as predictPath.updatePositions (), on the fleet arrays:
+            the current position becomes the previous position and the next observation is consumed.
+            An 'A' (arrived) observation advances that target's waypoint cursor, up to its last waypoint.
+        Returns:
+            False once every target has run out of observations, else True
+        """
+        self.positions_prev[:] = self.positions
+        done = 1
+        for i, observed in enumerate (self.observed):
+            cursor = self.observedCursor[i]
+            if (cursor < len (observed)):
+                position = observed[cursor]
+                cursor = cursor + 1
+                if (position == 'A'):
+                    if (cursor < len (observed)):
+                        position = observed[cursor]
+                        cursor = cursor + 1
+                        self.arrived (i)
+                    else:
+                        if (self.wayEnd[i] == self.wayStart[i]):
+                            raise IndexError ("target '{0}' has no waypoints".format (self.names[i]))
+                        position = self.waypoints[min (self.wayStart[i] + self.wayCursor[i], self.wayEnd[i] - 1)]
+                        self.positions_prev[i] = position
+                self.positions[i] = position[0:2]
+                self.observedCursor[i] = cursor
+            else:
+                done = done + 1
+        self.index.update (self.positions)
+        return done != len (self)
+
+    def setPositions (self, positions):
+        """
+        Function: setPositions
+        Arguments:
+            positions: (N x 2) positions of the targets, e.g. from live telemetry
+        Purpose:
+            As updatePositions (), with the new positions given instead of read from the observed paths
+        """
+        self.positions_prev[:] = self.positions
+        self.positions[:] = positions
+        self.index.update (self.positions)
+
+    def arrived (self, idx):
+        """
+        Advances target idx to its next waypoint, as an 'A' observation does in updatePositions ().
+        The last waypoint is kept.
+        """
+        if (self.wayStart[idx] + self.wayCursor[idx] + 1 < self.wayEnd[idx]):
+            self.wayCursor[idx] = self.wayCursor[idx] + 1
+
+    def calcSpeed (self, deltaT_s):
+        """
+        Function: calcSpeed
+        Arguments:
+            deltaT_s: Interval between target's position messages (s)
+        Purpose:
+            Estimate every target's speed as (distance in time interval) / (time interval)
+        """
+        d = self.positions - self.positions_prev
+        self.speeds = nm.sqrt (d[:, 0] ** 2 + d[:, 1] ** 2) / deltaT_s
+        return self.speeds
+
+    def calcCentroid (self):
+        """
+        Function: calcCentroid
+        Purpose:
+            Returns the center point of the current positions of all targets
+        """
+        c = self.positions.mean (axis = 0)
+        return float (c[0]), float (c[1])
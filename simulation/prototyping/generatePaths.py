@@ -1,43 +1,145 @@
+#!/usr/bin/python3
 
-import random
+"""
+File: generatePaths.py
+
+Generates random scenarios: waypoints and start positions for a group of targets.
+In each scenario, the i-th waypoints of all targets are scattered around one common point,
+drawn uniformly in [-extent, extent], so that the targets move as a loose group;
+'diff' is the largest offset of a target's waypoint from that point on each axis.
+The start positions are scattered the same way, within start_diff of one common start point.
+
+All scenarios are sampled at once with NumPy from one seeded generator, and written either as
+    text:   <outdir>/<name>.waypoints and <name>.start (one scenario), or <outdir>/roundN/... (several)
+    bundle: one .npz holding every scenario (see loadBundle ())
+
+Example: 1000 scenarios of 20 targets with 8 waypoints each
+    python3 generatePaths.py -o ../inData/stress.npz -n 20 -m 8 -k 1000 -d 3 -s 1
+"""
+import os
+import sys
 import argparse
+import numpy as nm
+
+# Names of the Morse robots, used first; further targets are named target<letters>,
+# which keeps names alphabetic as the coverage file names require
+defaultNames = ["susan", "django", "anton"]
+
+
+def targetNames (n):
+    """
+    Function: targetNames
+    Purpose:
+        Returns n target names: the Morse robots' names, then targeta, targetb, ..., targetz, targetaa, ...
+    """
+    names = defaultNames[0:n]
+    for i in range (1, n - len (names) + 1):
+        suffix = ""
+        while (i > 0):
+            i = i - 1
+            suffix = chr (ord ('a') + i % 26) + suffix
+            i = i // 26
+        names.append ("target" + suffix)
+    return names
+
+def generateScenarios (rng, numScenarios, numTargets, numWaypoints, diff = 1, extent = 60, startDiff = 5):
+    """
+    Function: generateScenarios
+    Arguments:
+        rng: numpy.random.Generator
+        numScenarios, numTargets, numWaypoints: K, N, M
+        diff: largest offset of a target's waypoint from the group's waypoint, on each axis
+        extent: the group's waypoints and start point are drawn in [-extent, extent]
+        startDiff: largest offset of a target's start position from the group's start point
+    Purpose:
+        Returns (waypoints (K x N x M x 2), starts (K x N x 2)) as integer arrays
+    """
+    centers = rng.integers (-extent, extent, size = (numScenarios, 1, numWaypoints, 2), endpoint = True)
+    waypoints = centers + rng.integers (-diff, diff, size = (numScenarios, numTargets, numWaypoints, 2), endpoint = True)
+    startCenters = rng.integers (-extent, extent, size = (numScenarios, 1, 2), endpoint = True)
+    starts = startCenters + rng.integers (-startDiff, startDiff, size = (numScenarios, numTargets, 2), endpoint = True)
+    return waypoints, starts
+
+def formatPoints (points):
+    return "".join ("{0},{1}\n".format (p[0], p[1]) for p in points.tolist ())
+
+def writeText (outdir, names, waypoints, starts, firstRound = 1):
+    """
+    Function: writeText
+    Purpose:
+        Writes <name>.waypoints and <name>.start for every target.
+        A single scenario goes directly into outdir; several go into outdir/roundN/, N from firstRound.
+    """
+    for k in range (len (waypoints)):
+        scenario_dir = outdir if len (waypoints) == 1 else os.path.join (outdir, "round{0}".format (firstRound + k), "")
+        os.makedirs (scenario_dir or ".", exist_ok = True)
+        for n, name in enumerate (names):
+            with open (scenario_dir + name + ".waypoints", 'w') as f:
+                f.write (formatPoints (waypoints[k, n]))
+            with open (scenario_dir + name + ".start", 'w') as f:
+                f.write (formatPoints (starts[k, n:n + 1]))
+
+def writeBundle (fh, names, waypoints, starts, seed = None):
+    """
+    Function: writeBundle
+    Purpose:
+        Writes every scenario into one compressed .npz: 'names' (N,), 'waypoints' (K x N x M x 2), 'starts' (K x N x 2)
+        and 'seed' (-1 if none)
+    """
+    nm.savez_compressed (fh, names = nm.array (names), waypoints = waypoints.astype (nm.int32),
+                         starts = starts.astype (nm.int32), seed = -1 if seed is None else seed)
+
+def loadBundle (fh):
+    """
+    Function: loadBundle
+    Purpose:
+        Returns (names, waypoints, starts) from a bundle written by writeBundle ()
+    """
+    with nm.load (fh) as data:
+        return data['names'].tolist (), data['waypoints'], data['starts']
+
+def bundleTargets (names, waypoints, starts, k):
+    """
+    Function: bundleTargets
+    Purpose:
+        Returns the 'Target' structs of scenario k of a bundle, as parsed from the text files
+        (without observed paths)
+    """
+    targets = []
+    for n, name in enumerate (names):
+        start = tuple (float (c) for c in starts[k, n])
+        targets.append ({'name':name, 'position_prev':(None, None), 'position':start, 'source':start, 'speed':None,
+                         'waypoints':[tuple (w) for w in waypoints[k, n].astype (float).tolist ()]})
+    return targets
+
+
+def main ():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-o", "--outdir", help = "output directory, or a .npz file to write one bundle", required = True)
+    parser.add_argument("-d", "--diff", help = "max difference between waypoints", type = int, default = 1)
+    parser.add_argument("-n", "--targets", help = "number of targets, or comma-separated target names", default = ",".join (defaultNames))
+    parser.add_argument("-m", "--waypoints", help = "number of waypoints per target", type = int, default = 5)
+    parser.add_argument("-k", "--scenarios", help = "number of scenarios", type = int, default = 1)
+    parser.add_argument("-e", "--extent", help = "waypoints are drawn in [-extent, extent] on each axis", type = int, default = 60)
+    parser.add_argument("-t", "--start_diff", help = "max difference between start positions", type = int, default = 5)
+    parser.add_argument("-s", "--seed", help = "random seed", type = int)
+    parser.add_argument("-r", "--first_round", help = "number of the first roundN/ directory, for several scenarios", type = int, default = 1)
+    args = parser.parse_args()
+
+    if (args.targets.isdigit ()):
+        names = targetNames (int (args.targets))
+    else:
+        names = args.targets.split (",")
+
+    rng = nm.random.default_rng (args.seed)
+    waypoints, starts = generateScenarios (rng, args.scenarios, len (names), args.waypoints, args.diff, args.extent, args.start_diff)
+
+    if (args.outdir.endswith (".npz")):
+        writeBundle (args.outdir, names, waypoints, starts, args.seed)
+    else:
+        writeText (args.outdir, names, waypoints, starts, args.first_round)
+    print ("[+] {0} scenarios of {1} targets with {2} waypoints".format (args.scenarios, len (names), args.waypoints), file = sys.stderr)
+
 
-parser = argparse.ArgumentParser()
-parser.add_argument("-o", "--outdir", help = "output directory")
-parser.add_argument("-d", "--diff", help = "max difference between waypoints")
-args = parser.parse_args()
-
-x = args.diff
-
-p1 = []
-p2 = []
-p3 = []
-for x in range (5):
-    seed =  (random.randint(-60,60), random.randint(-60,60)) 
-    p1.append ( ( random.randint(seed[0] - x, seed[0] + 1), random.randint(seed[1] - 1, seed[1] + 1)) )
-    p2.append ( ( random.randint(seed[0] - x, seed[0] + 1), random.randint(seed[1] - 1, seed[1] + 1)) )
-    p3.append ( ( random.randint(seed[0] - x, seed[0] + 1), random.randint(seed[1] - 1, seed[1] + 1)) )
-
-
-outP1 = args.outdir + "susan.waypoints"
-outP2 = args.outdir + "django.waypoints"
-outP3 = args.outdir + "anton.waypoints"
-
-fP1 = open (outP1, 'w')
-fP2 = open (outP2, 'w')
-fP3 = open (outP3, 'w')
-
-for x in range (5):
-    line = '{0},{1}\n'.format(p1[x][0], p1[x][1])
-    fP1.write (line)
-    line = '{0},{1}\n'.format(p2[x][0], p2[x][1])
-    fP2.write (line)
-    line = '{0},{1}\n'.format(p3[x][0], p3[x][1])
-    fP3.write (line)
-print (p1)
-print (p2)
-print (p3)
-
-fP1.close ()
-fP2.close ()
-fP3.close ()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+#!/usr/bin/python3
+
+"""
+File: multiPlan.py
+
+Multi-UAV mode of predictPath.py.
+planCoverage () positions one quadcopter over all targets, so coverage collapses once the group
+no longer fits in one footprint. planTeamCoverage () instead, every cycle:
+    1. clusters the targets' current positions into groups
+           'kmeans': one group per UAV (k-means, warm-started from the previous cycle's centers)
+           'fit':    the fewest groups, up to one per UAV, that each fit within the footprint
+    2. assigns each group to a UAV, minimizing the total distance from the UAVs to their groups' centers
+       (Hungarian algorithm, assignGroups ())
+    3. runs the centroid prediction and footprint positioning of predictPath.planCycle () for each group,
+       in parallel across a process pool if workers are given
+A UAV without a group holds its position. With one UAV, the plan is the same as planCoverage ()'s.
+
+evaluate.evaluateCoverageMulti () scores the UAVs' coverage files together: a target is in view
+when it is inside any UAV's footprint.
+
+Example: three UAVs at 30 m over 20 simulated targets
+    python3 generatePaths.py -o /tmp/team/ -n 20 -d 25 -t 30 -s 1
+    NAMES=$(ls /tmp/team/*.start | xargs -n1 basename | sed 's/.start//' | paste -sd,)
+    python3 simulateTargets.py -n $NAMES -w /tmp/team/ -o /tmp/team/ -r 1 -v 0.1
+    python3 multiPlan.py -n $NAMES -w /tmp/team/ -p /tmp/team/ -u 3 -a 30 -e
+"""
+import sys
+import argparse
+import numpy as nm
+from concurrent.futures import ProcessPoolExecutor
+from predictPath import initQuad, planCycle, formatCoverageRow
+from cameraModel import CameraModel
+from fleetState import FleetState
+
+
+def kmeans (points, k, rng, centers = None, iterations = 20):
+    """
+    Function: kmeans
+    Arguments:
+        points: (N x 2) positions
+        k: number of clusters, at most N
+        rng: numpy.random.Generator, for the k-means++ initial centers
+        centers: (k x 2) initial centers, e.g. the previous cycle's, instead of k-means++
+        iterations: most Lloyd iterations
+    Purpose:
+        Returns (labels (N,), centers (k x 2)). An emptied cluster is reseeded at the point farthest from its center.
+    """
+    points = nm.asarray (points, dtype = float)
+    if (centers is None or len (centers) != k):
+        # k-means++
+        centers = [points[rng.integers (len (points))]]
+        for _ in range (1, k):
+            d = ((points[:, None, :] - nm.array (centers)[None, :, :]) ** 2).sum (axis = 2).min (axis = 1)
+            total = d.sum ()
+            centers.append (points[rng.choice (len (points), p = d / total)] if total > 0 else points[rng.integers (len (points))])
+    centers = nm.array (centers, dtype = float)
+    labels = None
+    for _ in range (iterations):
+        d = ((points[:, None, :] - centers[None, :, :]) ** 2).sum (axis = 2)
+        newLabels = d.argmin (axis = 1)
+        counts = nm.bincount (newLabels, minlength = k)
+        for g in nm.flatnonzero (counts == 0):
+            far = int (d[nm.arange (len (points)), newLabels].argmax ())
+            newLabels[far] = g
+            d[far] = 0
+            counts = nm.bincount (newLabels, minlength = k)
+        centers = nm.column_stack ((nm.bincount (newLabels, points[:, 0], k), nm.bincount (newLabels, points[:, 1], k))) / counts[:, None]
+        if (labels is not None and nm.array_equal (labels, newLabels)):
+            break
+        labels = newLabels
+    return newLabels, centers
+
+def clusterTargets (points, numUAVs, rng, mode = 'kmeans', radius = None, centers = None):
+    """
+    Function: clusterTargets
+    Arguments:
+        points: (N x 2) target positions
+        numUAVs: most groups
+        rng: numpy.random.Generator
+        mode: 'kmeans' for one group per UAV, 'fit' for the fewest groups that fit within radius of their centers
+        radius: group radius that fits in a footprint (m), for 'fit'
+        centers: previous cycle's centers, to warm-start k-means
+    Purpose:
+        Returns (labels (N,), centers (G x 2))
+    """
+    most = min (numUAVs, len (points))
+    if (mode == 'kmeans'):
+        return kmeans (points, most, rng, centers)
+    for k in range (1, most + 1):
+        labels, found = kmeans (points, k, rng, centers if centers is not None and len (centers) == k else None)
+        spread = nm.hypot (*(points - found[labels]).T)
+        if (spread.max () <= radius):
+            break
+    return labels, found
+
+def assignGroups (cost):
+    """
+    Function: assignGroups
+    Arguments:
+        cost: (G x U) cost of giving group g to UAV u, G <= U
+    Purpose:
+        Returns the UAV of each group, minimizing the total cost with no UAV given two groups
+        (Hungarian algorithm with potentials, O (G^2 U), each step vectorized over the UAVs)
+    """
+    cost = nm.asarray (cost, dtype = float)
+    n, m = cost.shape
+    u = nm.zeros (n + 1)
+    v = nm.zeros (m + 1)
+    owner = nm.zeros (m + 1, dtype = int)    # owner[j]: group (1-based) given UAV j, 0 if none
+    way = nm.zeros (m + 1, dtype = int)
+    for i in range (1, n + 1):
+        owner[0] = i
+        j0 = 0
+        minv = nm.full (m + 1, nm.inf)
+        used = nm.zeros (m + 1, dtype = bool)
+        while (True):
+            used[j0] = True
+            i0 = owner[j0]
+            free = ~used[1:]
+            reduced = cost[i0 - 1] - u[i0] - v[1:]
+            better = free & (reduced < minv[1:])
+            minv[1:][better] = reduced[better]
+            way[1:][better] = j0
+            j1 = int (nm.argmin (nm.where (free, minv[1:], nm.inf))) + 1
+            delta = minv[j1]
+            u[owner[used]] += delta
+            v[used] -= delta
+            minv[~used] -= delta
+            j0 = j1
+            if (owner[j0] == 0):
+                break
+        while (j0 != 0):
+            j1 = way[j0]
+            owner[j0] = owner[j1]
+            j0 = j1
+    assignment = nm.full (n, -1, dtype = int)
+    for j in range (1, m + 1):
+        if (owner[j] > 0):
+            assignment[owner[j] - 1] = j - 1
+    return assignment
+
+def planGroup (fleet, quad, camera, useWaypoints, footDist):
+    """
+    Function: planGroup
+    Purpose:
+        predictPath.planCycle () for one group, returning the updated quad with the cycle's state
+        (a top-level function so that it can run in a worker process)
+    """
+    state = planCycle (fleet, quad, camera, useWaypoints, None, footDist)
+    return quad, {'footprint':state['footprint'], 'footDist':state['footDist']}
+
+def holdFootprint (quad, camera):
+    # Footprint of a UAV holding its position
+    return camera.footprint (quad['position'], quad.get ('heading_angle', quad['heading']), quad['altitude'], center = quad['position'])
+
+def planTeamCoverage (targets, quads, useWaypoints = True, waitTime_s = 10, mode = 'kmeans', workers = None, seed = 0):
+    """
+    Function: planTeamCoverage
+    Arguments:
+        targets: List of 'Target' structs, with waypoints and observed paths
+        quads: one 'Quad' struct (initQuad ()) per UAV
+        useWaypoints, waitTime_s: as in predictPath.planCoverage ()
+        mode: 'kmeans' or 'fit', see clusterTargets ()
+        workers: plan the groups across this many worker processes, default in this process
+        seed: seed of the k-means initial centers
+    Purpose:
+        Runs the prediction and positioning loop of predictPath.planCoverage () with a team of UAVs
+    Returns:
+        (coverage, groups): for each UAV, a list of (footprint, time to stay) per cycle;
+        and for each cycle, the target indices watched by each UAV
+    """
+    fleet = FleetState (targets)
+    camera = CameraModel.fromDict (quads[0]['camera'])
+    dims = camera.dimensions (quads[0]['altitude'])
+    radius = 0.5 * min (dims[0] + dims[1], dims[2] + dims[3])
+    rng = nm.random.default_rng (seed)
+    pool = ProcessPoolExecutor (max_workers = workers) if workers else None
+
+    coverage = [[] for _ in quads]
+    groups = []
+    footDists = [0] * len (quads)
+    centers = None
+    predict = True
+    timeRun = 0
+    fleet.updatePositions ()
+    while (predict == True):
+        for i in range (timeRun):
+            if (predict == True):
+                predict = fleet.updatePositions ()
+
+        labels, centers = clusterTargets (fleet.positions, len (quads), rng, mode, radius, centers)
+        members = [nm.flatnonzero (labels == g) for g in range (len (centers))]
+        uavPositions = nm.array ([q['position'] for q in quads], dtype = float)
+        assignment = assignGroups (nm.hypot (*(centers[:, None, :] - uavPositions[None, :, :]).transpose (2, 0, 1)))
+
+        jobs = [(fleet.subset (members[g]), quads[u], camera, useWaypoints, footDists[u]) for g, u in enumerate (assignment)]
+        if (pool is None):
+            results = [planGroup (*job) for job in jobs]
+        else:
+            results = list (pool.map (planGroup, *zip (*jobs)))
+
+        watched = [[] for _ in quads]
+        footprints = [None] * len (quads)
+        for g, (u, (quad, state)) in enumerate (zip (assignment, results)):
+            quads[u] = quad
+            footDists[u] = state['footDist']
+            footprints[u] = state['footprint']
+            watched[u] = members[g].tolist ()
+        for u, quad in enumerate (quads):
+            coverage[u].append ((holdFootprint (quad, camera) if footprints[u] is None else footprints[u], waitTime_s))
+        groups.append (watched)
+        timeRun = waitTime_s
+
+    if (pool is not None):
+        pool.shutdown ()
+    return coverage, groups
+
+def checkAssignment (rng, trials = 200):
+    """
+    Function: checkAssignment
+    Purpose:
+        Compares assignGroups () with the best of all assignments on small random problems. Returns the number of mismatches.
+    """
+    import itertools
+    numFailed = 0
+    for _ in range (trials):
+        n = int (rng.integers (1, 6))
+        m = int (rng.integers (n, 7))
+        cost = rng.uniform (0, 100, size = (n, m))
+        best = min (cost[nm.arange (n), list (p)].sum () for p in itertools.permutations (range (m), n))
+        assignment = assignGroups (cost)
+        if (len (set (assignment.tolist ())) != n or abs (cost[nm.arange (n), assignment].sum () - best) > 1e-9):
+            numFailed = numFailed + 1
+    return numFailed
+
+
+def main ():
+    import time
+    import copy
+    from targetFiles import readWaypoints, readStart, readObservedPath
+    from roundCache import loadTargets
+
+    # Parse arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--names", help = "comma-separated list of target names")
+    parser.add_argument("-w", "--waypoint_dir", help = "directory containing waypoint data")
+    parser.add_argument("-p", "--path_dir", help = "directory containing path data")
+    parser.add_argument("-c", "--cache", help = "load inputs from a binary cache in path_dir, created on first use", action = "store_true")
+    parser.add_argument("-d", "--disable_waypoints", help = "disable using waypoints for following")
+    parser.add_argument("-a", "--altitude", help = "altitude of the quadcopters (m)", type = float, default = 75)
+    parser.add_argument("-i", "--interval", help = "time to stay in each position (s)", type = int, default = 10)
+    parser.add_argument("-u", "--uavs", help = "number of UAVs", type = int, default = 2)
+    parser.add_argument("-m", "--mode", help = "grouping: kmeans (one group per UAV) or fit (fewest groups that fit a footprint)",
+                        choices = ["kmeans", "fit"], default = "kmeans")
+    parser.add_argument("-j", "--jobs", help = "plan the groups across this many worker processes", type = int)
+    parser.add_argument("-s", "--seed", help = "seed of the k-means initial centers", type = int, default = 0)
+    parser.add_argument("-o", "--output", help = "write each UAV's coverage CSV to <output>_uav<N>.csv")
+    parser.add_argument("-e", "--evaluate", help = "print the team's proportion in view and repositions", action = "store_true")
+    parser.add_argument("--check", help = "check assignGroups () against brute force", action = "store_true")
+    args = parser.parse_args()
+
+    if (args.check):
+        numFailed = checkAssignment (nm.random.default_rng (args.seed))
+        print ("Assignment vs brute force: {0} mismatches".format (numFailed))
+        exit (1 if numFailed else 0)
+
+    if (args.names is None):
+        print ("Must supply targets with -n")
+        exit (0)
+    target_names = args.names.split (",")
+
+    if (args.cache):
+        targets = loadTargets (target_names, args.waypoint_dir, args.path_dir, withTime = True)
+    else:
+        targets = [{'name':x, 'position_prev':(None, None), 'position':(None, None), 'source':(None, None), 'speed':None} for x in target_names]
+        for t in targets:
+            t['waypoints'] = readWaypoints (args.waypoint_dir + t['name'] + ".waypoints")
+            t['position'] = readStart (args.waypoint_dir + t['name'] + ".start")
+            t['source'] = t['position']
+            t['observed_path'] = readObservedPath (args.path_dir + t['name'] + ".path", t['source'], withTime = True)
+    evalTargets = copy.deepcopy (targets)
+
+    start = time.perf_counter ()
+    quads = [initQuad (args.altitude) for _ in range (args.uavs)]
+    coverage, groups = planTeamCoverage (targets, quads, args.disable_waypoints is None, args.interval, args.mode, args.jobs, args.seed)
+    elapsed = time.perf_counter () - start
+
+    for u, rows in enumerate (coverage):
+        lines = [formatCoverageRow (footprint, time_s) for footprint, time_s in rows]
+        if (args.output is not None):
+            with open ("{0}_uav{1}.csv".format (args.output, u), 'w') as f:
+                f.write ("\n".join (lines) + "\n")
+        else:
+            for line in lines:
+                print ("{0},{1}".format (u, line))
+    print ("[+] {0} UAVs, {1} cycles in {2:.3f} s".format (len (quads), len (groups), elapsed), file = sys.stderr)
+
+    if (args.evaluate):
+        from evaluate import evaluateCoverageMulti
+        coverageData = [[formatCoverageRow (footprint, time_s).split (",") for footprint, time_s in rows] for rows in coverage]
+        proportion, numRepositions = evaluateCoverageMulti (evalTargets, coverageData)
+        print ("{0},{1}".format (proportion, ",".join (str (n) for n in numRepositions)), file = sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
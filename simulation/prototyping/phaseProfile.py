@@ -0,0 +1,130 @@
+#!/usr/bin/python3
+
+"""
+File: phaseProfile.py
+
+Per-phase timing of the planning cycle (predictPath.planCycle ()): Phase 0 speed estimate (calcSpeed),
+Phase 1 path prediction (predictPath, calcCentroidPath), Phase 2 positioning (footprint,
+calcTimeToStayInPosition, and the optional optimizers), and the whole cycle (planCycle),
+so that the phase that breaks the deltaTT_s control budget shows up as the fleet grows.
+
+Timing is off by default: phase () then returns one shared no-op context, so the instrumented code
+costs a function call per phase. It is switched on by predictPath.py --profile [FILE], or for any script
+by the environment variable PREDICT_PROFILE (1 for stderr, or an output path).
+At exit, a JSON summary is written with, for each phase, the number of calls and the
+p50, p95, max and total latency (ms), and how many calls took longer than the budget.
+
+Example: profile one run, summary on stderr
+    PREDICT_PROFILE=1 python3 predictPath.py -q -n susan,django,anton -w ../inData/round12/ -p ../outData/round12/
+"""
+import os
+import sys
+import json
+import time
+import atexit
+from contextlib import nullcontext
+import numpy as nm
+
+envVar = "PREDICT_PROFILE"
+
+noTimer = nullcontext ()
+
+
+class PhaseTimer:
+    """
+    Context that appends its elapsed time (s) to a list of samples.
+    """
+    __slots__ = ('samples', 'start')
+
+    def __init__ (self, samples):
+        self.samples = samples
+
+    def __enter__ (self):
+        self.start = time.perf_counter ()
+        return self
+
+    def __exit__ (self, *exc):
+        self.samples.append (time.perf_counter () - self.start)
+        return False
+
+
+class PhaseProfiler:
+    """
+    Collects the latencies of named phases and reports them as JSON.
+    """
+
+    def __init__ (self):
+        self.enabled = False
+        self.samples = {}
+        self.output = None
+        self.budget_s = None
+        self.registered = False
+
+    def enable (self, output = None, budget_s = None):
+        """
+        Arguments:
+            output: path of the JSON summary, None or '-' for stderr
+            budget_s: control budget (s); calls above it are counted per phase
+        Purpose:
+            Starts timing, and writes the summary at exit
+        """
+        self.enabled = True
+        self.output = None if output in (None, "-", "1") else output
+        if (budget_s is not None):
+            self.budget_s = budget_s
+        if (not self.registered):
+            atexit.register (self.report)
+            self.registered = True
+
+    def phase (self, name):
+        """
+        Returns a context that times one call of the named phase, or a no-op context if timing is off
+        """
+        if (not self.enabled):
+            return noTimer
+        samples = self.samples.get (name)
+        if (samples is None):
+            samples = self.samples[name] = []
+        return PhaseTimer (samples)
+
+    def summary (self):
+        """
+        Returns {'budget_ms', 'phases': {name: {'count', 'p50_ms', 'p95_ms', 'max_ms', 'total_ms', 'over_budget'}}},
+        phases in the order they were first timed
+        """
+        phases = {}
+        for name, samples in self.samples.items ():
+            ms = 1000 * nm.asarray (samples)
+            p50, p95 = nm.percentile (ms, [50, 95])
+            phases[name] = {'count':len (ms), 'p50_ms':round (float (p50), 3), 'p95_ms':round (float (p95), 3),
+                            'max_ms':round (float (ms.max ()), 3), 'total_ms':round (float (ms.sum ()), 3),
+                            'over_budget':None if self.budget_s is None else int (nm.count_nonzero (ms > 1000 * self.budget_s))}
+        return {'budget_ms':None if self.budget_s is None else 1000 * self.budget_s, 'phases':phases}
+
+    def report (self):
+        """
+        Writes the summary to the output, if anything was timed
+        """
+        if (len (self.samples) == 0):
+            return
+        text = json.dumps (self.summary (), indent = 2)
+        if (self.output is None):
+            print (text, file = sys.stderr)
+        else:
+            with open (self.output, 'w') as f:
+                f.write (text + "\n")
+
+
+profiler = PhaseProfiler ()
+if (os.environ.get (envVar, "") not in ("", "0")):
+    profiler.enable (os.environ[envVar])
+
+def phase (name):
+    """
+    Function: phase
+    Purpose:
+        Times the enclosed block as one call of the named phase, when profiling is enabled:
+            with phase ("predictPath"):
+                paths = predictPathBatch (targets, deltaTT_s)
+    """
+    return profiler.phase (name)
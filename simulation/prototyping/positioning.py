@@ -0,0 +1,267 @@
+#!/usr/bin/python3
+
+"""
+File: positioning.py
+
+Candidate-pose optimizer for positioning the quadcopter (Phase 2 of predictPath.planCoverage ()).
+The default positioning picks one standoff waypoint from the closest target and only afterwards checks
+how long the centroid stays in view. PoseOptimizer instead lays out a grid of candidate
+(x, y, heading, altitude) poses around the current centroid, computes all of their footprints at once,
+and scores each by how many predicted intervals the centroid path and every target path stay inside it.
+The best pose is returned. Candidates are scored in chunks, nearest to the centroid first,
+until the time budget runs out, so a cycle always fits in the deltaTT_s control period.
+
+FramingSolver keeps the pose and searches the camera instead: a grid of (gimbal tilt, focal length,
+altitude) settings, scored all at once on the predicted positions over the dwell horizon.
+When a setting holds the whole group, the quadcopter can reframe in place instead of flying.
+"""
+import time
+import numpy as nm
+from cameraModel import pointsInQuad, footprintExtents
+
+
+def stackPaths (paths, names):
+    """
+    Function: stackPaths
+    Arguments:
+        paths: predicted paths dict from predictPathBatch ()
+        names: target names, in the order of the result
+    Purpose:
+        Returns the predicted paths as an (S x N x 2) array. As in calcCentroidPath (),
+        a path that ends early keeps its last position.
+    """
+    lenmax = max ([len (paths[n]) for n in names])
+    stacked = nm.empty ((lenmax, len (names), 2))
+    for i, n in enumerate (names):
+        p = nm.asarray (paths[n], dtype = float).reshape (-1, 2)
+        stacked[0:len (p), i] = p
+        stacked[len (p):, i] = p[-1]
+    return stacked
+
+def leadingCount (contained):
+    """
+    Function: leadingCount
+    Arguments:
+        contained: boolean array whose second axis is time
+    Purpose:
+        Returns the number of leading True entries along the time axis
+    """
+    if (contained.shape[1] == 0):
+        return nm.zeros (contained.shape[0:1] + contained.shape[2:], dtype = int)
+    notContained = ~contained
+    first = nm.argmax (notContained, axis = 1)
+    return nm.where (nm.any (notContained, axis = 1), first, contained.shape[1])
+
+
+class PoseOptimizer:
+    """
+    Scores a grid of candidate poses against the predicted paths and returns the best.
+    """
+
+    def __init__ (self, camera, altitudes, radius_m = 30, numXY = 9, numHeadings = 16,
+                  budget_s = 0.5, chunkSize = 512, deltaTT_s = 2):
+        """
+        Arguments:
+            camera: cameraModel.CameraModel
+            altitudes: candidate altitudes (m)
+            radius_m: candidate positions cover a square of +/- radius_m around the centroid
+            numXY: grid points per side of that square
+            numHeadings: candidate headings, evenly spaced over a full turn
+            budget_s: time allowed per optimize () call (s); should be well below deltaTT_s
+            chunkSize: candidates scored per array operation
+            deltaTT_s: interval between predicted positions (s)
+        """
+        self.camera = camera
+        self.altitudes = list (altitudes)
+        self.radius_m = radius_m
+        self.numXY = numXY
+        self.numHeadings = numHeadings
+        self.budget_s = budget_s
+        self.chunkSize = chunkSize
+        self.deltaTT_s = deltaTT_s
+
+    def candidates (self, center, current = None):
+        """
+        Returns (positions (P x 2), headings (P,), altitudes (P,)) of the candidate poses,
+        nearest to center first. current, a (position, heading, altitude) pose, is put first.
+        """
+        offsets = nm.linspace (-self.radius_m, self.radius_m, self.numXY)
+        gx, gy = nm.meshgrid (offsets, offsets)
+        grid = nm.column_stack ((gx.ravel (), gy.ravel ()))
+        grid = grid[nm.argsort (nm.hypot (grid[:, 0], grid[:, 1]), kind = 'stable')] + center
+        headings = nm.arange (self.numHeadings) * (2 * nm.pi / self.numHeadings)
+
+        # Every position with every heading and altitude, position-major so that near positions come first
+        numPer = len (headings) * len (self.altitudes)
+        positions = nm.repeat (grid, numPer, axis = 0)
+        h, a = nm.meshgrid (headings, nm.asarray (self.altitudes, dtype = float))
+        headings = nm.tile (h.ravel (), len (grid))
+        altitudes = nm.tile (a.ravel (), len (grid))
+        if (current is not None):
+            positions = nm.vstack (([current[0]], positions))
+            headings = nm.concatenate (([current[1]], headings))
+            altitudes = nm.concatenate (([current[2]], altitudes))
+        return positions, headings, altitudes
+
+    def score (self, positions, headings, altitudes, predicted, centroidPath):
+        """
+        Arguments:
+            positions, headings, altitudes: candidate poses
+            predicted: (S x N x 2) predicted target positions
+            centroidPath: (S x 2) predicted centroid positions
+        Purpose:
+            Returns (group, perTarget): for each candidate, the number of leading intervals in which
+            the centroid and all targets stay in its footprint, and the same count per target (P x N)
+        """
+        points = nm.concatenate ((centroidPath[:, None, :], predicted), axis = 1)
+        group = nm.empty (len (positions), dtype = int)
+        perTarget = nm.empty ((len (positions), predicted.shape[1]), dtype = int)
+        for altitude in nm.unique (altitudes):
+            idx = nm.flatnonzero (altitudes == altitude)
+            footprints = self.camera.footprints (positions[idx], headings[idx], altitude)
+            # (P x S x N+1): every predicted point against every candidate footprint
+            contained = pointsInQuad (footprints[:, None, None, :, :], points[None, :, :, :])
+            group[idx] = leadingCount (nm.all (contained, axis = 2))
+            perTarget[idx] = leadingCount (contained[:, :, 1:])
+        return group, perTarget
+
+    def optimize (self, predicted, centroidPath, current):
+        """
+        Function: optimize
+        Arguments:
+            predicted: (S x N x 2) predicted target positions, e.g. from stackPaths ()
+            centroidPath: (S x 2) predicted centroid positions
+            current: (position, heading, altitude) of the quadcopter
+        Purpose:
+            Scores candidate poses around the current centroid until all are scored or the budget is spent.
+            Ties go to the earliest candidate: the current pose, then the nearest to the centroid.
+        Returns:
+            A dict of the best 'position', 'heading', 'altitude', the time the group stays in view 'dwell_s',
+            the time each target stays in view 'targetDwell_s', and the number of candidates scored 'numScored'
+        """
+        start = time.perf_counter ()
+        predicted = nm.asarray (predicted, dtype = float)
+        centroidPath = nm.asarray (centroidPath, dtype = float).reshape (-1, 2)
+        positions, headings, altitudes = self.candidates (centroidPath[0], current)
+
+        best = None
+        numScored = 0
+        # Chunks are sized from the measured cost per candidate, which grows with the length of
+        # the predicted paths, so that a chunk does not overrun the budget. The first chunk is a probe.
+        chunkSize = min (self.chunkSize, 16)
+        while (numScored < len (positions)):
+            chunk = slice (numScored, numScored + chunkSize)
+            chunkStart = time.perf_counter ()
+            group, perTarget = self.score (positions[chunk], headings[chunk], altitudes[chunk], predicted, centroidPath)
+            i = int (nm.argmax (group))
+            if (best is None or group[i] > best[0]):
+                best = (group[i], numScored + i, perTarget[i])
+            numScored = numScored + len (group)
+            now = time.perf_counter ()
+            if (now - start > self.budget_s):
+                break
+            perCandidate = (now - chunkStart) / len (group)
+            chunkSize = int (min (self.chunkSize, max (1, (self.budget_s - (now - start)) / max (perCandidate, 1e-9))))
+
+        count, i, perTarget = best
+        return {'position': (float (positions[i][0]), float (positions[i][1])),
+                'heading': float (headings[i]),
+                'altitude': float (altitudes[i]),
+                'dwell_s': int (count) * self.deltaTT_s,
+                'targetDwell_s': perTarget * self.deltaTT_s,
+                'numScored': numScored}
+
+
+class FramingSolver:
+    """
+    Picks the camera setting (gimbal tilt, focal length, altitude) that holds the predicted group from a fixed pose.
+    """
+
+    def __init__ (self, camera, tilts_deg = range (0, 52, 2), focalRange_mm = (3.61, 36.1), numFocal = 11,
+                  altitudes = (30, 45, 60, 75, 90, 105, 120), horizon_s = 10, deltaTT_s = 2, maxViewAngle_deg = 80):
+        """
+        Arguments:
+            camera: 'Camera' struct, as quad['camera'] of predictPath.initQuad (); its sensor and 'xGimbal_deg' are kept
+            tilts_deg: candidate gimbal tilts ('yGimbal_deg', the axis tilted by initQuad ())
+            focalRange_mm: zoom range; numFocal focal lengths are spaced geometrically over it
+            altitudes: candidate altitudes (m)
+            horizon_s: dwell horizon: the predicted positions up to horizon_s ahead must be in view
+            deltaTT_s: interval between predicted positions (s)
+            maxViewAngle_deg: settings that view above this angle from the vertical are left out
+        """
+        self.camera = dict (camera)
+        self.horizon_s = horizon_s
+        self.deltaTT_s = deltaTT_s
+        self.maxViewAngle_deg = maxViewAngle_deg
+        focals = focalRange_mm[0] * (focalRange_mm[1] / focalRange_mm[0]) ** nm.linspace (0, 1, numFocal)
+        t, f, a = nm.meshgrid (nm.asarray (tilts_deg, dtype = float), focals, nm.asarray (altitudes, dtype = float), indexing = 'ij')
+        self.tilts, self.focals, self.altitudes = t.ravel (), f.ravel (), a.ravel ()
+
+    def candidates (self, current):
+        """
+        Returns (tilts, focals, altitudes, extents) of the candidate settings, the current one first;
+        extents is (C x 4) of (front, behind, left, right) as cameraModel.footprintExtents ()
+        """
+        tilts = nm.concatenate (([current['camera']['yGimbal_deg']], self.tilts))
+        focals = nm.concatenate (([current['camera']['focallen_mm']], self.focals))
+        altitudes = nm.concatenate (([current['altitude']], self.altitudes))
+        c = self.camera
+        extents = nm.stack (nm.broadcast_arrays (*footprintExtents (c['xSensor_mm'], c['ySensor_mm'], focals,
+                                                                    c['xGimbal_deg'], tilts, altitudes)), axis = 1)
+        halfView = nm.degrees (nm.arctan (nm.maximum (c['xSensor_mm'], c['ySensor_mm']) / (2 * focals)))
+        valid = (nm.abs (tilts) + halfView < self.maxViewAngle_deg) & (nm.abs (c['xGimbal_deg']) + halfView < self.maxViewAngle_deg)
+        valid[0] = True
+        return tilts[valid], focals[valid], altitudes[valid], extents[valid]
+
+    def score (self, extents, predicted, position, heading):
+        """
+        Arguments:
+            extents: (C x 4) candidate footprint extents
+            predicted: (S x N x 2) predicted target positions
+            position, heading: pose of the camera; the footprint is rotated about the position
+        Purpose:
+            Returns the number of leading intervals in which all targets stay in each candidate's footprint.
+            The footprints of one pose are the same rectangle in the camera's frame, so the targets are
+            rotated into it once and each interval reduces to its bounding box.
+        """
+        rel = nm.asarray (predicted, dtype = float) - nm.asarray (position, dtype = float)
+        c, s = nm.cos (heading), nm.sin (heading)
+        x = rel[..., 0] * c + rel[..., 1] * s
+        y = rel[..., 1] * c - rel[..., 0] * s
+        # (C x S): strictly inside, as pointsInQuad ()
+        contained = ((extents[:, 2, None] < x.min (axis = 1)) & (x.max (axis = 1) < extents[:, 3, None]) &
+                     (extents[:, 1, None] < y.min (axis = 1)) & (y.max (axis = 1) < extents[:, 0, None]))
+        return leadingCount (contained)
+
+    def solve (self, predicted, position, heading, current):
+        """
+        Function: solve
+        Arguments:
+            predicted: (S x N x 2) predicted target positions, e.g. from stackPaths ()
+            position, heading: pose of the camera
+            current: the 'Quad' struct, for its 'camera' and 'altitude'
+        Purpose:
+            Scores every setting over the dwell horizon. The current setting is kept while it holds the whole group.
+            Otherwise the setting that holds the group longest over the whole predicted path wins, so that it lasts
+            until the next change, then the one with the smallest footprint (most detail).
+        Returns:
+            A dict of the chosen 'camera' struct and 'altitude', whether it holds the group over the horizon 'fits',
+            the time the group stays in view 'dwell_s' and whether the setting 'changed'
+        """
+        predicted = nm.asarray (predicted, dtype = float)
+        steps = min (len (predicted), int (self.horizon_s // self.deltaTT_s) + 1)
+        tilts, focals, altitudes, extents = self.candidates (current)
+        dwell = self.score (extents, predicted, position, heading)
+        fits = dwell >= steps
+        area = (extents[:, 0] - extents[:, 1]) * (extents[:, 3] - extents[:, 2])
+        if (fits[0]):
+            i = 0
+        else:
+            i = int (nm.lexsort ((area, -dwell))[0])
+        changed = (tilts[i], focals[i], altitudes[i]) != (tilts[0], focals[0], altitudes[0])
+        camera = dict (current['camera'], yGimbal_deg = float (tilts[i]), focallen_mm = float (focals[i]))
+        return {'camera': camera if changed else current['camera'],
+                'altitude': float (altitudes[i]) if changed else current['altitude'],
+                'fits': bool (fits[i]),
+                'dwell_s': int (dwell[i]) * self.deltaTT_s,
+                'changed': bool (changed)}
@@ -0,0 +1,345 @@
+#!/usr/bin/python3
+
+"""
+File: predictEngine.py
+
+Batched path prediction for predictPath.py.
+Computes the same piecewise-linear predicted paths as predictPath.predictPath (),
+but instead of stepping each target forward one deltaTT_s interval at a time,
+every (target, waypoint segment) pair is laid out as a row and all of the
+predicted positions are generated with a few array operations.
+
+For a segment from source s to waypoint w of length L, with step length d = speed * deltaTT_s,
+the loop in predictPath () emits the points s + k * d * u for k = 1 .. floor (L / d) + 1,
+where u is the unit vector toward w. The final point overshoots w, and the next
+segment starts again from w.
+
+Only the first segment of a path depends on the target's position; the others run from waypoint
+to waypoint. IncrementalPredictor keeps those later segments between cycles and, while a target's
+speed and waypoints have not changed, only recomputes its first segment.
+
+Running this file directly checks the batched engine against predictPath.predictPath ()
+on randomly generated targets, and the incremental predictor against the batched engine.
+"""
+import math
+import numpy as nm
+
+# Interval between estimated positions (s)
+deltaTT_s = 2
+
+
+def segmentPoints (sources, ends, steps):
+    """
+    Function: segmentPoints
+    Arguments:
+        sources, ends: (M x 2) start points and waypoints of M segments
+        steps: (M,) step length of each segment
+    Purpose:
+        Returns (points, K): the predicted points of all segments in order, as a (sum (K) x 2) array,
+        and the number of points K of each segment
+    """
+    S = nm.asarray (sources, dtype = float).reshape (-1, 2)
+    W = nm.asarray (ends, dtype = float).reshape (-1, 2)
+    d = nm.asarray (steps, dtype = float)
+
+    # Per-segment heading, computed as in predictPath () so that degenerate
+    # (zero-length) segments step in the same direction
+    l = S - W
+    tt = nm.arctan2 (l[:, 1], l[:, 0])
+    step = nm.column_stack ((d * nm.cos (tt), d * nm.sin (tt)))
+
+    # Number of emitted points per segment: the first point that passes the waypoint ends it
+    L = nm.hypot (l[:, 0], l[:, 1])
+    K = nm.floor (L / d).astype (int) + 1
+
+    # Expand to one row per predicted point
+    seg = nm.repeat (nm.arange (len (K)), K)
+    starts = nm.cumsum (K) - K
+    k = nm.arange (len (seg)) - nm.repeat (starts, K) + 1
+    return S[seg] - k[:, None] * step[seg], K
+
+def predictPathBatch (targets, deltaTT_s = deltaTT_s):
+    """
+    Function: predictPathBatch
+    Arguments:
+        targets: List of 'Target' structs
+        deltaTT_s: Interval between estimated positions (s)
+    Purpose:
+        Vectorized equivalent of predictPath.predictPath ().
+        Segments of all targets are predicted together.
+    Returns:
+        A dict whose entries are the list of estimated interval positions (predicted path) for each target,
+        plus 'time', in the same shape as predictPath.predictPath ()
+    """
+    paths = dict.fromkeys ([t['name'] for t in targets])
+    if (len (targets) == 0):
+        return paths
+
+    # Build one row per (target, segment) for all moving targets
+    sources = []
+    ends = []
+    steps = []
+    owners = []
+    for idx, t in enumerate (targets):
+        paths['time'] = t['position'][0]  # Kept for compatibility with predictPath ()
+        t['source'] = t['position']
+        p = (t['position'][0], t['position'][1])
+        paths[t['name']] = [p]
+        if (t['speed'] == 0):
+            # Stationary targets
+            paths[t['name']].append (p)
+            continue
+        ways = t['waypoints']
+        if (len (ways) == 0):
+            # No waypoint to head for: the path is the current position
+            continue
+        sources.append (p)
+        sources.extend (ways[:-1])
+        ends.extend (ways)
+        steps.extend ([t['speed'] * deltaTT_s] * len (ways))
+        owners.extend ([idx] * len (ways))
+
+    if (len (owners) == 0):
+        return paths
+
+    points, K = segmentPoints (sources, ends, steps)
+    seg = nm.repeat (nm.arange (len (K)), K)
+    owners = nm.asarray (owners)
+
+    # Split points back out per target
+    pointOwners = owners[seg]
+    bounds = nm.searchsorted (pointOwners, nm.arange (len (targets) + 1))
+    for idx, t in enumerate (targets):
+        if (bounds[idx] == bounds[idx + 1]):
+            continue
+        chunk = points[bounds[idx]:bounds[idx + 1]]
+        paths[t['name']].extend (zip (chunk[:, 0].tolist (), chunk[:, 1].tolist ()))
+    return paths
+
+
+class IncrementalPredictor:
+    """
+    predictPathBatch () that reuses the previous cycle's predicted paths.
+    For each target it keeps the 'tail' of the path: the points of every segment after the first,
+    which only depend on the waypoints and the step length. On the next cycle:
+        same waypoints, speed within tolerance:  the tail is kept, only the first segment is recomputed
+        waypoints reached (the remaining waypoints are the end of the cached ones), speed within tolerance:
+                                                 the tail is shifted past the reached segments
+        otherwise:                               the whole path is recomputed
+    With speedTol = 0 the paths are identical to predictPathBatch (). A small tolerance lets noisy
+    speed estimates reuse the tail, which is then predicted with the speed it was computed at.
+    A predictor is called like predictPathBatch: predictor (targets).
+    """
+
+    def __init__ (self, deltaTT_s = deltaTT_s, speedTol = 0.0):
+        """
+        Arguments:
+            deltaTT_s: Interval between estimated positions (s)
+            speedTol: largest relative change in speed for which the cached tail is kept
+        """
+        self.deltaTT_s = deltaTT_s
+        self.speedTol = speedTol
+        self.cache = {}
+        self.numReused = 0
+        self.numShifted = 0
+        self.numRecomputed = 0
+
+    def sameSpeed (self, cached, speed):
+        return abs (speed - cached) <= self.speedTol * cached
+
+    def __call__ (self, targets):
+        paths = dict.fromkeys ([t['name'] for t in targets])
+        # First segments of every moving target, and the full tails that must be recomputed, in one batch
+        sources = []
+        ends = []
+        steps = []
+        heads = []
+        rebuilt = []
+        for t in targets:
+            paths['time'] = t['position'][0]  # Kept for compatibility with predictPath ()
+            t['source'] = t['position']
+            name = t['name']
+            p = (t['position'][0], t['position'][1])
+            paths[name] = [p]
+            if (t['speed'] == 0):
+                # Stationary targets
+                paths[name].append (p)
+                continue
+            ways = t['waypoints']
+            if (len (ways) == 0):
+                continue
+            speed = t['speed']
+            cached = self.cache.get (name)
+            if (cached is not None and self.sameSpeed (cached['speed'], speed)):
+                dropped = len (cached['ways']) - len (ways)
+                if (dropped == 0 and cached['ways'] == ways):
+                    self.numReused = self.numReused + 1
+                elif (dropped > 0 and cached['ways'][dropped:] == ways):
+                    # Shift the tail past the segments of the reached waypoints
+                    offsets = cached['offsets']
+                    cached['tail'] = cached['tail'][offsets[dropped]:]
+                    cached['offsets'] = [o - offsets[dropped] for o in offsets[dropped:]]
+                    cached['ways'] = ways
+                    self.numShifted = self.numShifted + 1
+                else:
+                    cached = None
+            else:
+                cached = None
+            heads.append ((name, len (sources)))
+            sources.append (p)
+            ends.append (ways[0])
+            steps.append (speed * self.deltaTT_s)
+            if (cached is None):
+                # Recompute the tail: segments from each waypoint to the next
+                self.cache[name] = {'speed':speed, 'ways':ways}
+                rebuilt.append ((name, len (sources), len (ways) - 1))
+                sources.extend (ways[:-1])
+                ends.extend (ways[1:])
+                steps.extend ([speed * self.deltaTT_s] * (len (ways) - 1))
+                self.numRecomputed = self.numRecomputed + 1
+
+        if (len (sources) == 0):
+            return paths
+        points, K = segmentPoints (sources, ends, steps)
+        starts = nm.concatenate (([0], nm.cumsum (K)))
+
+        for name, first, count in rebuilt:
+            tail = points[starts[first]:starts[first + count]]
+            cached = self.cache[name]
+            cached['tail'] = list (zip (tail[:, 0].tolist (), tail[:, 1].tolist ()))
+            cached['offsets'] = (starts[first:first + count + 1] - starts[first]).tolist ()
+        for name, i in heads:
+            head = points[starts[i]:starts[i + 1]]
+            paths[name].extend (zip (head[:, 0].tolist (), head[:, 1].tolist ()))
+            paths[name].extend (self.cache[name]['tail'])
+        return paths
+
+
+def comparePaths (reference, candidate, tol = 1e-6):
+    """
+    Function: comparePaths
+    Arguments:
+        reference: paths dict from predictPath.predictPath ()
+        candidate: paths dict from predictPathBatch ()
+        tol: Largest allowed coordinate difference
+    Purpose:
+        Returns the largest coordinate difference between two path dicts,
+        or infinity if their keys or path lengths differ
+    """
+    if (set (reference.keys ()) != set (candidate.keys ())):
+        return math.inf
+    worst = 0.0
+    for name in reference:
+        if (name == 'time'):
+            continue
+        a = nm.asarray (reference[name], dtype = float)
+        b = nm.asarray (candidate[name], dtype = float)
+        if (a.shape != b.shape):
+            return math.inf
+        if (len (a) > 0):
+            worst = max (worst, float (nm.max (nm.abs (a - b))))
+    return worst
+
+
+def checkIncremental (rng, trials, numTargets, numCycles = 30):
+    """
+    Function: checkIncremental
+    Purpose:
+        Runs IncrementalPredictor (speedTol = 0) and predictPathBatch () side by side over random sequences of cycles,
+        in which targets move, keep or change speed, and reach or replace waypoints.
+        Returns (number of cycles whose paths differ, incremental time, batch time)
+    """
+    import time
+    numDiffer = 0
+    timeIncremental = 0.0
+    timeBatch = 0.0
+    for trial in range (trials):
+        predictor = IncrementalPredictor ()
+        targets = []
+        for n in range (numTargets):
+            waypoints = [tuple (w) for w in rng.uniform (-60, 60, (int (rng.integers (1, 30)), 2)).tolist ()]
+            targets.append ({'name':'t' + str (n), 'position':tuple (rng.uniform (-60, 60, 2).tolist ()),
+                             'speed':float (rng.uniform (0.2, 3.0)), 'waypoints':waypoints})
+        for cycle in range (numCycles):
+            for t in targets:
+                t['position'] = tuple ((nm.asarray (t['position']) + rng.uniform (-2, 2, 2)).tolist ())
+                r = rng.random ()
+                if (r < 0.2):
+                    t['speed'] = 0.0 if rng.random () < 0.2 else float (rng.uniform (0.2, 3.0))
+                elif (r < 0.3 and len (t['waypoints']) > 1):
+                    t['waypoints'] = t['waypoints'][int (rng.integers (1, len (t['waypoints']))):]
+                elif (r < 0.33):
+                    t['waypoints'] = [tuple (w) for w in rng.uniform (-60, 60, (int (rng.integers (1, 30)), 2)).tolist ()]
+                elif (r < 0.35):
+                    t['waypoints'] = []
+            start = time.perf_counter ()
+            candidate = predictor (targets)
+            timeIncremental = timeIncremental + time.perf_counter () - start
+            start = time.perf_counter ()
+            reference = predictPathBatch (targets)
+            timeBatch = timeBatch + time.perf_counter () - start
+            if (candidate != reference):
+                numDiffer = numDiffer + 1
+    return numDiffer, timeIncremental, timeBatch
+
+def main ():
+    import argparse
+    import time
+    from predictPath import predictPath
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-t", "--trials", help = "number of random scenarios", type = int, default = 200)
+    parser.add_argument("-n", "--num_targets", help = "targets per scenario", type = int, default = 5)
+    parser.add_argument("-s", "--seed", help = "random seed", type = int, default = 0)
+    args = parser.parse_args()
+
+    rng = nm.random.default_rng (args.seed)
+    worst = 0.0
+    numIdleFailed = 0
+    timeLoop = 0.0
+    timeBatch = 0.0
+    for trial in range (args.trials):
+        targets = []
+        for n in range (args.num_targets):
+            numWaypoints = int (rng.integers (1, 8))
+            waypoints = [tuple (w) for w in rng.uniform (-60, 60, (numWaypoints, 2)).tolist ()]
+            speed = 0.0 if rng.random () < 0.1 else float (rng.uniform (0.2, 3.0))
+            targets.append ({'name':'t' + str (n), 'position':tuple (rng.uniform (-60, 60, 2).tolist ()),
+                             'speed':speed, 'waypoints':waypoints})
+        start = time.perf_counter ()
+        reference = predictPath (targets)
+        timeLoop = timeLoop + time.perf_counter () - start
+        start = time.perf_counter ()
+        candidate = predictPathBatch (targets)
+        timeBatch = timeBatch + time.perf_counter () - start
+        worst = max (worst, comparePaths (reference, candidate))
+
+        # A moving target without waypoints (predictPath () cannot take one) keeps its position,
+        # and the other targets' paths do not change
+        idle = {'name':'idle', 'position':tuple (rng.uniform (-60, 60, 2).tolist ()), 'speed':1.0, 'waypoints':[]}
+        withIdle = predictPathBatch (targets[0:trial % (len (targets) + 1)] + [idle] + targets[trial % (len (targets) + 1):])
+        # ('time' is the last target's x, see predictPath ())
+        if (withIdle.pop ('idle') != [idle['position']] or dict (withIdle, time = None) != dict (candidate, time = None)):
+            numIdleFailed = numIdleFailed + 1
+
+    print ("Max difference: {0}".format (worst))
+    print ("Loop: {0:.4f} s, Batch: {1:.4f} s".format (timeLoop, timeBatch))
+    if (worst > 1e-6):
+        print ("[-] Batched prediction does not match predictPath ()")
+        exit (1)
+    print ("[+] Batched prediction matches predictPath ()")
+    if (numIdleFailed > 0):
+        print ("[-] A moving target without waypoints changes the batched paths in {0} trials".format (numIdleFailed))
+        exit (1)
+    print ("[+] Moving targets without waypoints are skipped")
+
+    numDiffer, timeIncremental, timeBatch = checkIncremental (rng, args.trials // 4, args.num_targets)
+    print ("Incremental: {0:.4f} s, Batch: {1:.4f} s".format (timeIncremental, timeBatch))
+    if (numDiffer > 0):
+        print ("[-] Incremental prediction differs from predictPathBatch () in {0} cycles".format (numDiffer))
+        exit (1)
+    print ("[+] Incremental prediction matches predictPathBatch ()")
+
+
+if __name__ == "__main__":
+    main()
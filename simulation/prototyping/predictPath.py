@@ -20,16 +20,17 @@ Each target has a number of periodic 'observations' that are not always aligned
 """ 
 import math
 import numpy as nm
-import pylab as pl
 import argparse
-import re
-from matplotlib.path import Path
-import matplotlib.patches as patches
-from shapely.geometry import Point
-from shapely.geometry.polygon import Polygon
+from predictEngine import predictPathBatch, IncrementalPredictor
+from cameraModel import CameraModel, pointsInQuad
+from positioning import PoseOptimizer, FramingSolver, stackPaths, leadingCount
+from fleetState import FleetState
+from targetFiles import readWaypoints, readStart, readObservedPath, deltaT_s
+from roundCache import loadTargets
+from phaseProfile import phase, profiler
 
 # Time between updates (s)
-deltaT_s = 2    # Interval between target's position messages
+# deltaT_s (targetFiles.py): Interval between target's position messages
 deltaTT_s = 2   # Interval between estimated positions
 maxWait = 5
 useWaypoints = True
@@ -37,6 +38,27 @@ useWaypoints = True
 
 #### Function Definitions
 
+class NullObserver:
+    """
+    Observer of planCoverage () that ignores everything.
+    An observer has three methods:
+        start (targets):  called once, before the first cycle
+        cycle (state):    called after each positioning, with a dict of 'paths', 'centroid_path',
+                          'maxTarget', 'footprint' and 'timeToStay'
+        finish ():        called once, after the last cycle
+    predictPlot.PlotObserver is the observer that makes the plots.
+    """
+
+    def start (self, targets):
+        pass
+
+    def cycle (self, state):
+        pass
+
+    def finish (self):
+        pass
+
+
 def updatePositions (targets):
     """
     Function : updatePositions
@@ -122,22 +144,27 @@ def calcGroundFootprint (camera, altitude_m, position):
     posUpperRight = (position[0] + distRight, position[1] + distFront)
     return (posLowerLeft, posUpperLeft, posUpperRight, posLowerRight)
 
-def calcTimeToStayInPosition(centroidPath, footprint):
-    polygon = Polygon (footprint)
-    cPath = centroidPath.copy ()
-    # First centroid assumed to be in footprint: increment by update interval
-    time_s = deltaTT_s
-    centroidContained = True
-    while (centroidContained == True and len (cPath) > 0):
-        nextCentroid = cPath.pop (0)
-        point = Point (nextCentroid)
-        # Check if the next centroid is in footprint
-        if (polygon.contains (point)):
-            # Since it is, increment by update interval
-            time_s = time_s + deltaTT_s
-        else:
-            centroidContained = False 
-    return time_s
+def calcTimeToStayInPosition (centroidPath, footprint, targetPaths = None):
+    """
+    Function: calcTimeToStayInPosition
+    Arguments:
+        centroidPath: predicted centroid positions, a list of (x, y) or an (S x 2) array
+        footprint: ground footprint corners
+        targetPaths: optional (S x N x 2) predicted target positions, e.g. from positioning.stackPaths ()
+    Purpose:
+        The first centroid is assumed to be in the footprint; every following predicted centroid
+        that is still inside adds one update interval, up to the first one that is not.
+        All centroids are tested at once, and the first exit is the first False.
+    Returns:
+        The time to stay (s), or, if targetPaths is given, (time to stay, array of the time to stay for each target)
+    """
+    quad = nm.asarray (footprint, dtype = float)[0:4]
+    path = nm.asarray (centroidPath, dtype = float).reshape (-1, 2)
+    time_s = deltaTT_s * (1 + int (leadingCount (pointsInQuad (quad, path)[None, :])[0]))
+    if (targetPaths is None):
+        return time_s
+    contained = pointsInQuad (quad, nm.asarray (targetPaths, dtype = float))
+    return time_s, deltaTT_s * (1 + leadingCount (contained.T))
     
 
 def get_angle_2D (a, b):
@@ -315,127 +342,222 @@ def calcCentroidPath (targets, paths):
     return {'path':centroid_path, 'time':time}
        
 
-def main ():
-    # Parse arguments
-    parser = argparse.ArgumentParser()
-    parser.add_argument("-n", "--names", help = "comma-separated list of target names")
-    parser.add_argument("-w", "--waypoint_dir", help = "directory containing waypoint data")
-    parser.add_argument("-p", "--path_dir", help = "directory containing path data")
-    parser.add_argument("-d", "--disable_waypoints", help = "disable using waypoints for following")
-    args = parser.parse_args()
-    
-    if (args.names is None):
-        print ("Must supply targets with -n")
-        exit (0)
-    target_names = args.names.split (",")
+def initQuad (altitude_m = 75):
+    """
+    Function: initQuad
+    Arguments:
+        altitude_m: Altitude of the quadcopter's camera in meters
+    Purpose:
+        Returns the 'Quad' struct: camera, altitude and initial position of the quadcopter
+    """
+    quad = {'camera': {'xSensor_mm':6.16, 'ySensor_mm':4.62, 'focallen_mm':3.61, 'xGimbal_deg':0, 'yGimbal_deg':20}}
+    quad['altitude'] = altitude_m
+    quad['position_prev'] = (-62, 60)
+    quad['position'] = (-60, 60)
+    quad['heading'] = 0
+    return quad
 
-    if (args.disable_waypoints is not None):
-        useWaypoints = False
-    else:
-        useWaypoints = True
+def formatCoverageRow (footprint, time_s):
+    """
+    Function: formatCoverageRow
+    Purpose:
+        Returns the coverage CSV row read by evaluate.py: the four footprint corners, then the time to stay
+    """
+    CSVrow = [str (f[0]) + "," + str (f[1]) + "," for f in footprint]
+    CSVrow.append (str (time_s))
+    return ''.join (CSVrow)
+
+def planCycle (fleet, quad, camera, useWaypoints = True, positioner = None, footDist = 0, predictor = None, framer = None):
+    """
+    Function: planCycle
+    Arguments:
+        fleet: FleetState with the targets' current and previous positions
+        quad: 'Quad' struct from initQuad (); its position, waypoint and heading are updated
+        camera: cameraModel.CameraModel of the quad's camera
+        useWaypoints, positioner: as in planCoverage ()
+        footDist: front extent of the previous ground footprint (m), 0 on the first cycle
+        predictor: path predictor called as predictor (targets), default predictPathBatch ()
+        framer: if given, a positioning.FramingSolver; the quad's camera and altitude are then updated too
+    Purpose:
+        One prediction and positioning cycle (Phases 0 - 2 of planCoverage ()) from the current positions.
+        Shared by planCoverage () and the online service in predictService.py
+    Returns:
+        A dict of 'paths', 'centroid_path', 'maxTarget', 'footprint', 'footDist' and 'timeToStay'
+    """
+    targets = fleet.views
+
+    # Should reposition?
+    reposition = True
+
+    #-------------------------#
+    # Phase 0: Estimate Speed #
+    #-------------------------#
     
-    # Parse targets, waypoints, initial positions
-    targets = [{'name':x, 'position_prev':(None, None), 'position':(None, None), 'source':(None, None), 'speed':None} for x in target_names]
-    for t in targets:
-        # Read waypoints
-        fh = args.waypoint_dir + t['name'] + ".waypoints"
-        with open (fh) as f:
-            waypoints = f.readlines ()
-        waypoints = [x.strip () for x in waypoints]
-        t['waypoints'] = [(float (x.split(',')[0]), float (x.split(',')[1])) for x in waypoints]
+    # Estimate target speeds
+    with phase ("calcSpeed"):
+        fleet.calcSpeed (deltaT_s)
+
+    #--------------------------#
+    # Phase 1: Path Prediction #
+    #--------------------------#
+
+    # Predict the paths of the targets
+    with phase ("predictPath"):
+        if (predictor is None):
+            paths = predictPathBatch (targets, deltaTT_s)
+        else:
+            paths = predictor (targets)
+    # use targets' path predictions to predict centroid path
+    with phase ("calcCentroidPath"):
+        centroid_path = calcCentroidPath (targets, paths)
     
-        # Read start position
-        fh = args.waypoint_dir + t['name'] + ".start"
-        with open (fh) as f:
-            start = f.readlines ()[0].strip ()
-        t['position'] = (float (start.split(',')[0]), float (start.split(',')[1])) 
-        t['source'] = t['position']
+    ####### Plot: Predicted centroid paths
+    #pl.plot(*zip(*paths['susan']), 'go')
+    #pl.plot(*zip(*paths['anton']), 'bo')
+    #pl.plot(*zip(*paths['django']), 'ro')
+    #pl.plot(*zip(*centroid_path['path']), '.')
+    ####### End Plot
+
+    #------------------------#
+    # Phase 2 : Positioning  #
+    #------------------------#
+
+
+    # Determine standoff distance from the targets closest to and farthest from the quadcopter
+    c = quad['position']
+    nearest, lowDist = fleet.index.nearest (c)
+    farthest, maxDist = fleet.index.farthest (c)
+    maxTarget = targets[nearest]
+    realMaxTarget = targets[farthest]
+    standoffDist = 1
     
+    if (maxDist < footDist - 1 ):
+        reposition = False
     
-    # Parse target's observed path points
-    for t in targets:
-        fh = args.path_dir + t['name'] + ".path"
-        t['observed_path'] = [t['source']]
-        secs_prev = -1
-        with open (fh) as f:
-            path = f.readlines ()
-            for line in path:
-                line = line.rstrip()
-                if (line[0] == '['):
-                    # Ignore
-                    True
-                elif (line == "Arrived!"):
-                    t['observed_path'].append ('A')
-                else:
-                    time = re.findall('time[^,}]*', line)[0]
-                    time = re.findall('[0-9]*:[0-9]*:[0-9]*', time)[0]
-                    # ! Only add uniq, even times
-                    secs = time.split(":")[2]
-                    if (int (secs) % 2 != 0):
-                        # Ignore
-                        True
-                    elif (secs == secs_prev):
-                        # Ignore
-                        True
-                    else:
-                        x = re.findall ('[-0-9]*\.[0-9]*', re.findall('pos_x[^,}]*', line)[0])[0]
-                        y = re.findall ('[-0-9]*\.[0-9]*', re.findall('pos_y[^,}]*', line)[0])[0]
-                        t['observed_path'].append ( (float (x), float (y)) )
-                    secs_prev = secs
+    # Set waypoint as first predicted centroid
+    if (len (centroid_path['path']) > 1):
+        nextCentroid = centroid_path['path'][1]
+    else:
+        nextCentroid = centroid_path['path'][0]
+    #if (len (centroid_path['path']) > 5):
+    #    futureCentroid = centroid_path['path'][4]
+    #else:
+    #     futureCentroid = nextCentroid
 
-    
-    # Init Quadcopter
-    quad = {'camera': {'xSensor_mm':6.16, 'ySensor_mm':4.62, 'focallen_mm':3.61, 'xGimbal_deg':0, 'yGimbal_deg':20}}
-    quad['altitude'] = 75
-    quad['position_prev'] = (-62, 60)
-    quad['position'] = (-60, 60)
-    quad['heading'] = 0
- 
-    # Init previous positions to null
-    for t in targets:
-        t['position_prev'] = (None, None)
+    # Get waypoint centroid
+    wayCenter = tuple (fleet.nextWaypoints ().mean (axis = 0).tolist ())
+    futureCentroid = wayCenter
+
+## 
+    if (useWaypoints == False):
+        futureCentroid = nextCentroid
+
+    # Reframe in place, instead of flying, when a camera setting holds the predicted group over the horizon
+    if (framer is not None):
+        predicted = stackPaths (paths, fleet.names)
+        with phase ("solveFraming"):
+            frame = framer.solve (predicted, quad['position'], quad.get ('heading_angle', quad['heading']), quad)
+        if (frame['fits']):
+            reposition = False
+
+    # Go to waypoint
+    if (maxTarget['position'][0] == quad['position_prev'][0] and maxTarget['position'][1] == quad['position_prev'][1]):
+        reposition = False 
+    if (reposition):
+            quad['waypoint'] = get_coords_in_radius (maxTarget['position'], quad['position_prev'], standoffDist)
+        #else: 
+        #    quad['waypoint'] = get_coords_in_radius (maxTarget['position'], quad['position'], standoffDist)
+    else:
+        quad['waypoint'] = quad['position']
+    quad['position_prev'] = quad['position']
+    quad['position'] = quad['waypoint']
+
+    # Set heading angle toward the waypoint
+    if (reposition):
+        p = quad['position_prev']
+        w = quad['waypoint']
+        n = futureCentroid
+        i = nm.subtract (n, w)
+        theta = nm.arctan2 (i[1], i[0])
+        if (theta < 0):
+            theta = theta + 2 * math.pi
+        quad['heading_angle'] = theta
+
+    if (positioner is not None):
+        # Best scored candidate pose for the predicted paths
+        with phase ("optimizePose"):
+            pose = positioner.optimize (stackPaths (paths, fleet.names), centroid_path['path'],
+                                        (quad['position_prev'], quad.get ('heading_angle', 0), quad['altitude']))
+        quad['waypoint'] = pose['position']
+        quad['position'] = pose['position']
+        quad['altitude'] = pose['altitude']
+        quad['heading_angle'] = pose['heading']
+
+    if (framer is not None):
+        if (reposition):
+            # Best setting from the new pose
+            with phase ("solveFraming"):
+                frame = framer.solve (predicted, quad['position'], quad.get ('heading_angle', quad['heading']), quad)
+        quad['camera'] = frame['camera']
+        quad['altitude'] = frame['altitude']
+        camera = CameraModel.fromDict (quad['camera'])
+
+    # Get current ground footprint
+    with phase ("footprint"):
+        footprint = camera.footprint (quad['position'], quad.get ('heading_angle', quad['heading']), quad['altitude'], center = quad['waypoint'])
+        footDist = camera.dimensions (quad['altitude'])[0]
+    # How long to stay in position
+    with phase ("calcTimeToStayInPosition"):
+        timeToStayAtWaypoint = calcTimeToStayInPosition (centroid_path['path'], footprint)
+    timeToStayAtWaypoint = min (timeToStayAtWaypoint, maxWait)
+    timeToStatAtWaypoint = max (timeToStayAtWaypoint, 5)
+
+    return {'paths':paths, 'centroid_path':centroid_path, 'maxTarget':maxTarget,
+            'footprint':footprint, 'footDist':footDist, 'timeToStay':timeToStayAtWaypoint}
+
+def planCoverage (targets, quad, useWaypoints = True, waitTime_s = 10, observer = None, positioner = None, predictor = None,
+                  framer = None):
+    """
+    Function: planCoverage
+    Arguments:
+        targets: List of 'Target' structs, with waypoints and observed paths
+        quad: 'Quad' struct from initQuad ()
+        useWaypoints: if True, head toward the centroid of the targets' current waypoints,
+            else toward the next predicted centroid
+        waitTime_s: Time to stay in each position (s)
+        observer: notified at the start, after each positioning and at the end of the loop
+            (see predictPlot.py). Plotting is done by passing a predictPlot.PlotObserver
+        positioner: if given, a positioning.PoseOptimizer that picks each position, heading and altitude
+            in place of the standoff waypoint from the closest target
+        predictor: if given, predicts the paths in place of predictPathBatch (), such as a
+            predictEngine.IncrementalPredictor that reuses the previous cycle's paths
+        framer: if given, a positioning.FramingSolver that picks the gimbal tilt, focal length and altitude
+            each cycle, and keeps the quadcopter in place while one of them holds the predicted group
+    Purpose:
+        Runs the prediction and positioning loop over the targets' observed paths
+    Returns:
+        A list of (footprint, time to stay) for each position of the quadcopter
+    """
+    # Move targets into array-backed fleet state, with previous positions and speeds init to null.
+    # From here on, 'targets' are views into the fleet arrays
+    fleet = FleetState (targets)
+    targets = fleet.views
 
-    # Init speeds to None
-    for t in targets: 
-        t['speed'] = None
+    # Camera geometry, with the footprint offsets cached per altitude
+    camera = CameraModel.fromDict (quad['camera'])
     
     # Init centroid
-    centroid = { 'position_prev': (None, None), 'position': calcCentroid (targets), 'speed': None, 'direction': (None, None) }
+    centroid = { 'position_prev': (None, None), 'position': fleet.calcCentroid (), 'speed': None, 'direction': (None, None) }
     
     # Init 'predict' as true, the flag for loop continuation
     predict = True
     
-    ####### Plot: Waypoints & initial positions
-    pl.title ('Target Tracking')
-    cnt = 0
-    cols = ['r', 'b', 'g']
-    labels = ['Target 1: waypoints', 'Target 2: waypoints', 'Target 3: waypoints']
-    for t in targets:
-        ways = []
-        ways.append (t['position'])
-        ways.extend (t['waypoints'])
-        pl.plot(*zip (*ways), linestyle = '--', marker = 'o', color = cols[cnt], label = labels[cnt])
-        cnt = cnt + 1
-        pl.legend ()
-    x1, x2, y1, y2 = pl.axis()
-    pl.axis ((x1 - 50, x2 + 50, y1 - 50 , y2 + 50))
-    pl.legend(loc='lower left', shadow=True)
-    pl.savefig ('predictPath__waypoints.pdf')
-    ####### End Plot
-    
-    ####### Plot: Observed target positions
-    cnt = 0
-    labels = ['Target 1: observed', 'Target 2: observed', 'Target 3: observed']
-    for t in targets:
-        path = [ (x[0], x[1]) if (x != "A") else (nm.nan, nm.nan) for x in t['observed_path'] ]
-        pl.plot(*zip(*path), linestyle = '-', color = cols[cnt], label = labels[cnt])
-        cnt = cnt + 1
-    pl.legend(loc='lower left', shadow=True)
-    pl.savefig ('predictPath__observed.pdf')
-    ####### End Plot
+    if (observer is None):
+        observer = NullObserver ()
+    observer.start (targets)
 
     # Handles communication
-    updatePositions (targets)
+    fleet.updatePositions ()
 
     # Main loop: Path prediction
     numRuns = 0
@@ -444,156 +566,99 @@ def main ():
     prev = None
  
     footDist = 0
+    coverage = []
  
     while (predict == True):
-        
-        # Should reposition?
-        reposition = True        
 
         # Skip updates based off of loop, since
         numSkip = timeRun #/ deltaT_s)
         for i in range (numSkip):
             if (predict == True):
-                 predict = updatePositions (targets)
-        
-        #-------------------------#
-        # Phase 0: Estimate Speed #
-        #-------------------------#
-        
-        # Estimate target speeds
-        calcSpeed (targets)
-        # Calculate centroid using current observations
-        centroid['position'] = calcCentroid (targets)
-
-        #--------------------------#
-        # Phase 1: Path Prediction #
-        #--------------------------#
-
-        # Predict the paths of the targets
-        paths = predictPath (targets)
-        # use targets' path predictions to predict centroid path
-        centroid_path = calcCentroidPath (targets, paths)
+                 predict = fleet.updatePositions ()
         
-        ####### Plot: Predicted centroid paths
-        #pl.plot(*zip(*paths['susan']), 'go')
-        #pl.plot(*zip(*paths['anton']), 'bo')
-        #pl.plot(*zip(*paths['django']), 'ro')
-        #pl.plot(*zip(*centroid_path['path']), '.')
-        ####### End Plot
-
+        with phase ("planCycle"):
+            state = planCycle (fleet, quad, camera, useWaypoints, positioner, footDist, predictor, framer)
+        footDist = state['footDist']
+        footprint = state['footprint']
+        timeToStayAtWaypoint = state['timeToStay']
+        timeToStayAtWaypoint = waitTime_s
         numRuns = numRuns + 1
-
-        #------------------------#
-        # Phase 2 : Positioning  #
-        #------------------------#
-
-
-        # Determine standoff distance
-        points = [(t['position'][0], t['position'][1]) for t in targets]
-        #c = (centroid['position'][0], centroid['position'][1])
-        c = quad['position']
-        lowDist = 100 # <---- embarrassing.. 
-        maxDist = 0
-        for t in targets: 
-            p = t['position']
-            distFromCentroid = ((p[0] - c[0]) ** 2 + (p[1] - c[1]) ** 2 ) ** (.5)
-            if (distFromCentroid < lowDist):
-                lowDist = distFromCentroid
-                maxTarget = t
-            if (distFromCentroid > maxDist):
-                maxDist = distFromCentroid
-                realMaxTarget = t
-        standoffDist = 1
         
-        if (maxDist < footDist - 1 ):
-            reposition = False
+        # Logging:
+        coverage.append ((footprint, timeToStayAtWaypoint))
+ 
+        state['timeToStay'] = timeToStayAtWaypoint
+        observer.cycle (state)
 
-        pl.plot ([maxTarget['position'][0]], [maxTarget['position'][1]], marker = 'x')
-        
-        # Set waypoint as first predicted centroid
-        if (len (centroid_path['path']) > 1):
-            nextCentroid = centroid_path['path'][1]
-        else:
-            nextCentroid = centroid_path['path'][0]
-        #if (len (centroid_path['path']) > 5):
-        #    futureCentroid = centroid_path['path'][4]
-        #else:
-        #     futureCentroid = nextCentroid
-
-        # Get waypoint centroid
-        nextWaypoints = [t['waypoints'][0] for t in targets]
-        x, y = zip (*nextWaypoints)
-        l = len (x)
-        wayCenter = ( sum (x) / l, sum (y) / l )
-        futureCentroid = wayCenter
+        timeRun = timeToStayAtWaypoint
+    observer.finish ()
+    return coverage
 
-## 
-        if (useWaypoints == False):
-            futureCentroid = nextCentroid
+def main ():
+    # Parse arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--names", help = "comma-separated list of target names")
+    parser.add_argument("-w", "--waypoint_dir", help = "directory containing waypoint data")
+    parser.add_argument("-p", "--path_dir", help = "directory containing path data")
+    parser.add_argument("-c", "--cache", help = "load inputs from a binary cache in path_dir, created on first use", action = "store_true")
+    parser.add_argument("-d", "--disable_waypoints", help = "disable using waypoints for following")
+    parser.add_argument("-a", "--altitude", help = "altitude of the quadcopter (m)", type = float, default = 75)
+    parser.add_argument("-i", "--interval", help = "time to stay in each position (s)", type = int, default = 10)
+    parser.add_argument("-q", "--no_plot", help = "do not plot or write the PDFs", action = "store_true")
+    parser.add_argument("-o", "--optimize", help = "position with the candidate-pose optimizer", action = "store_true")
+    parser.add_argument("-f", "--frame", help = "choose gimbal tilt, zoom and altitude each cycle, reframing instead of flying when possible", action = "store_true")
+    parser.add_argument("--profile", help = "time each planning phase and write a JSON summary at exit to FILE (default: stderr); "
+                                            "also enabled by the PREDICT_PROFILE environment variable", nargs = "?", const = "-", metavar = "FILE")
+    parser.add_argument("-t", "--speed_tolerance", help = "predict incrementally, reusing paths while speeds change by at most this fraction", type = float)
+    args = parser.parse_args()
+    
+    if (args.names is None):
+        print ("Must supply targets with -n")
+        exit (0)
+    profiler.budget_s = deltaTT_s
+    if (args.profile is not None):
+        profiler.enable (args.profile)
+    target_names = args.names.split (",")
 
-        # Go to waypoint
-        if (maxTarget['position'][0] == quad['position_prev'][0] and maxTarget['position'][1] == quad['position_prev'][1]):
-            reposition = False 
-        if (reposition):
-                quad['waypoint'] = get_coords_in_radius (maxTarget['position'], quad['position_prev'], standoffDist)
-            #else: 
-            #    quad['waypoint'] = get_coords_in_radius (maxTarget['position'], quad['position'], standoffDist)
-        else:
-            quad['waypoint'] = quad['position']
-        quad['position_prev'] = quad['position']
-        quad['position'] = quad['waypoint']
+    if (args.disable_waypoints is not None):
+        useWaypoints = False
+    else:
+        useWaypoints = True
+    
+    if (args.cache):
+        # Load targets, waypoints, initial positions and observed paths from the round's binary cache
+        targets = loadTargets (target_names, args.waypoint_dir, args.path_dir)
+    else:
+        # Parse targets, waypoints, initial positions
+        targets = [{'name':x, 'position_prev':(None, None), 'position':(None, None), 'source':(None, None), 'speed':None} for x in target_names]
+        for t in targets:
+            t['waypoints'] = readWaypoints (args.waypoint_dir + t['name'] + ".waypoints")
+            t['position'] = readStart (args.waypoint_dir + t['name'] + ".start")
+            t['source'] = t['position']
 
-        # Set heading angle toward the waypoint
-        if (reposition):
-            p = quad['position_prev']
-            w = quad['waypoint']
-            n = futureCentroid
-            i = nm.subtract (n, w)
-            theta = nm.arctan2 (i[1], i[0])
-            if (theta < 0):
-                theta = theta + 2 * math.pi
-            quad['heading_angle'] = theta
-
-        # Get current ground footprint
-        footprint =  calcGroundFootprint (quad['camera'], quad['altitude'], quad['position'])
-        footprint = [rotatePoint (w, footprint[0], theta), 
-                     rotatePoint (w, footprint[1], theta), 
-                     rotatePoint (w, footprint[2], theta),
-                     rotatePoint (w, footprint[3], theta)]
-        footDist = calcGroundFootprintDimensions (quad['camera'], quad['altitude'])[0]
-        # How long to stay in position
-        timeToStayAtWaypoint = calcTimeToStayInPosition (centroid_path['path'], footprint)
-        timeToStayAtWaypoint = min (timeToStayAtWaypoint, maxWait)
-        timeToStatAtWaypoint = max (timeToStayAtWaypoint, 5)
-        if (useWaypoints == False):
-            timeToStayAtWaypoint = 10
-        else:
-            timeToStayAtWaypoint = 10
-        
-        # Logging:
-        # Build CSV row of footprint information
-        CSVrow = [str (f[0]) + "," + str (f[1]) + "," for f in footprint]
-        CSVrow.append (str (timeToStayAtWaypoint))
-        CSVrow = ''.join (CSVrow)
-        print (CSVrow)
- 
-        ####### Plot: Footprint
-        # Source = http://matplotlib.org/users/path_tutorial.html
-        verts = footprint
-        verts.append ( (0, 0) )
-        codes = [Path.MOVETO,
-            Path.LINETO,
-            Path.LINETO,
-            Path.LINETO,
-            Path.CLOSEPOLY,
-            ]
-        path = Path (verts, codes)
-        patch = patches.PathPatch (path, facecolor = 'orange', lw = 2)
-        pl.gca().add_patch (patch)
-        #######
+        # Parse target's observed path points
+        for t in targets:
+            t['observed_path'] = readObservedPath (args.path_dir + t['name'] + ".path", t['source'])
 
-        timeRun = timeToStayAtWaypoint
-    pl.savefig ('predictPath__predicted.pdf')
+    
+    quad = initQuad (args.altitude)
+    if (args.no_plot):
+        observer = None
+    else:
+        # Only import pylab when plotting
+        from predictPlot import PlotObserver
+        observer = PlotObserver ()
+    positioner = None
+    if (args.optimize):
+        positioner = PoseOptimizer (CameraModel.fromDict (quad['camera']), [quad['altitude']], budget_s = 0.5 * deltaTT_s)
+    predictor = None
+    if (args.speed_tolerance is not None):
+        predictor = IncrementalPredictor (deltaTT_s, args.speed_tolerance)
+    framer = None
+    if (args.frame):
+        framer = FramingSolver (quad['camera'], horizon_s = args.interval, deltaTT_s = deltaTT_s)
+    for footprint, time_s in planCoverage (targets, quad, useWaypoints, args.interval, observer, positioner, predictor, framer):
+        print (formatCoverageRow (footprint, time_s))
 
 
 if __name__ == "__main__":
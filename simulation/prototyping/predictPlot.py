@@ -0,0 +1,78 @@
+#!/usr/bin/python3
+
+"""
+File: predictPlot.py
+
+Plotting for predictPath.planCoverage ().
+The planning loop does not import matplotlib; it reports to an optional observer instead.
+PlotObserver is that observer for the plots predictPath.py has always made:
+    predictPath__waypoints.pdf: waypoints and initial positions
+    predictPath__observed.pdf:  observed target positions
+    predictPath__predicted.pdf: every ground footprint, and the target the quadcopter positioned from
+
+See predictPath.NullObserver for the observer methods.
+"""
+import numpy as nm
+import pylab as pl
+from matplotlib.path import Path
+import matplotlib.patches as patches
+
+
+class PlotObserver:
+    """
+    Plots the planning loop with pylab and saves the PDFs to outPrefix + '__waypoints.pdf', etc.
+    """
+
+    def __init__ (self, outPrefix = 'predictPath'):
+        self.outPrefix = outPrefix
+
+    def start (self, targets):
+        ####### Plot: Waypoints & initial positions
+        pl.title ('Target Tracking')
+        cnt = 0
+        cols = ['r', 'b', 'g']
+        labels = ['Target 1: waypoints', 'Target 2: waypoints', 'Target 3: waypoints']
+        for t in targets:
+            ways = []
+            ways.append (t['position'])
+            ways.extend (t['waypoints'])
+            pl.plot(*zip (*ways), linestyle = '--', marker = 'o', color = cols[cnt], label = labels[cnt])
+            cnt = cnt + 1
+            pl.legend ()
+        x1, x2, y1, y2 = pl.axis()
+        pl.axis ((x1 - 50, x2 + 50, y1 - 50 , y2 + 50))
+        pl.legend(loc='lower left', shadow=True)
+        pl.savefig (self.outPrefix + '__waypoints.pdf')
+        ####### End Plot
+
+        ####### Plot: Observed target positions
+        cnt = 0
+        labels = ['Target 1: observed', 'Target 2: observed', 'Target 3: observed']
+        for t in targets:
+            path = [ (x[0], x[1]) if (x != "A") else (nm.nan, nm.nan) for x in t['observed_path'] ]
+            pl.plot(*zip(*path), linestyle = '-', color = cols[cnt], label = labels[cnt])
+            cnt = cnt + 1
+        pl.legend(loc='lower left', shadow=True)
+        pl.savefig (self.outPrefix + '__observed.pdf')
+        ####### End Plot
+
+    def cycle (self, state):
+        maxTarget = state['maxTarget']
+        pl.plot ([maxTarget['position'][0]], [maxTarget['position'][1]], marker = 'x')
+
+        ####### Plot: Footprint
+        # Source = http://matplotlib.org/users/path_tutorial.html
+        verts = list (state['footprint']) + [(0, 0)]
+        codes = [Path.MOVETO,
+            Path.LINETO,
+            Path.LINETO,
+            Path.LINETO,
+            Path.CLOSEPOLY,
+            ]
+        path = Path (verts, codes)
+        patch = patches.PathPatch (path, facecolor = 'orange', lw = 2)
+        pl.gca().add_patch (patch)
+        #######
+
+    def finish (self):
+        pl.savefig (self.outPrefix + '__predicted.pdf')
@@ -0,0 +1,272 @@
+#!/usr/bin/python3
+
+"""
+File: predictService.py
+
+Online mode of predictPath.py.
+planCoverage () replays recorded .path logs offline. This service runs the same prediction and positioning
+cycle (predictPath.planCycle ()) on target positions as they arrive. Every deltaTT_s it:
+    1. takes the latest position of every target from a feed
+    2. predicts the targets' paths, incrementally from the previous cycle's paths
+       (predictEngine.IncrementalPredictor), and positions the quadcopter
+    3. emits the quadcopter's waypoint and heading, with the time the cycle took
+A feed is one of:
+    ReplayFeed: plays outData/roundN/<name>.path logs back as a live feed, optionally accelerated
+    MorseFeed:  subscribes to the targets' pose streams in Morse (needs pymorse and simulation/lib on PYTHONPATH)
+
+Example: replay round 12 ten times faster than real time, also writing a coverage file for evaluate.py
+    python3 predictService.py -n susan,django,anton -w ../inData/round12/ -p ../outData/round12/ -x 10 -f online.csv
+"""
+import sys
+import time
+import argparse
+import numpy as nm
+from predictPath import initQuad, planCycle, formatCoverageRow, deltaTT_s
+from predictEngine import IncrementalPredictor
+from cameraModel import CameraModel
+from positioning import PoseOptimizer
+from fleetState import FleetState
+from targetFiles import readWaypoints, readStart, readPathLog, ARRIVED
+from phaseProfile import phase, profiler
+
+header = "Cycle,Time_s,Waypoint_x,Waypoint_y,Heading_rad,Altitude_m,Latency_ms"
+
+
+class ReplayFeed:
+    """
+    Plays recorded .path logs back as live telemetry.
+    poll () returns the last logged position of every target at the current log time,
+    which advances speedup times faster than the wall clock.
+    """
+
+    def __init__ (self, names, path_dir, starts, speedup = 1.0):
+        """
+        Arguments:
+            names: target names
+            path_dir: directory containing <name>.path logs
+            starts: start position of each target, reported until its first observation
+            speedup: log seconds per wall-clock second; 0 replays one cycle per poll () without waiting
+        """
+        self.names = names
+        self.speedup = speedup
+        self.logs = []
+        for name, start in zip (names, starts):
+            # (secs, x, y, number of arrivals so far) for every logged status
+            records = []
+            numArrived = 0
+            for record in readPathLog (path_dir + name + ".path", evenOnly = False):
+                if (record is ARRIVED):
+                    numArrived = numArrived + 1
+                    if (records):
+                        records[-1] = records[-1][0:3] + (numArrived,)
+                else:
+                    records.append ((record.secs, record.x, record.y, numArrived))
+            self.logs.append ({'start':start, 'records':records,
+                               'secs':nm.array ([r[0] for r in records], dtype = float)})
+        firsts = [log['secs'][0] for log in self.logs if len (log['secs'])]
+        lasts = [log['secs'][-1] for log in self.logs if len (log['secs'])]
+        self.startSecs = min (firsts) if firsts else 0
+        self.endSecs = max (lasts) if lasts else 0
+        self.logTime = self.startSecs
+        self.wallStart = None
+        self.arrivedSeen = [0] * len (names)
+
+    def waitUntil (self, cycle, period_s):
+        """
+        Blocks until the start of cycle number 'cycle', of period_s log seconds each
+        """
+        self.logTime = self.startSecs + cycle * period_s
+        if (self.speedup <= 0):
+            return
+        if (self.wallStart is None):
+            self.wallStart = time.perf_counter ()
+        delay = self.wallStart + cycle * period_s / self.speedup - time.perf_counter ()
+        if (delay > 0):
+            time.sleep (delay)
+
+    def poll (self):
+        """
+        Returns (positions (N x 2), arrivals): the last logged position of each target, and the
+        indices of targets that arrived at a waypoint since the previous poll. None once the logs are over.
+        """
+        if (self.logTime > self.endSecs):
+            return None
+        positions = nm.empty ((len (self.names), 2))
+        arrivals = []
+        for i, log in enumerate (self.logs):
+            k = int (nm.searchsorted (log['secs'], self.logTime, side = 'right')) - 1
+            if (k < 0):
+                positions[i] = log['start']
+                continue
+            record = log['records'][k]
+            positions[i] = record[1:3]
+            arrivals.extend ([i] * (record[3] - self.arrivedSeen[i]))
+            self.arrivedSeen[i] = record[3]
+        return positions, arrivals
+
+
+class MorseFeed:
+    """
+    Live telemetry from Morse: the targets' pose streams, through roboutils subscriptions.
+    Morse does not tell the quadcopter when a target reaches a waypoint, so arrivals are
+    reported when a target comes within arriveRadius_m of its current waypoint.
+    """
+
+    def __init__ (self, names, host = "localhost", port = 4000, arriveRadius_m = 1.0):
+        import pymorse
+        from roboutils import subscribe_pose
+        self.simu = pymorse.Morse (host, port)
+        self.names = names
+        self.arriveRadius_m = arriveRadius_m
+        self.robots = []
+        for name in names:
+            robot = {'name':name, 'simu':self.simu, 'destination':{'x':None, 'y':None}}
+            subscribe_pose (robot)
+            self.robots.append (robot)
+        self.wallStart = None
+
+    def waitUntil (self, cycle, period_s):
+        if (self.wallStart is None):
+            self.wallStart = time.perf_counter ()
+        delay = self.wallStart + cycle * period_s - time.perf_counter ()
+        if (delay > 0):
+            time.sleep (delay)
+
+    def poll (self):
+        positions = nm.empty ((len (self.robots), 2))
+        for i, robot in enumerate (self.robots):
+            snapshot = robot.get ('snapshot') or robot['streams']['pose'].wait ()
+            positions[i] = (snapshot['x'], snapshot['y'])
+        return positions, None
+
+
+class PredictService:
+    """
+    Runs predictPath.planCycle () every deltaTT_s on the positions from a feed.
+    """
+
+    def __init__ (self, names, waypoints, starts, quad, feed, useWaypoints = True, positioner = None, period_s = deltaTT_s,
+                  speedTol = 0.0):
+        """
+        Arguments:
+            names, waypoints, starts: target names, waypoint lists and start positions
+            quad: 'Quad' struct from predictPath.initQuad ()
+            feed: ReplayFeed or MorseFeed
+            useWaypoints, positioner: as in predictPath.planCoverage ()
+            period_s: time between cycles (s)
+            speedTol: relative speed change under which predicted paths are reused (see IncrementalPredictor)
+        """
+        targets = [{'name':n, 'position':s, 'waypoints':w} for n, w, s in zip (names, waypoints, starts)]
+        self.fleet = FleetState (targets)
+        self.quad = quad
+        self.camera = CameraModel.fromDict (quad['camera'])
+        self.feed = feed
+        self.useWaypoints = useWaypoints
+        self.positioner = positioner
+        self.period_s = period_s
+        self.predictor = IncrementalPredictor (deltaTT_s, speedTol)
+        self.footDist = 0
+        self.latencies = []
+
+    def cycle (self, positions, arrivals):
+        """
+        One cycle on new positions. arrivals: indices of targets that reached their waypoint,
+        or None to detect arrivals by distance to the waypoint (MorseFeed)
+        Returns a dict of the cycle's 'waypoint', 'heading', 'altitude', 'footprint' and 'latency_s'
+        """
+        start = time.perf_counter ()
+        fleet = self.fleet
+        fleet.setPositions (positions)
+        if (arrivals is None):
+            d = fleet.positions - fleet.nextWaypoints ()
+            arrivals = nm.flatnonzero (nm.hypot (d[:, 0], d[:, 1]) < self.feed.arriveRadius_m)
+        for i in arrivals:
+            fleet.arrived (i)
+        with phase ("planCycle"):
+            state = planCycle (fleet, self.quad, self.camera, self.useWaypoints, self.positioner, self.footDist, self.predictor)
+        self.footDist = state['footDist']
+        latency = time.perf_counter () - start
+        self.latencies.append (latency)
+        waypoint = self.quad['waypoint']
+        return {'waypoint':(float (waypoint[0]), float (waypoint[1])),
+                'heading':float (self.quad.get ('heading_angle', self.quad['heading'])),
+                'altitude':self.quad['altitude'], 'footprint':state['footprint'], 'latency_s':latency}
+
+    def run (self, emit, maxCycles = None):
+        """
+        Runs cycles until the feed ends (or maxCycles), calling emit (cycleNumber, result) after each
+        """
+        n = 0
+        while (maxCycles is None or n < maxCycles):
+            self.feed.waitUntil (n, self.period_s)
+            update = self.feed.poll ()
+            if (update is None):
+                break
+            emit (n, self.cycle (*update))
+            n = n + 1
+        return n
+
+    def latencySummary (self):
+        """
+        Returns (count, p50, p95, max) of the cycle latencies (ms)
+        """
+        if (len (self.latencies) == 0):
+            return (0, 0.0, 0.0, 0.0)
+        ms = nm.asarray (self.latencies) * 1000
+        return (len (ms), float (nm.percentile (ms, 50)), float (nm.percentile (ms, 95)), float (ms.max ()))
+
+
+def main ():
+    # Parse arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--names", help = "comma-separated list of target names", required = True)
+    parser.add_argument("-w", "--waypoint_dir", help = "directory containing waypoint data", required = True)
+    parser.add_argument("-p", "--path_dir", help = "directory containing path data to replay (default: live from Morse)")
+    parser.add_argument("-x", "--speedup", help = "replay speed, in log seconds per second (0: as fast as possible)", type = float, default = 1.0)
+    parser.add_argument("-d", "--disable_waypoints", help = "disable using waypoints for following")
+    parser.add_argument("-a", "--altitude", help = "altitude of the quadcopter (m)", type = float, default = 75)
+    parser.add_argument("-o", "--optimize", help = "position with the candidate-pose optimizer", action = "store_true")
+    parser.add_argument("-f", "--coverage_file", help = "also write each cycle's footprint as a coverage CSV for evaluate.py")
+    parser.add_argument("-c", "--cycles", help = "stop after this many cycles", type = int)
+    parser.add_argument("-t", "--speed_tolerance", help = "reuse predicted paths while speeds change by at most this fraction", type = float, default = 0.0)
+    parser.add_argument("--host", help = "Morse host", default = "localhost")
+    parser.add_argument("--port", help = "Morse port", type = int, default = 4000)
+    args = parser.parse_args()
+    profiler.budget_s = deltaTT_s
+
+    names = args.names.split (",")
+    waypoints = [readWaypoints (args.waypoint_dir + n + ".waypoints") for n in names]
+    starts = [readStart (args.waypoint_dir + n + ".start") for n in names]
+    if (args.path_dir is not None):
+        feed = ReplayFeed (names, args.path_dir, starts, args.speedup)
+    else:
+        feed = MorseFeed (names, args.host, args.port)
+
+    quad = initQuad (args.altitude)
+    positioner = None
+    if (args.optimize):
+        positioner = PoseOptimizer (CameraModel.fromDict (quad['camera']), [quad['altitude']], budget_s = 0.5 * deltaTT_s)
+    service = PredictService (names, waypoints, starts, quad, feed, args.disable_waypoints is None, positioner,
+                              speedTol = args.speed_tolerance)
+
+    coverageFile = open (args.coverage_file, 'w') if args.coverage_file else None
+    def emit (n, result):
+        print ("{0},{1},{2},{3},{4},{5},{6:.3f}".format (n, n * service.period_s, result['waypoint'][0], result['waypoint'][1],
+               result['heading'], result['altitude'], result['latency_s'] * 1000), flush = True)
+        if (coverageFile is not None):
+            # Durations are in coverage seconds, one observation (deltaTT_s of log time) each, as in predictPath.py's files
+            coverageFile.write (formatCoverageRow (result['footprint'], int (round (service.period_s / deltaTT_s))) + "\n")
+
+    print (header)
+    try:
+        service.run (emit, args.cycles)
+    except KeyboardInterrupt:
+        pass
+    if (coverageFile is not None):
+        coverageFile.close ()
+    count, p50, p95, worst = service.latencySummary ()
+    print ("[+] {0} cycles, latency p50 {1:.3f} ms, p95 {2:.3f} ms, max {3:.3f} ms".format (count, p50, p95, worst), file = sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+#!/usr/bin/python3
+
+"""
+File: replayGrid.py
+
+Time-aligned replay of the targets' .path logs.
+evaluate.py consumes one observation per second from each target's observed path, after the parser
+has dropped odd seconds and with the 'A' markers in between, and assumes that the targets' lists stay aligned.
+ReplayGrid instead places every logged status of every target at its logged time and resamples all targets
+onto one common time grid:
+    times:     (T,) grid times, in seconds since midnight
+    positions: (T x N x 2) position of every target at every grid time, linearly interpolated
+    observed:  (T x N) True where an observation falls within half a step of the grid time
+    gaps:      (T x N) True where the position is not backed by nearby observations: before the first or after
+               the last observation of the target (the position is held), or between two observations
+               further apart than maxGap_s
+    legs:      (T x N) number of waypoints the target has arrived at by that time
+Any time slice is then an index into these arrays, and all footprints of a coverage file can be tested at once.
+
+The logs only have whole seconds. The statuses logged within one second are spread evenly over it,
+in the order they were logged.
+"""
+import numpy as nm
+from targetFiles import readPathLog, ARRIVED
+
+
+def readTimedLog (fh):
+    """
+    Function: readTimedLog
+    Arguments:
+        fh: path of a .path file
+    Purpose:
+        Returns (times (K,), positions (K x 2), arrivalTimes): every logged status of the target at its time
+        (in seconds since midnight, spread within each second), and the times of its 'Arrived!' markers
+    """
+    secs = []
+    xy = []
+    arrivals = []
+    for record in readPathLog (fh, evenOnly = False):
+        if (record is ARRIVED):
+            arrivals.append (len (secs))
+        else:
+            secs.append (record.secs)
+            xy.append ((record.x, record.y))
+    secs = nm.asarray (secs, dtype = float)
+    # Logs that run past midnight
+    secs = secs + 86400 * nm.concatenate (([0], nm.cumsum (nm.diff (secs) < -43200)))
+
+    # Spread the statuses of each second over that second
+    times = secs.copy ()
+    if (len (secs) > 0):
+        newSecond = nm.concatenate (([True], secs[1:] != secs[:-1]))
+        firsts = nm.flatnonzero (newSecond)
+        counts = nm.diff (nm.concatenate ((firsts, [len (secs)])))
+        rank = nm.arange (len (secs)) - nm.repeat (firsts, counts)
+        times = secs + rank / nm.repeat (counts, counts)
+
+    # An arrival is logged after the status in which the target arrived
+    arrivalTimes = nm.array ([times[max (a - 1, 0)] if len (times) > 0 else nm.nan for a in arrivals], dtype = float)
+    return times, nm.asarray (xy, dtype = float).reshape (-1, 2), arrivalTimes
+
+
+class ReplayGrid:
+    """
+    Observations of a group of targets resampled onto one time grid.
+    """
+
+    def __init__ (self, names, logs, step_s = 1.0, maxGap_s = 2.0, start = None, end = None):
+        """
+        Arguments:
+            names: target names
+            logs: one (times, positions, arrivalTimes) per target, as from readTimedLog ()
+            step_s: grid spacing (s)
+            maxGap_s: observations further apart than this are a gap
+            start, end: grid span (s since midnight), default from the first to the last observation of any target
+        """
+        self.names = list (names)
+        self.step_s = step_s
+        self.maxGap_s = maxGap_s
+        firsts = [log[0][0] for log in logs if len (log[0])]
+        lasts = [log[0][-1] for log in logs if len (log[0])]
+        self.start = (min (firsts) if firsts else 0.0) if start is None else start
+        end = (max (lasts) if lasts else self.start) if end is None else end
+        T = int (nm.floor ((end - self.start) / step_s + 1e-9)) + 1
+        self.times = self.start + step_s * nm.arange (T)
+
+        N = len (self.names)
+        self.positions = nm.full ((T, N, 2), nm.nan)
+        self.observed = nm.zeros ((T, N), dtype = bool)
+        self.gaps = nm.ones ((T, N), dtype = bool)
+        self.legs = nm.zeros ((T, N), dtype = int)
+        for n, (times, xy, arrivalTimes) in enumerate (logs):
+            if (len (times) == 0):
+                continue
+            self.positions[:, n, 0] = nm.interp (self.times, times, xy[:, 0])
+            self.positions[:, n, 1] = nm.interp (self.times, times, xy[:, 1])
+
+            # Observations before and after every grid time
+            after = nm.searchsorted (times, self.times, side = 'left')
+            before = nm.clip (after - 1, 0, len (times) - 1)
+            afterClipped = nm.clip (after, 0, len (times) - 1)
+            nearest = nm.minimum (nm.abs (times[before] - self.times), nm.abs (times[afterClipped] - self.times))
+            self.observed[:, n] = nearest <= 0.5 * step_s
+            inside = (self.times >= times[0]) & (self.times <= times[-1])
+            span = times[afterClipped] - times[before]
+            self.gaps[:, n] = ~inside | (span > maxGap_s)
+            self.legs[:, n] = nm.searchsorted (arrivalTimes, self.times, side = 'right')
+
+    @classmethod
+    def fromLogs (cls, names, path_dir, step_s = 1.0, maxGap_s = 2.0, start = None, end = None):
+        """
+        Builds the grid from path_dir + <name>.path for every target
+        """
+        logs = [readTimedLog (path_dir + name + ".path") for name in names]
+        return cls (names, logs, step_s, maxGap_s, start, end)
+
+    def __len__ (self):
+        return len (self.times)
+
+    def index (self, t):
+        """
+        Returns the grid index of time t (s since midnight), clamped to the grid
+        """
+        return int (min (max (round ((t - self.start) / self.step_s), 0), len (self.times) - 1))
+
+    def at (self, t):
+        """
+        Returns the (N x 2) positions of the targets at time t
+        """
+        return self.positions[self.index (t)]
+
+    def window (self, t0, t1):
+        """
+        Returns (times, positions, gaps) of the grid between times t0 and t1, inclusive
+        """
+        i = self.index (t0)
+        j = self.index (t1) + 1
+        return self.times[i:j], self.positions[i:j], self.gaps[i:j]
+
+    def elapsed (self, seconds):
+        """
+        Returns the (len (seconds) x N x 2) positions at the given offsets (s) from the start of the grid;
+        offsets past the end hold the last positions
+        """
+        idx = nm.clip (nm.round (nm.asarray (seconds, dtype = float) / self.step_s).astype (int), 0, len (self.times) - 1)
+        return self.positions[idx]
+
+
+def main ():
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--names", help = "comma-separated list of target names", required = True)
+    parser.add_argument("-p", "--path_dir", help = "directory containing path data", required = True)
+    parser.add_argument("-s", "--step", help = "grid step (s)", type = float, default = 1.0)
+    parser.add_argument("-g", "--max_gap", help = "largest interval between observations that is not a gap (s)", type = float, default = 2.0)
+    args = parser.parse_args()
+
+    start = time.perf_counter ()
+    grid = ReplayGrid.fromLogs (args.names.split (","), args.path_dir, args.step, args.max_gap)
+    elapsed = time.perf_counter () - start
+    print ("Grid: {0} times x {1} targets, {2} s to {3} s, built in {4:.4f} s".format (
+        len (grid), len (grid.names), grid.times[0], grid.times[-1], elapsed))
+    for n, name in enumerate (grid.names):
+        print ("{0}: {1:.1%} of grid times observed, {2:.1%} in gaps, {3} waypoints reached".format (
+            name, grid.observed[:, n].mean (), grid.gaps[:, n].mean (), grid.legs[-1, n]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+#!/usr/bin/python3
+
+"""
+File: roundCache.py
+
+Binary cache of the parsed input data of a scenario round.
+Parsing the inData/roundN/*.waypoints, *.start and outData/roundN/*.path text files is repeated
+by every run of predictPath.py and evaluate.py. The first run of a round stores the parsed data
+of each target as float64 arrays in a single .npz file, and later runs load that file instead.
+
+For each target <name>, the .npz holds:
+    <name>__waypoints:    (M x 2) waypoints
+    <name>__start:        (2,) start position
+    <name>__observations: (K x 3) kept observations as (t, x, y), t in seconds since midnight
+    <name>__arrivals:     number of observations logged before each 'Arrived!' marker
+    <name>__key:          (mtime, size, sha1) of the three source files
+
+A target's entry is reused while the mtime and size of its source files are unchanged,
+or, if the mtime changed, while their sha1 still matches; the new mtime is then stored,
+so that the files are not hashed again on later runs. Otherwise it is re-parsed.
+
+A run that re-parses or refreshes any target rewrites the whole file, from the entries it read
+at the start: concurrent runs on the same round can drop each other's new entries (never corrupt them).
+Parallel drivers fill the cache once beforehand (see batchRun.warmCaches ()).
+"""
+import os
+import hashlib
+import numpy as nm
+from targetFiles import readWaypoints, readStart, readPathLog, ARRIVED
+
+# Default cache file, created in the path directory of the round
+cacheName = "roundCache.npz"
+
+
+def sourceFiles (name, waypoint_dir, path_dir):
+    return [waypoint_dir + name + ".waypoints", waypoint_dir + name + ".start", path_dir + name + ".path"]
+
+def fileHash (fh):
+    h = hashlib.sha1 ()
+    with open (fh, 'rb') as f:
+        for block in iter (lambda: f.read (1 << 20), b''):
+            h.update (block)
+    return h.hexdigest ()
+
+def fileKey (files):
+    """
+    Function: fileKey
+    Arguments:
+        files: list of source file paths
+    Purpose:
+        Returns the cache key of the source files as a (3 x len (files)) string array of mtime, size and sha1
+    """
+    key = []
+    for fh in files:
+        stat = os.stat (fh)
+        key.append ([str (stat.st_mtime_ns), str (stat.st_size), fileHash (fh)])
+    return nm.array (key).T
+
+def refreshKey (key, files):
+    """
+    Function: refreshKey
+    Arguments:
+        key: cached key from fileKey ()
+        files: list of source file paths
+    Purpose:
+        Checks the cheap mtime and size first; only hashes a file whose mtime changed.
+        Returns None if the key is no longer valid, else the key with the files' current mtimes
+        (the same array if none changed)
+    """
+    if (key.shape != (3, len (files))):
+        return None
+    refreshed = key
+    for i, fh in enumerate (files):
+        try:
+            stat = os.stat (fh)
+        except OSError:
+            return None
+        if (key[1][i] != str (stat.st_size)):
+            return None
+        if (key[0][i] != str (stat.st_mtime_ns)):
+            if (key[2][i] != fileHash (fh)):
+                return None
+            # Same content: store the new mtime
+            if (refreshed is key):
+                refreshed = key.astype (object)
+            refreshed[0][i] = str (stat.st_mtime_ns)
+    return refreshed if refreshed is key else refreshed.astype (str)
+
+def parseTarget (name, waypoint_dir, path_dir):
+    """
+    Function: parseTarget
+    Purpose:
+        Parses the text files of one target into the arrays stored in the cache
+    """
+    observations = []
+    arrivals = []
+    for record in readPathLog (path_dir + name + ".path"):
+        if (record is ARRIVED):
+            arrivals.append (len (observations))
+        else:
+            observations.append ((record.secs, record.x, record.y))
+    return {'waypoints': nm.array (readWaypoints (waypoint_dir + name + ".waypoints"), dtype = float).reshape (-1, 2),
+            'start': nm.array (readStart (waypoint_dir + name + ".start"), dtype = float),
+            'observations': nm.array (observations, dtype = float).reshape (-1, 3),
+            'arrivals': nm.array (arrivals, dtype = int)}
+
+def loadRound (names, waypoint_dir, path_dir, cacheFile = None):
+    """
+    Function: loadRound
+    Arguments:
+        names: list of target names
+        waypoint_dir: directory containing waypoint data
+        path_dir: directory containing path data
+        cacheFile: cache file to use, default path_dir + cacheName
+    Purpose:
+        Returns a dict of the parsed arrays of each target (see parseTarget),
+        read from the cache when valid. The cache is rewritten when any target had to be parsed,
+        or when a source file was touched without changing (to store its new mtime).
+    """
+    if (cacheFile is None):
+        cacheFile = path_dir + cacheName
+    cached = {}
+    if (os.path.exists (cacheFile)):
+        with nm.load (cacheFile) as data:
+            cached = {k: data[k] for k in data.files}
+
+    targets = {}
+    stale = False
+    for name in names:
+        files = sourceFiles (name, waypoint_dir, path_dir)
+        key = cached.get (name + "__key")
+        refreshed = None if key is None else refreshKey (key, files)
+        if (refreshed is not None):
+            targets[name] = {k: cached[name + "__" + k] for k in ('waypoints', 'start', 'observations', 'arrivals')}
+            if (refreshed is not key):
+                cached[name + "__key"] = refreshed
+                stale = True
+        else:
+            targets[name] = parseTarget (name, waypoint_dir, path_dir)
+            cached[name + "__key"] = fileKey (files)
+            for k, v in targets[name].items ():
+                cached[name + "__" + k] = v
+            stale = True
+
+    if (stale):
+        # Write to a temporary file first, so that concurrent readers never see a partial cache
+        tmpFile = cacheFile + ".{0}.tmp".format (os.getpid ())
+        with open (tmpFile, 'wb') as f:
+            nm.savez (f, **cached)
+        os.replace (tmpFile, cacheFile)
+    return targets
+
+def secsToTime (secs):
+    secs = int (secs)
+    return "{0:02d}:{1:02d}:{2:02d}".format (secs // 3600, (secs // 60) % 60, secs % 60)
+
+def observedPath (data, withTime = False):
+    """
+    Function: observedPath
+    Arguments:
+        data: parsed arrays of one target, from loadRound ()
+        withTime: if True, entries are (x, y, time) instead of (x, y)
+    Purpose:
+        Rebuilds the observed path list of targetFiles.readObservedPath () from the cached arrays
+    """
+    observations = data['observations']
+    if (withTime):
+        rows = [(x, y, secsToTime (t)) for t, x, y in observations.tolist ()]
+    else:
+        rows = [(x, y) for x, y in observations[:, 1:3].tolist ()]
+    observed = [tuple (data['start'].tolist ())]
+    start = 0
+    for a in data['arrivals'].tolist ():
+        observed.extend (rows[start:a])
+        observed.append (ARRIVED)
+        start = a
+    observed.extend (rows[start:])
+    return observed
+
+def loadTargets (names, waypoint_dir, path_dir, withTime = False, cacheFile = None):
+    """
+    Function: loadTargets
+    Arguments:
+        names: list of target names
+        waypoint_dir: directory containing waypoint data
+        path_dir: directory containing path data
+        withTime: if True, observed path entries are (x, y, time)
+        cacheFile: cache file to use, default path_dir + cacheName
+    Purpose:
+        Returns the list of 'Target' structs that predictPath.py and evaluate.py parse from the text files,
+        built from the round cache
+    """
+    data = loadRound (names, waypoint_dir, path_dir, cacheFile)
+    targets = []
+    for name in names:
+        start = tuple (data[name]['start'].tolist ())
+        targets.append ({'name':name, 'position_prev':(None, None), 'position':start, 'source':start, 'speed':None,
+                         'waypoints':[tuple (w) for w in data[name]['waypoints'].tolist ()],
+                         'observed_path':observedPath (data[name], withTime)})
+    return targets
@@ -0,0 +1,267 @@
+#!/usr/bin/python3
+
+"""
+File: simulateTargets.py
+
+Kinematic stand-in for running the targets in Morse with marisa.py.
+Each target drives from its start towards each of its waypoints in turn, as marisa.py does through
+the ATRV's waypoint actuator: straight at the waypoint, at its speed, until it is within the tolerance
+of it, then on to the next waypoint from where it is. Every tick it logs a status, like get_status ()
+in marisa.py, and 'Arrived!' after reaching each waypoint.
+
+The track is computed in closed form rather than stepped: the legs between arrival points are fixed
+by the waypoints, so a target's position at any tick is the point on its legs at the distance it has
+travelled, the cumulative sum of its speed over the ticks. Speed noise varies that speed per tick;
+position noise is added to the logged positions, as GPS noise would be.
+
+A simulated run is returned as one record per target (see simulateTargets ()), which can be
+    written as a .path log (writePathLog ()), read by predictPath.py and evaluate.py like the recorded ones
+    turned into 'Target' structs directly (simulatedTargets ()), as loaded by roundCache.loadTargets ()
+    turned into replayGrid.ReplayGrid logs (replayLogs ())
+
+Example: simulate round 12 with noisy speeds, then plan and evaluate against the simulated logs
+    python3 simulateTargets.py -w ../inData/round12/ -o /tmp/sim12/ -s 2.0 -v 0.1 -x 0.05 -r 1
+    python3 predictPath.py -n susan,django,anton -w ../inData/round12/ -p /tmp/sim12/ -q
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as nm
+from roundCache import secsToTime, observedPath
+
+# Defaults from marisa.py and roboutils.goto_target ()
+defaultSpeed = 2.0
+defaultTolerance = 0.5
+defaultTick_s = 0.5
+
+# Default clock at the first status, in seconds since midnight
+defaultClock_s = 12 * 3600
+
+
+def legVertices (start, waypoints, tolerance = defaultTolerance):
+    """
+    Function: legVertices
+    Arguments:
+        start: (2,) start position
+        waypoints: (M x 2) waypoints
+        tolerance: a waypoint is reached within this distance
+    Purpose:
+        Returns the (M + 1 x 2) points a target drives between: the start, then the point
+        at which it reaches each waypoint, tolerance short of it on the way from the previous point
+    """
+    vertices = nm.empty ((len (waypoints) + 1, 2))
+    vertices[0] = start
+    for k, w in enumerate (waypoints):
+        d = vertices[k] - w
+        dist = nm.hypot (d[0], d[1])
+        vertices[k + 1] = vertices[k] if dist <= tolerance else w + tolerance * d / dist
+    return vertices
+
+def simulateTarget (rng, start, waypoints, speed = defaultSpeed, tick_s = defaultTick_s, tolerance = defaultTolerance,
+                    speedNoise = 0.0, positionNoise = 0.0, clock_s = defaultClock_s, maxDuration_s = None):
+    """
+    Function: simulateTarget
+    Arguments:
+        rng: numpy.random.Generator
+        start, waypoints: start position and (M x 2) waypoints
+        speed: nominal speed (m/s)
+        tick_s: interval between logged statuses (s)
+        tolerance: a waypoint is reached within this distance (m)
+        speedNoise: standard deviation of the per-tick speed, relative to the nominal speed
+        positionNoise: standard deviation of the logged positions (m)
+        clock_s: time of the first status, in seconds since midnight
+        maxDuration_s: stop after this long, even if waypoints remain
+            (a target with speed <= 0 is logged at its start until then, or only twice without it)
+    Purpose:
+        Returns the record of one target:
+            't':         (T,) time of each status (s since midnight)
+            'positions': (T x 2) logged position of each status
+            'dest':      (T,) index of the waypoint each status heads for, -1 in the first status (no destination yet)
+            'arrivals':  number of statuses logged before each 'Arrived!'
+    """
+    waypoints = nm.asarray (waypoints, dtype = float).reshape (-1, 2)
+    vertices = legVertices (nm.asarray (start, dtype = float), waypoints, tolerance)
+    d = nm.diff (vertices, axis = 0)
+    arrivalDist = nm.concatenate (([0.0], nm.cumsum (nm.hypot (d[:, 0], d[:, 1]))))
+    total = arrivalDist[-1]
+
+    # Distance travelled at each tick; statuses 0 and 1 are both at the start, as marisa.py logs
+    # one status before sending the first waypoint
+    maxTicks = None if maxDuration_s is None else int (maxDuration_s / tick_s) + 1
+    if (speed <= 0):
+        # A stopped target only reaches waypoints at its start: it is logged there, for maxDuration_s if given
+        numTicks = 2 if maxTicks is None else maxTicks
+    else:
+        numTicks = int (nm.ceil (total / (speed * tick_s) * 1.2)) + 2
+    while (True):
+        if (maxTicks is not None):
+            numTicks = min (numTicks, maxTicks)
+        steps = speed * tick_s * nm.maximum (1.0 + speedNoise * rng.standard_normal (max (numTicks - 2, 0)), 0.0)
+        travelled = nm.concatenate (([0.0, 0.0], nm.cumsum (steps)))
+        if (travelled[-1] >= total or numTicks == maxTicks or speed <= 0):
+            break
+        numTicks = 2 * numTicks
+
+    # The log ends at the last arrival, but always holds the statuses at the start
+    # (a path of length 0 is done before status 0)
+    done = nm.searchsorted (travelled, total, side = 'left')
+    numStatus = min (max (int (done), 2), numTicks)
+    travelled = nm.minimum (travelled[0:numStatus], total)
+
+    positions = nm.empty ((numStatus, 2))
+    positions[:, 0] = nm.interp (travelled, arrivalDist, vertices[:, 0])
+    positions[:, 1] = nm.interp (travelled, arrivalDist, vertices[:, 1])
+    if (positionNoise > 0):
+        positions = positions + positionNoise * rng.standard_normal (positions.shape)
+
+    # Waypoint k is reached between the last status before arrivalDist[k + 1] and the next one
+    reached = nm.searchsorted (travelled, arrivalDist[1:], side = 'left')
+    dest = nm.searchsorted (arrivalDist[1:], travelled, side = 'right')
+    dest[0] = -1
+    if (done < numTicks):
+        # Finished: the waypoints still ahead of the last status are reached right after it
+        arrivals = reached
+    else:
+        # Stopped by maxDuration_s, or not moving: only the waypoints reached within the log
+        arrivals = reached[reached < numStatus]
+    return {'t':clock_s + tick_s * nm.arange (numStatus), 'positions':positions,
+            'dest':nm.minimum (dest, len (waypoints) - 1), 'arrivals':arrivals.astype (int)}
+
+def simulateTargets (rng, starts, waypoints, speeds = defaultSpeed, **kwargs):
+    """
+    Function: simulateTargets
+    Arguments:
+        rng: numpy.random.Generator
+        starts: start position of each target
+        waypoints: waypoints of each target
+        speeds: nominal speed of all targets, or one per target
+        kwargs: as simulateTarget ()
+    Purpose:
+        Returns one simulateTarget () record per target
+    """
+    speeds = nm.broadcast_to (nm.asarray (speeds, dtype = float), (len (starts),))
+    return [simulateTarget (rng, s, w, v, **kwargs) for s, w, v in zip (starts, waypoints, speeds)]
+
+def formatStatus (record, waypoints, i):
+    k = record['dest'][i]
+    x, y = record['positions'][i].tolist ()
+    destX, destY = (None, None) if k < 0 else (float (waypoints[k][0]), float (waypoints[k][1]))
+    return str ({'dest_x':destX, 'pos_y':y, 'pos_x':x, 'dest_y':destY, 'time':secsToTime (record['t'][i])})
+
+def writePathLog (fh, name, waypoints, record):
+    """
+    Function: writePathLog
+    Purpose:
+        Writes a target's record as the .path log marisa.py would have printed
+    """
+    lines = [str ([(float (w[0]), float (w[1])) for w in waypoints])]
+    lines.extend ("[+] Robot {0}{1}".format (name, m) for m in
+                  (" online", " sensor: pose online", " actuator: waypoint online", " actuator: motion online", ": All systems online"))
+    a = 0
+    arrivals = record['arrivals'].tolist ()
+    for i in range (len (record['t'])):
+        while (a < len (arrivals) and arrivals[a] == i):
+            lines.append ("Arrived!")
+            a = a + 1
+        lines.append (formatStatus (record, waypoints, i))
+    lines.extend ("Arrived!" for _ in arrivals[a:])
+    with open (fh, 'w') as f:
+        f.write ("\n".join (lines) + "\n")
+
+def cacheArrays (record):
+    """
+    Function: cacheArrays
+    Purpose:
+        Returns the 'observations' and 'arrivals' arrays that roundCache.loadRound () would parse from
+        the record's .path log: the statuses targetFiles.readPathLog () keeps (the first of each even second),
+        as (t, x, y), and the number of kept statuses before each 'Arrived!'
+    """
+    secs = nm.floor (record['t']).astype (int)
+    field = secs % 60
+    keep = (field % 2 == 0) & nm.concatenate (([True], field[1:] != field[:-1]))
+    observations = nm.column_stack ((secs[keep], record['positions'][keep]))
+    kept = nm.concatenate (([0], nm.cumsum (keep)))
+    return {'observations':observations.astype (float), 'arrivals':kept[record['arrivals']]}
+
+def simulatedTargets (names, starts, waypoints, records, withTime = False):
+    """
+    Function: simulatedTargets
+    Purpose:
+        Returns the 'Target' structs for simulated records, as roundCache.loadTargets () returns for recorded logs
+    """
+    targets = []
+    for name, start, w, record in zip (names, starts, waypoints, records):
+        data = cacheArrays (record)
+        data['start'] = nm.asarray (start, dtype = float)
+        start = tuple (data['start'].tolist ())
+        targets.append ({'name':name, 'position_prev':(None, None), 'position':start, 'source':start, 'speed':None,
+                         'waypoints':[(float (p[0]), float (p[1])) for p in w],
+                         'observed_path':observedPath (data, withTime)})
+    return targets
+
+def replayLogs (records):
+    """
+    Function: replayLogs
+    Purpose:
+        Returns the records as replayGrid.ReplayGrid logs: (times, positions, arrivalTimes) per target, at the exact times
+    """
+    logs = []
+    for record in records:
+        arrivalTimes = record['t'][nm.maximum (record['arrivals'] - 1, 0)] if len (record['t']) else nm.empty (0)
+        logs.append ((record['t'], record['positions'], arrivalTimes))
+    return logs
+
+
+def main ():
+    from targetFiles import readWaypoints, readStart
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--names", help = "comma-separated list of target names", default = "susan,django,anton")
+    parser.add_argument("-w", "--waypoint_dir", help = "directory containing waypoint data")
+    parser.add_argument("-b", "--bundle", help = "scenario bundle from generatePaths.py, instead of -w")
+    parser.add_argument("-k", "--scenario", help = "scenario of the bundle to simulate (default: all, benchmark only)", type = int)
+    parser.add_argument("-o", "--outdir", help = "directory to write the <name>.path logs to")
+    parser.add_argument("-s", "--speeds", help = "speed of all targets, or comma-separated speeds (m/s)", default = str (defaultSpeed))
+    parser.add_argument("-v", "--speed_noise", help = "standard deviation of the per-tick speed, relative", type = float, default = 0.0)
+    parser.add_argument("-x", "--position_noise", help = "standard deviation of the logged positions (m)", type = float, default = 0.0)
+    parser.add_argument("-t", "--tick", help = "interval between logged statuses (s)", type = float, default = defaultTick_s)
+    parser.add_argument("-d", "--duration", help = "stop each target after this long (s)", type = float)
+    parser.add_argument("-r", "--seed", help = "random seed", type = int)
+    args = parser.parse_args()
+
+    rng = nm.random.default_rng (args.seed)
+    speeds = [float (s) for s in args.speeds.split (",")]
+    if (args.bundle is not None):
+        from generatePaths import loadBundle
+        names, bundleWaypoints, bundleStarts = loadBundle (args.bundle)
+        scenarios = range (len (bundleWaypoints)) if args.scenario is None else [args.scenario]
+        inputs = [(bundleStarts[k], bundleWaypoints[k]) for k in scenarios]
+    elif (args.waypoint_dir is not None):
+        names = args.names.split (",")
+        inputs = [([readStart (args.waypoint_dir + n + ".start") for n in names],
+                   [readWaypoints (args.waypoint_dir + n + ".waypoints") for n in names])]
+    else:
+        print ("Must supply a waypoint directory with -w or a bundle with -b")
+        exit (1)
+
+    start = time.perf_counter ()
+    runs = [simulateTargets (rng, starts, waypoints, speeds if len (speeds) > 1 else speeds[0], tick_s = args.tick,
+                             speedNoise = args.speed_noise, positionNoise = args.position_noise, maxDuration_s = args.duration)
+            for starts, waypoints in inputs]
+    elapsed = time.perf_counter () - start
+    simulated = sum (len (r['t']) * args.tick for records in runs for r in records)
+    print ("[+] {0} scenarios, {1:.0f} target-seconds simulated in {2:.3f} s ({3:.0f} per second)".format (
+        len (runs), simulated, elapsed, simulated / max (elapsed, 1e-9)), file = sys.stderr)
+
+    if (args.outdir is not None):
+        if (len (runs) > 1):
+            print ("Write .path logs of one scenario at a time (-k)")
+            exit (1)
+        os.makedirs (args.outdir, exist_ok = True)
+        for name, waypoints, record in zip (names, inputs[0][1], runs[0]):
+            writePathLog (os.path.join (args.outdir, name + ".path"), name, waypoints, record)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+#!/usr/bin/python3
+
+"""
+File: spatialIndex.py
+
+Uniform-grid spatial index over the current positions of the targets.
+Phase 2 of predictPath.planCycle () needs the target closest to the quadcopter and the one farthest from it,
+and scanning every target in Python for each query grows with the size of the group.
+SpatialIndex buckets the targets into square cells of cellSize meters, keyed by cell, and answers
+
+    nearest (p)           closest target to p
+    farthest (p)          farthest target from p
+    kNearest (p, k)       k closest targets to p
+    withinRadius (p, r)   targets within r of p
+    inBox (box)           targets inside an axis-aligned box
+    bounds ()             bounding box of all targets
+
+by visiting only the cells that can hold the answer: rings of cells around p, growing outward, for
+nearest, radius and box queries; for farthest and bounds queries, the occupied cells are ranked in one
+vectorized pass and only the outermost are visited.
+Positions are updated incrementally: update () only moves the targets that changed cell.
+
+Ties go to the lowest target index, as in the linear scans the index replaces.
+Distances are computed as ((dx ** 2 + dy ** 2) ** 0.5), also as in those scans.
+"""
+import math
+import numpy as nm
+
+
+def pointDist (p, q):
+    return ((p[0] - q[0]) ** 2 + (p[1] - q[1]) ** 2) ** (.5)
+
+
+class SpatialIndex:
+    """
+    Targets bucketed into a uniform grid of square cells.
+    The occupied cells are also kept in slot arrays (cell key and number of targets per slot),
+    so that queries over all cells (farthest, bounds, large boxes) prune cells in one vectorized pass.
+    """
+
+    def __init__ (self, positions, cellSize = None):
+        """
+        Arguments:
+            positions: (N x 2) positions of the targets
+            cellSize: side of a cell (m). Default: the extent of the positions over sqrt (N),
+                which puts about one target in each occupied cell of a uniform spread
+        """
+        self.positions = nm.array (positions, dtype = float).reshape (-1, 2)
+        if (cellSize is None):
+            extent = nm.ptp (self.positions, axis = 0).max () if len (self.positions) > 0 else 0.0
+            cellSize = max (extent / math.sqrt (max (len (self.positions), 1)), 1.0)
+        self.cellSize = float (cellSize)
+        self.cells = {}
+        self.slotOf = {}
+        self.slotKeys = nm.zeros ((16, 2), dtype = nm.int64)
+        self.slotCount = nm.zeros (16, dtype = int)
+        self.freeSlots = []
+        self.numSlots = 0
+        self.cellOf = self._cellsOf (self.positions)
+        for idx, key in enumerate (map (tuple, self.cellOf.tolist ())):
+            self._add (idx, key)
+        self._updateExtent ()
+
+    def __len__ (self):
+        return len (self.positions)
+
+    def _cellsOf (self, positions):
+        return nm.floor (positions / self.cellSize).astype (nm.int64)
+
+    def _cellOf (self, p):
+        return (int (math.floor (p[0] / self.cellSize)), int (math.floor (p[1] / self.cellSize)))
+
+    def _add (self, idx, key):
+        members = self.cells.get (key)
+        if (members is not None):
+            members.append (idx)
+            self.slotCount[self.slotOf[key]] += 1
+            return
+        self.cells[key] = [idx]
+        if (self.freeSlots):
+            slot = self.freeSlots.pop ()
+        else:
+            if (self.numSlots == len (self.slotCount)):
+                self.slotKeys = nm.concatenate ((self.slotKeys, nm.zeros_like (self.slotKeys)))
+                self.slotCount = nm.concatenate ((self.slotCount, nm.zeros_like (self.slotCount)))
+            slot = self.numSlots
+            self.numSlots = self.numSlots + 1
+        self.slotOf[key] = slot
+        self.slotKeys[slot] = key
+        self.slotCount[slot] = 1
+
+    def _remove (self, idx, key):
+        members = self.cells[key]
+        members.remove (idx)
+        slot = self.slotOf[key]
+        self.slotCount[slot] -= 1
+        if (not members):
+            del self.cells[key]
+            del self.slotOf[key]
+            self.freeSlots.append (slot)
+
+    def _occupied (self):
+        # Slots of the occupied cells
+        return nm.flatnonzero (self.slotCount[0:self.numSlots] > 0)
+
+    def _updateExtent (self):
+        # Range of occupied cells, which bounds every ring search
+        keys = self.slotKeys[self._occupied ()]
+        if (len (keys) > 0):
+            self.cellMin = tuple (keys.min (axis = 0).tolist ())
+            self.cellMax = tuple (keys.max (axis = 0).tolist ())
+        else:
+            self.cellMin = self.cellMax = (0, 0)
+
+    def update (self, positions):
+        """
+        Function: update
+        Arguments:
+            positions: (N x 2) new positions of the same targets
+        Purpose:
+            Stores the new positions, moving only the targets that changed cell
+        """
+        self.positions[:] = positions
+        cellOf = self._cellsOf (self.positions)
+        moved = nm.flatnonzero (nm.any (cellOf != self.cellOf, axis = 1))
+        for idx in moved.tolist ():
+            self._remove (idx, tuple (self.cellOf[idx].tolist ()))
+            self._add (idx, tuple (cellOf[idx].tolist ()))
+        if (len (moved) > 0):
+            self.cellOf = cellOf
+            self._updateExtent ()
+
+    def move (self, idx, position):
+        """
+        Function: move
+        Purpose:
+            Updates the position of target idx alone
+        """
+        self.positions[idx] = position
+        key = self._cellOf (self.positions[idx])
+        old = tuple (self.cellOf[idx].tolist ())
+        if (key != old):
+            self._remove (idx, old)
+            self._add (idx, key)
+            self.cellOf[idx] = key
+            self._updateExtent ()
+
+    def _ring (self, center, r):
+        """
+        Yields the occupied cells at Chebyshev distance r from the center cell, within the occupied range
+        """
+        ci, cj = center
+        imin, jmin = self.cellMin
+        imax, jmax = self.cellMax
+        lowI, highI = max (ci - r, imin), min (ci + r, imax)
+        if (lowI > highI):
+            return
+        for j in (cj - r, cj + r) if r > 0 else (cj,):
+            if (jmin <= j <= jmax):
+                for i in range (lowI, highI + 1):
+                    members = self.cells.get ((i, j))
+                    if (members):
+                        yield members
+        if (r == 0):
+            return
+        lowJ, highJ = max (cj - r + 1, jmin), min (cj + r - 1, jmax)
+        for i in (ci - r, ci + r):
+            if (imin <= i <= imax):
+                for j in range (lowJ, highJ + 1):
+                    members = self.cells.get ((i, j))
+                    if (members):
+                        yield members
+
+    def _ringDist (self, p, center, r):
+        # Lower bound of the distance from p to any point in ring r or beyond:
+        # the distance from p to the edge of the square of rings 0 .. r - 1 around it
+        if (r == 0):
+            return 0.0
+        ci, cj = center
+        size = self.cellSize
+        return min (p[0] - (ci - r + 1) * size, (ci + r) * size - p[0], p[1] - (cj - r + 1) * size, (cj + r) * size - p[1])
+
+    def kNearest (self, p, k):
+        """
+        Function: kNearest
+        Purpose:
+            Returns the k targets closest to p as a list of (index, distance), closest first
+        """
+        if (len (self.positions) == 0 or k <= 0):
+            return []
+        center = self._cellOf (p)
+        ci, cj = center
+        imin, jmin = self.cellMin
+        imax, jmax = self.cellMax
+        near = max (imin - ci, ci - imax, jmin - cj, cj - jmax, 0)
+        far = max (abs (ci - imin), abs (ci - imax), abs (cj - jmin), abs (cj - jmax))
+        found = []
+        for r in range (near, far + 1):
+            if (len (found) >= k):
+                found.sort ()
+                del found[k:]
+                if (found[k - 1][0] < self._ringDist (p, center, r)):
+                    break
+            for members in self._ring (center, r):
+                found.extend ((pointDist (self.positions[i], p), i) for i in members)
+        found.sort ()
+        return [(i, d) for d, i in found[0:k]]
+
+    def nearest (self, p):
+        """
+        Function: nearest
+        Purpose:
+            Returns (index, distance) of the target closest to p, or (None, inf) if there are none
+        """
+        result = self.kNearest (p, 1)
+        return result[0] if result else (None, math.inf)
+
+    def farthest (self, p):
+        """
+        Function: farthest
+        Purpose:
+            Returns (index, distance) of the target farthest from p, or (None, 0) if there are none.
+            Cells are visited from the one with the farthest corner inward, until no cell can hold a farther target.
+        """
+        best = (None, 0.0)
+        slots = self._occupied ()
+        if (len (slots) == 0):
+            return best
+        low = self.slotKeys[slots] * self.cellSize
+        reach = nm.maximum (nm.abs (low - p), nm.abs (low + self.cellSize - p))
+        reach = nm.sqrt (reach[:, 0] ** 2 + reach[:, 1] ** 2)
+        # Most queries are settled by the few cells with the farthest corners; sort all cells only if not
+        numFirst = min (32, len (slots))
+        first = nm.argpartition (-reach, numFirst - 1)[0:numFirst]
+        best, settled = self._scanFarthest (p, slots, reach, first[nm.argsort (-reach[first], kind = 'stable')], best)
+        if (not settled):
+            best, settled = self._scanFarthest (p, slots, reach, nm.argsort (-reach, kind = 'stable'), best)
+        return best
+
+    def _scanFarthest (self, p, slots, reach, order, best):
+        # Visits the cells in order until no further cell can hold a farther target; returns (best, whether it stopped early)
+        for s in order.tolist ():
+            # Margin for rounding between the corner bound and pointDist ()
+            if (best[0] is not None and reach[s] * (1 + 1e-9) < best[1]):
+                return best, True
+            for i in self.cells[tuple (self.slotKeys[slots[s]].tolist ())]:
+                d = pointDist (self.positions[i], p)
+                if (d > best[1] or (d == best[1] and (best[0] is None or i < best[0]))):
+                    best = (i, d)
+        return best, len (order) == len (slots)
+
+    def withinRadius (self, p, radius):
+        """
+        Function: withinRadius
+        Purpose:
+            Returns the indices of the targets within radius of p, in index order
+        """
+        candidates = self.inBox ((p[0] - radius, p[1] - radius, p[0] + radius, p[1] + radius))
+        return [i for i in candidates if pointDist (self.positions[i], p) <= radius]
+
+    def inBox (self, box):
+        """
+        Function: inBox
+        Arguments:
+            box: (xmin, ymin, xmax, ymax)
+        Purpose:
+            Returns the indices of the targets inside the box (edges included), in index order
+        """
+        low = self._cellOf (box[0:2])
+        high = self._cellOf (box[2:4])
+        imin, jmin = max (low[0], self.cellMin[0]), max (low[1], self.cellMin[1])
+        imax, jmax = min (high[0], self.cellMax[0]), min (high[1], self.cellMax[1])
+        if (imin > imax or jmin > jmax):
+            return []
+        if ((imax - imin + 1) * (jmax - jmin + 1) <= len (self.cells)):
+            keys = [(i, j) for i in range (imin, imax + 1) for j in range (jmin, jmax + 1)]
+        else:
+            slots = self._occupied ()
+            keys = self.slotKeys[slots]
+            keys = keys[(keys[:, 0] >= imin) & (keys[:, 0] <= imax) & (keys[:, 1] >= jmin) & (keys[:, 1] <= jmax)]
+            keys = map (tuple, keys.tolist ())
+        found = []
+        for key in keys:
+            for i in self.cells.get (key, ()):
+                x, y = self.positions[i]
+                if (box[0] <= x <= box[2] and box[1] <= y <= box[3]):
+                    found.append (i)
+        return sorted (found)
+
+    def bounds (self):
+        """
+        Function: bounds
+        Purpose:
+            Returns the (xmin, ymin, xmax, ymax) bounding box of the targets,
+            reading only the targets in the outermost rows and columns of occupied cells
+        """
+        keys = self.slotKeys[self._occupied ()]
+        box = []
+        for axis, edge, reduce in ((0, self.cellMin[0], nm.min), (1, self.cellMin[1], nm.min),
+                                   (0, self.cellMax[0], nm.max), (1, self.cellMax[1], nm.max)):
+            members = [i for key in map (tuple, keys[keys[:, axis] == edge].tolist ()) for i in self.cells[key]]
+            box.append (float (reduce (self.positions[members, axis])))
+        return tuple (box)
+
+
+def checkIndex (rng, trials = 200, numTargets = 500):
+    """
+    Function: checkIndex
+    Purpose:
+        Compares every query against a linear scan on random, clustered and duplicated positions,
+        with incremental updates between queries. Returns the number of mismatches.
+    """
+    numFailed = 0
+    positions = rng.uniform (-100, 100, size = (numTargets, 2))
+    index = SpatialIndex (positions)
+    for trial in range (trials):
+        # Move some targets a little and a few far away; duplicate one position to exercise ties
+        moved = rng.random (numTargets) < 0.3
+        positions[moved] = positions[moved] + rng.normal (0, 3, size = (moved.sum (), 2))
+        positions[rng.integers (numTargets)] = rng.uniform (-300, 300, size = 2)
+        positions[rng.integers (numTargets)] = positions[rng.integers (numTargets)]
+        if (trial % 2):
+            index.update (positions)
+        else:
+            for i in nm.flatnonzero (nm.any (positions != index.positions, axis = 1)):
+                index.move (i, positions[i])
+
+        p = rng.uniform (-400, 400, size = 2) if trial % 3 == 0 else positions[rng.integers (numTargets)] + 0.5
+        dists = [pointDist (q, p) for q in positions]
+        order = sorted (range (numTargets), key = lambda i: (dists[i], i))
+        low = order[0]
+        high = max (range (numTargets), key = lambda i: (dists[i], -i))
+        k = int (rng.integers (1, 20))
+        radius = float (rng.uniform (0, 60))
+        box = (p[0] - 30, p[1] - 20, p[0] + 25, p[1] + 40)
+        expected = [(low, dists[low]), (high, dists[high]), [(i, dists[i]) for i in order[0:k]],
+                    [i for i in range (numTargets) if dists[i] <= radius],
+                    [i for i, q in enumerate (positions) if box[0] <= q[0] <= box[2] and box[1] <= q[1] <= box[3]],
+                    tuple (nm.concatenate ((positions.min (axis = 0), positions.max (axis = 0))).tolist ())]
+        result = [index.nearest (p), index.farthest (p), index.kNearest (p, k), index.withinRadius (p, radius),
+                  index.inBox (box), index.bounds ()]
+        if (result != expected):
+            numFailed = numFailed + 1
+    return numFailed
+
+def main ():
+    import time
+
+    rng = nm.random.default_rng (0)
+    numFailed = checkIndex (rng)
+    print ("Index queries vs linear scan: {0} mismatches".format (numFailed))
+
+    for numTargets in (100, 1000, 10000, 100000):
+        positions = rng.uniform (-1000, 1000, size = (numTargets, 2))
+        index = SpatialIndex (positions)
+        queries = rng.uniform (-1000, 1000, size = (200, 2))
+        start = time.perf_counter ()
+        for q in queries:
+            index.nearest (q)
+            index.farthest (q)
+        indexed = (time.perf_counter () - start) / len (queries)
+        start = time.perf_counter ()
+        for q in queries[0:20]:
+            dists = [pointDist (p, q) for p in positions.tolist ()]
+            min (range (numTargets), key = dists.__getitem__)
+            max (range (numTargets), key = dists.__getitem__)
+        scan = (time.perf_counter () - start) / 20
+        print ("N = {0}: nearest + farthest {1:.3f} ms indexed, {2:.3f} ms linear scan".format (numTargets, indexed * 1000, scan * 1000))
+    if (numFailed > 0):
+        exit (1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/python3
+
+"""
+File: targetFiles.py
+
+Readers for the per-target data files shared by predictPath.py and evaluate.py:
+    <name>.waypoints: one 'x,y' waypoint per line
+    <name>.start:     'x,y' initial position on the first line
+    <name>.path:      Morse log written by marisa.py. Each line is either a printed get_status () dict,
+                      'Arrived!' when the target reached a waypoint, or a '['-prefixed message to ignore.
+
+The .path reader is a generator: it reads one line at a time and yields typed records,
+so logs of hundreds of MB from long field runs are never held in memory.
+"""
+import re
+from collections import namedtuple
+
+# A target position read from a .path log.
+# time: 'HH:MM:SS' string as logged, secs: seconds since midnight, x, y: position
+Observation = namedtuple ('Observation', ['time', 'secs', 'x', 'y'])
+
+# Marker yielded (and stored in observed paths) when a target arrived at a waypoint
+ARRIVED = 'A'
+
+# Interval between the kept observations of a .path log (s): readPathLog () keeps the first status of each
+# even second, so one observation stands for deltaT_s seconds of log time
+deltaT_s = 2
+
+timePattern = re.compile (r"'time':\s*'([0-9]+):([0-9]+):([0-9]+)'")
+posXPattern = re.compile (r"'pos_x':\s*([-+0-9.eE]+)")
+posYPattern = re.compile (r"'pos_y':\s*([-+0-9.eE]+)")
+
+
+def readWaypoints (fh):
+    """
+    Function: readWaypoints
+    Arguments:
+        fh: path of a .waypoints file
+    Purpose:
+        Returns the waypoints as a list of (x, y) tuples
+    """
+    waypoints = []
+    with open (fh) as f:
+        for line in f:
+            line = line.strip ()
+            if (line):
+                x, y = line.split (',')[0:2]
+                waypoints.append ((float (x), float (y)))
+    return waypoints
+
+def readStart (fh):
+    """
+    Function: readStart
+    Arguments:
+        fh: path of a .start file
+    Purpose:
+        Returns the start position as an (x, y) tuple
+    """
+    with open (fh) as f:
+        start = f.readline ().strip ()
+    x, y = start.split (',')[0:2]
+    return (float (x), float (y))
+
+def readPathLog (fh, evenOnly = True):
+    """
+    Function: readPathLog
+    Arguments:
+        fh: path of a .path file
+        evenOnly: if True, keep only the first observation of each even second (the deltaT_s interval
+            used by predictPath.py and evaluate.py); otherwise yield every logged status
+    Purpose:
+        Generator over a .path log, yielding an Observation per kept status line
+        and ARRIVED for each 'Arrived!' line
+    """
+    secs_prev = None
+    with open (fh) as f:
+        for line in f:
+            line = line.rstrip ()
+            if (not line or line[0] == '['):
+                continue
+            if (line == "Arrived!"):
+                yield ARRIVED
+                continue
+            time = timePattern.search (line)
+            if (time is None):
+                continue
+            secs = time.group (3)
+            if (evenOnly):
+                # ! Only add uniq, even times
+                skip = (int (secs) % deltaT_s != 0 or secs == secs_prev)
+                secs_prev = secs
+                if (skip):
+                    continue
+            hours, minutes = time.group (1), time.group (2)
+            yield Observation ("{0}:{1}:{2}".format (hours, minutes, secs),
+                               int (hours) * 3600 + int (minutes) * 60 + int (secs),
+                               float (posXPattern.search (line).group (1)),
+                               float (posYPattern.search (line).group (1)))
+
+def readObservedPath (fh, source, withTime = False):
+    """
+    Function: readObservedPath
+    Arguments:
+        fh: path of a .path file
+        source: start position of the target, the first entry of the observed path
+        withTime: if True, entries are (x, y, time) instead of (x, y)
+    Purpose:
+        Returns the observed path list used by predictPath.py and evaluate.py:
+        the source, then one entry per kept observation, with ARRIVED markers in place
+    """
+    observed = [source]
+    for record in readPathLog (fh):
+        if (record is ARRIVED):
+            observed.append (ARRIVED)
+        elif (withTime):
+            observed.append ((record.x, record.y, record.time))
+        else:
+            observed.append ((record.x, record.y))
+    return observed
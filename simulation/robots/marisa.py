@@ -18,6 +18,9 @@ import time
 
 # Import interfaces
 from roboutils import get_status
+from roboutils import subscribe_pose
+from roboutils import subscribe_status
+from roboutils import wait_for_arrival
 
 # Import behaviors
 from roboutils import ping
@@ -86,17 +89,21 @@ with pymorse.Morse() as simu:
 
     try:
         # Init robot using args and a Null destination
-        robot = { 'name':args.name, 'destination':{'x':None, 'y':None}, 'simu':simu }
+        # Progress is printed once per tick of 'tick' seconds
+        robot = { 'name':args.name, 'destination':{'x':None, 'y':None}, 'simu':simu, 'tick':0.5 }
 
         systems_check(robot)
+        # Pose and waypoint status arrive by subscription
+        subscribe_pose(robot)
+        subscribe_status(robot)
         print (str(get_status(robot)))
         
         if (args.waypoints):
             for w in waypoints:
                 goto_target (robot, {'x':w[0], 'y':w[1]}, 2.0)
-                while (getattr (simu, robot['name']).waypoint.get_status() == "Transit"):
+                # Returns as soon as the robot arrives, printing progress each tick until then
+                while (wait_for_arrival(robot, timeout = robot['tick']) == "Transit"):
                     print (str(get_status(robot)))
-                    time.sleep(0.5)
                 print ("Arrived!")
                 #halt(robot)
 
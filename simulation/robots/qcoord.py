@@ -19,6 +19,9 @@ import numpy as nm
 
 # Import interfaces
 from roboutils import get_status
+from roboutils import subscribe_pose
+from robomath import get_centroid
+from robomath import get_control_period
 
 # Import behaviors
 from roboutils import ping
@@ -67,18 +70,31 @@ def clear_targets(robot):
     robot['targets'] = set()
 
 def add_targets(robot, inserts):
-    robot['targets']  = robot['targets'] | inserts
+    targets = robot['targets'] | set(inserts)
+    if (len(targets) > robot['MAX_TARGETS']):
+        print ("[-] Robot {0}: at most {1} targets".format(robot['name'], robot['MAX_TARGETS']))
+        return None
+    robot['targets'] = targets
+    return 0
 
 def delete_targets(robot, deletions):
-    robot['targets'].discard(deletions) 
+    robot['targets'] = robot['targets'] - set(deletions)
 
 def init_targets(robot, init):
-    robot['targets'] = set(init)
+    clear_targets(robot)
+    return add_targets(robot, init)
 
 def get_num_targets(robot):
     return len(robot['targets'])
 
 def subscribe_to_targets(robot):
+    # Listen to the pose stream of every target; each target's latest pose
+    # is then in robot['target_robots'][name]['snapshot']
+    robot['target_robots'] = {}
+    for name in robot['targets']:
+        target = {'name':name, 'simu':robot['simu'], 'destination':{'x':None, 'y':None}}
+        subscribe_pose(target)
+        robot['target_robots'][name] = target
     return 0
 
 def get_target_position(robot, xy):
@@ -88,28 +104,46 @@ def get_target_position(robot, xy):
 
 
 def follow_targets(robot, delta, initSpeed):
+    # Keep QCOORD over the centroid of robot['targets']
+    # delta - desired distance to the centroid, where speed stays unchanged
+    # The control period shrinks from robot['tick'] down to robot['MIN_TICK']
+    # as the group speeds up, so that the centroid moves at most delta / 2 between
+    # commands; at rest commands are only resent when the centroid moves
     speed = initSpeed
-
-    # Make stack of fake target position
-    positions = list(reversed([{'x':5, 'y':-3}, {'x':17, 'y':-3}, {'x':17, 'y':-3}, {'x':19, 'y':-3}, {'x':21, 'y':-3}, {'x':22, 'y':-3}, {'x':35, 'y':-3}, {'x':37, 'y':-3}]))
-    
-    while (len(positions) > 0):
-        #dest = get_target_position(robot, positions.pop())
-        pos = simu.susan.pose.get()
-        dest = {'x':pos['x'], 'y':pos['y']}
-        goto_target(robot, dest, speed);
-        #while (getattr(simu, robot['name']).waypoint.get_status() == "Transit"):
-        #    print(str(get_status(robot)))
-        time.sleep(0.5)
-
+    subscribe_to_targets(robot)
+    subscribe_pose(robot)
+    tick = robot['tick']
+    dest = None
+    last = None
+
+    while (get_num_targets(robot) > 0):
+        # Latest pose of every target from the subscriptions, waiting only for targets
+        # that have not reported yet
+        targets = [robot['target_robots'][name] for name in robot['targets']]
+        poses = [t.get('snapshot') or subscribe_pose(t).wait() for t in targets]
+        centroid = get_centroid([(p['x'], p['y']) for p in poses])
+        now = time.time()
+
+        # Group speed from the centroid's movement since the previous command
+        if (last is not None and now > last[1]):
+            group_speed = nm.sqrt(((centroid[0] - last[0][0]) ** 2) + ((centroid[1] - last[0][1]) ** 2)) / (now - last[1])
+            tick = get_control_period(group_speed, delta / 2.0, robot['MIN_TICK'], robot['tick'])
+        last = (centroid, now)
+
+        moved = (dest is None or
+                 nm.sqrt(((centroid[0] - dest['x']) ** 2) + ((centroid[1] - dest['y']) ** 2)) > robot['MIN_MOVE'])
+        if (moved):
+            dest = {'x':float(centroid[0]), 'y':float(centroid[1])}
+            goto_target(robot, dest, speed);
+        time.sleep(tick)
 
         # Calculate distance to destination
         status = get_status(robot); # Get own position
         distance = nm.sqrt(((dest['x'] - status['pos_x']) ** 2 ) + ((dest['y'] - status['pos_y']) ** 2 ))
-	
+
         # Modify speed based on target distance from destination
-        if (distance > delta + 1 and speed <= robot['MAX_SPEED']):
-            speed = speed * (delta + distance) / delta
+        if (distance > delta + 1):
+            speed = min(speed * (delta + distance) / delta, robot['MAX_SPEED'])
         elif (distance < delta - 1):
             speed = speed * (delta - distance) / delta
 
@@ -120,8 +154,10 @@ def follow_targets(robot, delta, initSpeed):
 # Parse arguments
 parser = argparse.ArgumentParser()
 parser.add_argument("-n", "--name", help = "name of robot in MORSE environment")
-parser.add_argument("-m", "--maxTargets", help = "max number of targets to monitor", default = 1)
-parser.add_argument("-s", "--maxSpeed", help = "max speed of QCOORD", default = 5)
+parser.add_argument("-t", "--targets", help = "comma-separated names of targets to follow", default = "susan")
+parser.add_argument("-m", "--maxTargets", help = "max number of targets to monitor", type = int, default = 3)
+parser.add_argument("-s", "--maxSpeed", help = "max speed of QCOORD", type = float, default = 5)
+parser.add_argument("-r", "--minTick", help = "shortest control period (s), used when targets move fast", type = float, default = 0.1)
 args = parser.parse_args()
 
 # A robot is a dictionary of info
@@ -138,11 +174,17 @@ with pymorse.Morse() as simu:
          'targets':set(), 
          'MAX_TARGETS':args.maxTargets,
          # Traits
-         'MAX_SPEED':args.maxSpeed }
+         'MAX_SPEED':args.maxSpeed,
+         # Control period (s): at rest, and shortest
+         'tick':0.5,
+         'MIN_TICK':args.minTick,
+         # Distance (m) the centroid must move before a new waypoint is sent
+         'MIN_MOVE':0.1 }
 
         systems_check(robot)
-        targets = set(["susan"])
-        init_targets(robot, targets)
+        targets = set(args.targets.split(","))
+        if (init_targets(robot, targets) is None):
+            exit(1)
 
         #goto_target(robot, {'x':7, 'y':-3}, 1.0)
         #time.sleep(0.5);